@@ -0,0 +1,78 @@
+"""Streaming admin exports of enrollments and user skills.
+
+Each export is a flat projection joined with the user, course or skill it
+refers to, read from a server-side cursor and written out as CSV or NDJSON
+in fixed-size chunks, so memory use does not grow with the table.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+
+ADMIN_EXPORT_BATCH_SIZE = 1000 # Rows fetched per server-side cursor round trip
+EXPORT_CHUNK_SIZE = 64 * 1024 # Characters per streamed chunk
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"} # Format to media type
+
+
+def enrollment_rows(db: Session, batch_size: int = ADMIN_EXPORT_BATCH_SIZE):
+    """Enrollments with their user email, course title and completed lesson count, by id.
+
+    The count is the enrollment's progress counter, so it agrees with the API
+    and only counts lessons of the enrolled course.
+    """
+    enrollments, users, courses = models.Enrollment.__table__, models.User.__table__, models.Course.__table__
+    return db.execute(
+        select(
+            enrollments.c.id, enrollments.c.user_id, users.c.email.label("user_email"),
+            enrollments.c.course_id, courses.c.title.label("course_title"),
+            enrollments.c.enrolled_at, enrollments.c.completed_lesson_count.label("completed_lessons"),
+        )
+        .join(users, users.c.id == enrollments.c.user_id)
+        .join(courses, courses.c.id == enrollments.c.course_id)
+        .order_by(enrollments.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+def user_skill_rows(db: Session, batch_size: int = ADMIN_EXPORT_BATCH_SIZE):
+    """User skill proficiencies with the user email and skill name, by id."""
+    user_skills, users, skills = models.UserSkill.__table__, models.User.__table__, models.Skill.__table__
+    return db.execute(
+        select(
+            user_skills.c.id, user_skills.c.user_id, users.c.email.label("user_email"),
+            user_skills.c.skill_id, skills.c.name.label("skill_name"),
+            user_skills.c.proficiency_score, user_skills.c.last_assessed_at,
+        )
+        .join(users, users.c.id == user_skills.c.user_id)
+        .join(skills, skills.c.id == user_skills.c.skill_id)
+        .order_by(user_skills.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+
+def _isoformat(value):
+    # Timestamps are written in ISO 8601, as the API returns them
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_chunks(result, export_format: str) -> Iterator[str]:
+    """Yield the rows of a result as CSV (with a header line) or NDJSON, in chunks of about EXPORT_CHUNK_SIZE."""
+    columns = list(result.keys())
+    buffer = io.StringIO()
+    if export_format == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write_row = lambda row: writer.writerow([_isoformat(value) for value in row])
+    else:
+        write_row = lambda row: buffer.write(json.dumps(dict(zip(columns, row)), default=_isoformat) + "\n")
+    for row in result:
+        write_row(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
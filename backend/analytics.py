@@ -0,0 +1,303 @@
+"""Admin analytics rollups.
+
+Per-course enrollment and completion counts (models.CourseStats) and
+per-skill proficiency totals and distributions (models.SkillStats,
+models.SkillProficiencyBucket) are kept as rollup rows, so the
+/admin/analytics endpoints read a handful of rows whatever the data size.
+
+crud calls the record_* functions inside its own transactions to apply
+each change incrementally. reconcile() recomputes everything from the
+source rows and corrects any drift (e.g. from concurrent proficiency
+updates); it runs every ANALYTICS_RECONCILE_INTERVAL seconds in the app,
+or from `python analytics.py reconcile`.
+
+Time-windowed activity (get_course_activity) is read from the source rows
+instead, through range scans of their (course or lesson, timestamp) indexes,
+so its cost follows the activity inside the window, not the table sizes.
+"""
+import os
+import sys
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, and_, case, delete, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from database import dialect_insert
+
+ANALYTICS_RECONCILE_INTERVAL = int(os.getenv("ANALYTICS_RECONCILE_INTERVAL", "3600")) # Seconds; 0 disables the in-app job
+PROFICIENCY_BUCKETS = 10 # Bands of 10 points; 100 falls in the last one
+ACTIVITY_MAX_DAYS = 366 # Longest window served by get_course_activity
+
+
+def proficiency_bucket(score: int) -> int:
+    return min(max(score, 0) // 10, PROFICIENCY_BUCKETS - 1)
+
+def _bucket_expression(score_column):
+    # proficiency_bucket in SQL
+    return case((score_column < 0, 0), (score_column >= 10 * (PROFICIENCY_BUCKETS - 1), PROFICIENCY_BUCKETS - 1), else_=score_column // 10)
+
+
+# Incremental updates
+def _add_to_rows(db: Session, table, key_columns: List[str], rows: List[dict]):
+    """Upsert rows, adding their non-key values to the existing ones."""
+    if not rows:
+        return
+    stmt = dialect_insert(db.get_bind(), table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + stmt.excluded[column] for column in rows[0] if column not in key_columns},
+    )
+    db.execute(stmt, rows)
+
+def record_enrollment(db: Session, course_id: int):
+    _add_to_rows(db, models.CourseStats.__table__, ["course_id"], [
+        {"course_id": course_id, "enrollment_count": 1, "completed_enrollment_count": 0, "lesson_completion_count": 0}
+    ])
+
+def record_completion_change(db: Session, enrollment_id: int, delta: int):
+    """Apply a counted completion change (1 or -1) of an enrollment, after its progress counters were updated.
+
+    An enrollment counts as completed when its course has lessons and all of
+    them are completed, so it enters or leaves the completed count when the
+    change crosses that line.
+    """
+    stats, enrollments, courses = models.CourseStats.__table__, models.Enrollment.__table__, models.Course.__table__
+    completed = select(enrollments.c.completed_lesson_count).where(enrollments.c.id == enrollment_id).scalar_subquery()
+    total = select(courses.c.lesson_count).where(courses.c.id == stats.c.course_id).scalar_subquery()
+    crossed = completed == total if delta > 0 else completed + 1 == total
+    db.execute(
+        update(stats)
+        .where(stats.c.course_id == select(enrollments.c.course_id).where(enrollments.c.id == enrollment_id).scalar_subquery())
+        .values(
+            lesson_completion_count=stats.c.lesson_completion_count + delta,
+            completed_enrollment_count=stats.c.completed_enrollment_count + case((and_(total > 0, crossed), delta), else_=0),
+        )
+    )
+
+def record_proficiency_changes(db: Session, changes: Iterable[Tuple[int, Optional[int], int]]):
+    """Apply (skill_id, old score or None for a new row, new score) changes to the skill rollups."""
+    totals: Dict[int, List[int]] = {}
+    buckets: Dict[Tuple[int, int], int] = {}
+    for skill_id, old_score, new_score in changes:
+        users_and_sum = totals.setdefault(skill_id, [0, 0])
+        if old_score is None:
+            users_and_sum[0] += 1
+            users_and_sum[1] += new_score
+        else:
+            users_and_sum[1] += new_score - old_score
+            buckets[(skill_id, proficiency_bucket(old_score))] = buckets.get((skill_id, proficiency_bucket(old_score)), 0) - 1
+        buckets[(skill_id, proficiency_bucket(new_score))] = buckets.get((skill_id, proficiency_bucket(new_score)), 0) + 1
+
+    _add_to_rows(db, models.SkillStats.__table__, ["skill_id"], [
+        {"skill_id": skill_id, "user_count": users, "proficiency_sum": score_sum}
+        for skill_id, (users, score_sum) in sorted(totals.items()) if users or score_sum
+    ])
+    _add_to_rows(db, models.SkillProficiencyBucket.__table__, ["skill_id", "bucket"], [
+        {"skill_id": skill_id, "bucket": bucket, "user_count": count}
+        for (skill_id, bucket), count in sorted(buckets.items()) if count
+    ])
+
+def forget_course(db: Session, course_id: int):
+    db.execute(delete(models.CourseStats).where(models.CourseStats.course_id == course_id))
+
+def forget_skill(db: Session, skill_id: int):
+    db.execute(delete(models.SkillStats).where(models.SkillStats.skill_id == skill_id))
+    db.execute(delete(models.SkillProficiencyBucket).where(models.SkillProficiencyBucket.skill_id == skill_id))
+
+
+# Full recompute
+def _course_stats_query(course_ids: Optional[List[int]] = None):
+    enrollments, courses = models.Enrollment.__table__, models.Course.__table__
+    query = (
+        select(
+            enrollments.c.course_id,
+            func.count().label("enrollment_count"),
+            func.sum(case((and_(courses.c.lesson_count > 0, enrollments.c.completed_lesson_count >= courses.c.lesson_count), 1), else_=0)).label("completed_enrollment_count"),
+            func.sum(enrollments.c.completed_lesson_count).label("lesson_completion_count"),
+        )
+        .join(courses, courses.c.id == enrollments.c.course_id)
+        .group_by(enrollments.c.course_id)
+    )
+    if course_ids is not None:
+        query = query.where(enrollments.c.course_id.in_(course_ids))
+    return query
+
+def _replace_rows(db: Session, model, key_columns: List[str], fresh_rows: List[dict], scope=None) -> int:
+    """Make model's rows (optionally only those matching scope) equal fresh_rows. Returns the number of rows that disagreed."""
+    table = model.__table__
+    current_query = select(table)
+    if scope is not None:
+        current_query = current_query.where(scope)
+    current = {tuple(row[column] for column in key_columns): dict(row) for row in db.execute(current_query).mappings()}
+    fresh = {tuple(row[column] for column in key_columns): row for row in fresh_rows}
+
+    changed = [row for key, row in fresh.items() if current.get(key) != row]
+    stale = [key for key in current if key not in fresh]
+    # Counts that dropped to zero leave their rows behind; those agree with the recompute
+    drifted = len(changed) + sum(1 for key in stale if any(value for column, value in current[key].items() if column not in key_columns))
+    if changed:
+        stmt = dialect_insert(db.get_bind(), table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: stmt.excluded[column] for column in changed[0] if column not in key_columns},
+        )
+        db.execute(stmt, changed)
+    for key in stale:
+        db.execute(delete(table).where(*(table.c[column] == value for column, value in zip(key_columns, key))))
+    return drifted
+
+def refresh_courses(db: Session, course_ids: List[int]) -> int:
+    """Recompute the stats of some courses, after changes that affect many of their enrollments at once."""
+    fresh_rows = [dict(row) for row in db.execute(_course_stats_query(course_ids)).mappings()]
+    return _replace_rows(db, models.CourseStats, ["course_id"], fresh_rows, models.CourseStats.course_id.in_(course_ids))
+
+def reconcile(db: Session) -> Dict[str, int]:
+    """Recompute every rollup from the source rows and commit. Returns the number of rows corrected per table."""
+    user_skills = models.UserSkill.__table__
+    course_rows = [dict(row) for row in db.execute(_course_stats_query()).mappings()]
+    skill_rows = [dict(row) for row in db.execute(
+        select(user_skills.c.skill_id, func.count().label("user_count"), func.sum(user_skills.c.proficiency_score).label("proficiency_sum"))
+        .group_by(user_skills.c.skill_id)
+    ).mappings()]
+    # Grouped through a subquery: PostgreSQL would not match a GROUP BY of the bound CASE expression to the SELECT's
+    scores = select(user_skills.c.skill_id, _bucket_expression(user_skills.c.proficiency_score).label("bucket")).subquery()
+    bucket_rows = [dict(row) for row in db.execute(
+        select(scores.c.skill_id, scores.c.bucket, func.count().label("user_count")).group_by(scores.c.skill_id, scores.c.bucket)
+    ).mappings()]
+    corrected = {
+        "course_stats": _replace_rows(db, models.CourseStats, ["course_id"], course_rows),
+        "skill_stats": _replace_rows(db, models.SkillStats, ["skill_id"], skill_rows),
+        "skill_proficiency_buckets": _replace_rows(db, models.SkillProficiencyBucket, ["skill_id", "bucket"], bucket_rows),
+    }
+    db.commit()
+    return corrected
+
+
+# Reads
+def _course_analytics(row) -> schemas.CourseAnalytics:
+    enrollments = row.enrollment_count or 0
+    lesson_slots = enrollments * row.lesson_count
+    return schemas.CourseAnalytics(
+        course_id=row.id,
+        title=row.title,
+        lesson_count=row.lesson_count,
+        enrollments=enrollments,
+        completed_enrollments=row.completed_enrollment_count or 0,
+        completion_rate=round(100 * (row.completed_enrollment_count or 0) / enrollments, 1) if enrollments else 0.0,
+        average_progress=round(100 * (row.lesson_completion_count or 0) / lesson_slots, 1) if lesson_slots else 0.0,
+    )
+
+def _course_analytics_query():
+    courses, stats = models.Course.__table__, models.CourseStats.__table__
+    return select(
+        courses.c.id, courses.c.title, courses.c.lesson_count,
+        stats.c.enrollment_count, stats.c.completed_enrollment_count, stats.c.lesson_completion_count,
+    ).outerjoin(stats, stats.c.course_id == courses.c.id)
+
+def get_course_analytics(db: Session, skip: int = 0, limit: int = 100) -> List[schemas.CourseAnalytics]:
+    rows = db.execute(_course_analytics_query().order_by(models.Course.id).offset(skip).limit(limit)).all()
+    return [_course_analytics(row) for row in rows]
+
+def get_course_analytics_for(db: Session, course_id: int) -> Optional[schemas.CourseAnalytics]:
+    row = db.execute(_course_analytics_query().where(models.Course.id == course_id)).first()
+    return _course_analytics(row) if row is not None else None
+
+def _skill_analytics(skill_id: int, name: str, user_count: Optional[int], proficiency_sum: Optional[int], buckets: Dict[int, int]) -> schemas.SkillAnalytics:
+    user_count = user_count or 0
+    return schemas.SkillAnalytics(
+        skill_id=skill_id,
+        name=name,
+        users=user_count,
+        average_proficiency=round(proficiency_sum / user_count, 1) if user_count else None,
+        distribution=[
+            schemas.ProficiencyBucket(
+                min_score=10 * bucket,
+                max_score=100 if bucket == PROFICIENCY_BUCKETS - 1 else 10 * bucket + 9,
+                users=buckets.get(bucket, 0),
+            )
+            for bucket in range(PROFICIENCY_BUCKETS)
+        ],
+    )
+
+def get_skill_analytics(db: Session, skip: int = 0, limit: int = 100, skill_id: Optional[int] = None) -> List[schemas.SkillAnalytics]:
+    skills, stats, buckets = models.Skill.__table__, models.SkillStats.__table__, models.SkillProficiencyBucket.__table__
+    page = select(skills.c.id, skills.c.name).order_by(skills.c.id)
+    page = page.where(skills.c.id == skill_id) if skill_id is not None else page.offset(skip).limit(limit)
+    page = page.subquery()
+    # One row per skill and bucket; skills without users come back with NULL stats
+    rows = db.execute(
+        select(page.c.id, page.c.name, stats.c.user_count, stats.c.proficiency_sum, buckets.c.bucket, buckets.c.user_count.label("bucket_users"))
+        .outerjoin(stats, stats.c.skill_id == page.c.id)
+        .outerjoin(buckets, buckets.c.skill_id == page.c.id)
+        .order_by(page.c.id, buckets.c.bucket)
+    ).all()
+    by_skill: Dict[int, tuple] = {}
+    for row in rows:
+        if row.id not in by_skill:
+            by_skill[row.id] = (row.name, row.user_count, row.proficiency_sum, {})
+        if row.bucket is not None:
+            by_skill[row.id][3][row.bucket] = row.bucket_users
+    return [_skill_analytics(skill_id, *values) for skill_id, values in by_skill.items()]
+
+
+# Activity windows
+def get_course_activity(db: Session, course_id: int, days: int) -> schemas.CourseActivity:
+    """New enrollments, lesson completions and active learners of a course per UTC day, over the last days days."""
+    first_day = datetime.utcnow().date() - timedelta(days=days - 1)
+    since = datetime.combine(first_day, time.min)
+    enrollments, completions = models.Enrollment, models.LessonCompletion
+
+    enrollment_day = func.date(enrollments.enrolled_at, type_=Date)
+    enrollments_by_day = dict(db.execute(
+        select(enrollment_day, func.count())
+        .where(enrollments.course_id == course_id, enrollments.enrolled_at >= since)
+        .group_by(enrollment_day)
+    ).all())
+
+    # Completions are found per lesson of the course, each a range scan of
+    # ix_lesson_completions_lesson_completed_at. Completions from enrollments
+    # in other courses, which crud does not count, are dropped by a primary key
+    # lookup per row: a join would let the planner start from every enrollment
+    # of the course instead.
+    course_lessons = select(models.Lesson.id).join(models.Module, models.Module.id == models.Lesson.module_id).where(models.Module.course_id == course_id)
+    enrollment_course = select(enrollments.course_id).where(enrollments.id == completions.enrollment_id).scalar_subquery()
+    completion_day = func.date(completions.completed_at, type_=Date)
+    # One row per learner and day, so the window's distinct learners come from the same pass
+    learner_days = db.execute(
+        select(completion_day, completions.enrollment_id, func.count())
+        .where(completions.lesson_id.in_(course_lessons), completions.completed_at >= since, enrollment_course == course_id)
+        .group_by(completion_day, completions.enrollment_id)
+    ).all()
+    completions_by_day = {}
+    for day, _, count in learner_days:
+        day_completions, day_learners = completions_by_day.get(day, (0, 0))
+        completions_by_day[day] = (day_completions + count, day_learners + 1)
+
+    daily = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        lesson_completions, learners = completions_by_day.get(day, (0, 0))
+        daily.append(schemas.DailyActivity(
+            day=day, enrollments=enrollments_by_day.get(day, 0), lesson_completions=lesson_completions, active_learners=learners,
+        ))
+    return schemas.CourseActivity(
+        course_id=course_id,
+        since=since,
+        enrollments=sum(enrollments_by_day.values()),
+        lesson_completions=sum(activity.lesson_completions for activity in daily),
+        active_learners=len({enrollment_id for _, enrollment_id, _ in learner_days}),
+        daily=daily,
+    )
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    if sys.argv[1:] != ["reconcile"]:
+        sys.exit("Usage: python analytics.py reconcile")
+    with SessionLocal() as db:
+        corrected = reconcile(db)
+    print("Corrected rows: " + ", ".join(f"{count} {table}" for table, count in corrected.items()))
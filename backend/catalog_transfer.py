@@ -0,0 +1,345 @@
+"""Bulk import and export of the course catalog as NDJSON.
+
+One JSON object per line, each parent before its children:
+
+  {"type": "skill", "id": 1, "name": "Python", "description": null}
+  {"type": "course", "id": 1, "title": "...", "description": "...", "instructor_id": 2, "skill_ids": [1]}
+  {"type": "module", "id": 1, "course_id": 1, "title": "...", "description": "...", "order": 1, "skill_ids": []}
+  {"type": "lesson", "id": 1, "module_id": 1, "title": "...", "content": "...", "content_type": "text", "order": 1}
+
+Ids only link records within a file; imported rows get new ids. Skills are
+matched to existing skills by name. A zipped package holds one or more
+.ndjson files, read in name order.
+
+Usage: python catalog_transfer.py import FILE | export [FILE]
+"""
+import io
+import json
+import sys
+import zipfile
+from collections import Counter
+from typing import IO, Dict, Iterator, List, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+import catalog_versions
+import content_search
+import models
+import schemas
+from course_cache import course_cache
+from skill_index import skill_index
+
+CATALOG_TRANSFER_BATCH_SIZE = 1000 # Rows per executemany batch and per transaction
+RECORD_TYPES = ("skill", "course", "module", "lesson") # Dependency order
+# Each record's fields are checked against the API's create schema
+RECORD_SCHEMAS = {"skill": schemas.SkillCreate, "course": schemas.CourseCreate, "module": schemas.ModuleCreate, "lesson": schemas.LessonCreate}
+
+
+class CatalogImportError(ValueError):
+    """Raised for malformed import files; the API answers 400."""
+
+
+def read_records(fileobj: IO[bytes]) -> Iterator[Tuple[str, dict]]:
+    """Yield (location, record) for an NDJSON file or a zipped package of them."""
+    head = fileobj.read(4)
+    fileobj.seek(0)
+    if head == b"PK\x03\x04":
+        with zipfile.ZipFile(fileobj) as package:
+            for name in sorted(n for n in package.namelist() if n.endswith(".ndjson")):
+                with package.open(name) as member:
+                    yield from _read_ndjson(member, name)
+    else:
+        yield from _read_ndjson(fileobj)
+
+def _read_ndjson(stream: IO[bytes], name: str = "") -> Iterator[Tuple[str, dict]]:
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8"), start=1):
+        location = f"{name} line {line_number}".lstrip()
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise CatalogImportError(f"{location}: invalid JSON ({exc.msg})")
+        if not isinstance(record, dict) or record.get("type") not in RECORD_TYPES:
+            raise CatalogImportError(f"{location}: expected an object with type in {RECORD_TYPES}")
+        yield location, record
+
+
+class CatalogImporter:
+    """Insert catalog records in batches, remapping file ids to database ids.
+
+    Records are validated as they are added and buffered per type. When a
+    buffer fills, all buffers are written in dependency order in one
+    transaction, one executemany INSERT per table, so a child is never
+    written before its parent. Batches that were committed stay if a later
+    record fails.
+    """
+
+    def __init__(self, db: Session, batch_size: int = CATALOG_TRANSFER_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.pending: Dict[str, List[Tuple[str, dict]]] = {record_type: [] for record_type in RECORD_TYPES}
+        self.id_maps: Dict[str, Dict[int, int]] = {record_type: {} for record_type in RECORD_TYPES}
+        self.counts: Dict[str, int] = {record_type: 0 for record_type in RECORD_TYPES}
+        # Parents of the rows in the current batch, which an earlier batch may have written
+        self.changed_course_ids: Set[int] = set()
+        self.changed_module_ids: Set[int] = set()
+
+    def add(self, location: str, record: dict):
+        buffer = self.pending[record["type"]]
+        buffer.append((location, self._validate(location, record)))
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not any(self.pending.values()):
+            return
+        self.changed_course_ids.clear()
+        self.changed_module_ids.clear()
+        self._insert_skills()
+        course_ids, module_ids, lesson_ids = self._insert_courses(), self._insert_modules(), self._insert_lessons()
+        changed_course_ids = sorted(self.changed_course_ids.union(course_ids))
+        new_scopes = [catalog_versions.CATALOG_SCOPE]
+        new_scopes += [catalog_versions.course_scope(course_id) for course_id in changed_course_ids]
+        new_scopes += [catalog_versions.module_scope(module_id) for module_id in sorted(self.changed_module_ids.union(module_ids))]
+        new_scopes += [catalog_versions.lesson_scope(lesson_id) for lesson_id in lesson_ids]
+        catalog_versions.bump(self.db, new_scopes)
+        for course_id in changed_course_ids:
+            course_cache.invalidate(course_id)
+        if course_ids or module_ids:
+            catalog_versions.increment(self.db, catalog_versions.SKILL_INDEX_SCOPE) # Their skill links
+        content_search.index(self.db, course_ids=course_ids, module_ids=module_ids, lesson_ids=lesson_ids)
+        self.db.commit()
+
+    def finish(self) -> Dict[str, int]:
+        """Write what is still buffered and return the number of records imported per type."""
+        self.flush()
+        return dict(self.counts)
+
+    # Helpers
+    def _validate(self, location: str, record: dict) -> dict:
+        # The record with its schema fields parsed; the link fields are checked here
+        try:
+            fields = RECORD_SCHEMAS[record["type"]].model_validate(record).model_dump()
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            raise CatalogImportError(f"{location}: {field}: {error['msg']}")
+        for field in ("id", "course_id", "module_id"):
+            if field in record and not isinstance(record[field], int):
+                raise CatalogImportError(f"{location}: {field} must be an integer")
+        skill_ids = record.get("skill_ids") or []
+        if not isinstance(skill_ids, list) or not all(isinstance(skill_id, int) for skill_id in skill_ids):
+            raise CatalogImportError(f"{location}: skill_ids must be a list of integers")
+        return {**record, **fields}
+
+    def _take(self, record_type: str) -> List[Tuple[str, dict]]:
+        records, self.pending[record_type] = self.pending[record_type], []
+        self.counts[record_type] += len(records)
+        return records
+
+    def _insert_rows(self, table, rows: List[dict]) -> List[int]:
+        if not rows:
+            return []
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return self.db.execute(stmt, rows).scalars().all()
+
+    def _remap(self, location: str, field: str, file_id, record_type: str) -> int:
+        new_id = self.id_maps[record_type].get(file_id)
+        if new_id is None:
+            raise CatalogImportError(f"{location}: {field} {file_id!r} does not refer to an earlier {record_type}")
+        return new_id
+
+    def _remember(self, record_type: str, records: List[Tuple[str, dict]], new_ids: List[int]):
+        for (_, record), new_id in zip(records, new_ids):
+            if "id" in record:
+                self.id_maps[record_type][record["id"]] = new_id
+
+    def _require(self, location: str, record: dict, field: str):
+        if not record.get(field):
+            raise CatalogImportError(f"{location}: missing {field}")
+        return record[field]
+
+    def _insert_skills(self):
+        records = self._take("skill")
+        if not records:
+            return
+        names = [self._require(location, record, "name") for location, record in records]
+        skills = models.Skill.__table__
+        skill_ids_by_name = dict(self.db.execute(select(skills.c.name, skills.c.id).where(skills.c.name.in_(names))).all())
+        new_rows = []
+        for _, record in records:
+            if record["name"] not in skill_ids_by_name:
+                skill_ids_by_name[record["name"]] = None # Claimed; repeated names in the file share one row
+                new_rows.append({"name": record["name"], "description": record.get("description")})
+        for row, new_id in zip(new_rows, self._insert_rows(skills, new_rows)):
+            skill_ids_by_name[row["name"]] = new_id
+        for _, record in records:
+            if "id" in record:
+                self.id_maps["skill"][record["id"]] = skill_ids_by_name[record["name"]]
+
+    def _insert_skill_links(self, table, owner_column: str, records: List[Tuple[str, dict]], owner_ids: List[int]):
+        links = [
+            {owner_column: owner_id, "skill_id": self._remap(location, "skill_ids", skill_id, "skill")}
+            for (location, record), owner_id in zip(records, owner_ids)
+            for skill_id in dict.fromkeys(record.get("skill_ids") or [])
+        ]
+        if links:
+            self.db.execute(insert(table), links)
+
+    def _insert_courses(self) -> List[int]:
+        records = self._take("course")
+        if not records:
+            return []
+        instructor_ids = {record.get("instructor_id") for _, record in records} - {None}
+        known_users = set(self.db.scalars(select(models.User.id).where(models.User.id.in_(instructor_ids)))) if instructor_ids else set()
+        rows = [{
+            "title": self._require(location, record, "title"),
+            "description": record.get("description"),
+            # Users are not part of the catalog; unknown instructors are dropped
+            "instructor_id": record.get("instructor_id") if record.get("instructor_id") in known_users else None,
+        } for location, record in records]
+        new_ids = self._insert_rows(models.Course.__table__, rows)
+        self._remember("course", records, new_ids)
+        self._insert_skill_links(models.course_skill_association_table, "course_id", records, new_ids)
+        return new_ids
+
+    def _insert_modules(self) -> List[int]:
+        records = self._take("module")
+        if not records:
+            return []
+        rows = [{
+            "title": self._require(location, record, "title"),
+            "description": record.get("description"),
+            "order": record.get("order") or 0,
+            "course_id": self._remap(location, "course_id", record.get("course_id"), "course"),
+        } for location, record in records]
+        new_ids = self._insert_rows(models.Module.__table__, rows)
+        self._remember("module", records, new_ids)
+        self.changed_course_ids.update(row["course_id"] for row in rows)
+        self._insert_skill_links(models.module_skill_association_table, "module_id", records, new_ids)
+        return new_ids
+
+    def _insert_lessons(self) -> List[int]:
+        records = self._take("lesson")
+        if not records:
+            return []
+        rows = [{
+            "title": self._require(location, record, "title"),
+            "content": record.get("content"),
+            "content_type": record.get("content_type") or "text",
+            "order": record.get("order") or 0,
+            "module_id": self._remap(location, "module_id", record.get("module_id"), "module"),
+        } for location, record in records]
+        new_ids = self._insert_rows(models.Lesson.__table__, rows)
+        self._remember("lesson", records, new_ids)
+        self._add_lesson_counts([row["module_id"] for row in rows])
+        return new_ids
+
+    def _add_lesson_counts(self, module_ids: List[int]):
+        # Keep the lesson totals behind progress (see crud) in step with the inserted lessons
+        modules, courses = models.Module.__table__, models.Course.__table__
+        lessons_per_module = Counter(module_ids)
+        course_ids = dict(self.db.execute(select(modules.c.id, modules.c.course_id).where(modules.c.id.in_(lessons_per_module))).all())
+        lessons_per_course = Counter()
+        for module_id, count in lessons_per_module.items():
+            lessons_per_course[course_ids[module_id]] += count
+        self.changed_module_ids.update(lessons_per_module)
+        self.changed_course_ids.update(lessons_per_course)
+        for table, counts in ((modules, lessons_per_module), (courses, lessons_per_course)):
+            self.db.execute(
+                update(table).where(table.c.id == bindparam("row_id")).values(lesson_count=table.c.lesson_count + bindparam("added")),
+                [{"row_id": row_id, "added": count} for row_id, count in counts.items()],
+            )
+
+
+def import_catalog(db: Session, fileobj: IO[bytes], batch_size: int = CATALOG_TRANSFER_BATCH_SIZE) -> Dict[str, int]:
+    """Import an NDJSON file or zipped package. Returns the number of records imported per type."""
+    importer = CatalogImporter(db, batch_size)
+    try:
+        for location, record in read_records(fileobj):
+            importer.add(location, record)
+        return importer.finish()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        # Batches committed before a failure stay, so the index is reloaded either way.
+        # Each batch with courses or modules advanced the skill index version, which makes other workers reload theirs.
+        skill_index.load(db)
+
+
+# Export
+def _skill_ids_by_owner(db: Session, table, owner_column: str, owner_ids: List[int]) -> Dict[int, List[int]]:
+    owner = table.c[owner_column]
+    skill_ids: Dict[int, List[int]] = {}
+    for owner_id, skill_id in db.execute(select(owner, table.c.skill_id).where(owner.in_(owner_ids)).order_by(owner, table.c.skill_id)):
+        skill_ids.setdefault(owner_id, []).append(skill_id)
+    return skill_ids
+
+def export_catalog(db: Session, batch_size: int = CATALOG_TRANSFER_BATCH_SIZE) -> Iterator[str]:
+    """Yield the whole catalog as NDJSON lines, in an order import_catalog accepts.
+
+    Rows are streamed from server-side cursors batch_size at a time, so memory
+    use does not grow with the catalog.
+    """
+    skills = models.Skill.__table__
+    for row in db.execute(select(skills.c.id, skills.c.name, skills.c.description).order_by(skills.c.id).execution_options(yield_per=batch_size)):
+        yield json.dumps({"type": "skill", "id": row.id, "name": row.name, "description": row.description}) + "\n"
+
+    courses = models.Course.__table__
+    course_rows = db.execute(select(courses.c.id, courses.c.title, courses.c.description, courses.c.instructor_id).order_by(courses.c.id).execution_options(yield_per=batch_size))
+    for batch in course_rows.partitions():
+        skill_ids = _skill_ids_by_owner(db, models.course_skill_association_table, "course_id", [row.id for row in batch])
+        for row in batch:
+            yield json.dumps({
+                "type": "course", "id": row.id, "title": row.title, "description": row.description,
+                "instructor_id": row.instructor_id, "skill_ids": skill_ids.get(row.id, []),
+            }) + "\n"
+
+    modules = models.Module.__table__
+    module_rows = db.execute(select(modules.c.id, modules.c.course_id, modules.c.title, modules.c.description, modules.c.order).order_by(modules.c.id).execution_options(yield_per=batch_size))
+    for batch in module_rows.partitions():
+        skill_ids = _skill_ids_by_owner(db, models.module_skill_association_table, "module_id", [row.id for row in batch])
+        for row in batch:
+            yield json.dumps({
+                "type": "module", "id": row.id, "course_id": row.course_id, "title": row.title,
+                "description": row.description, "order": row.order, "skill_ids": skill_ids.get(row.id, []),
+            }) + "\n"
+
+    lessons = models.Lesson.__table__
+    lesson_rows = db.execute(select(lessons.c.id, lessons.c.module_id, lessons.c.title, lessons.c.content, lessons.c.content_type, lessons.c.order).order_by(lessons.c.id).execution_options(yield_per=batch_size))
+    for row in lesson_rows:
+        yield json.dumps({
+            "type": "lesson", "id": row.id, "module_id": row.module_id, "title": row.title,
+            "content": row.content, "content_type": row.content_type, "order": row.order,
+        }) + "\n"
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "import" and len(sys.argv) == 3:
+        with SessionLocal() as db, open(sys.argv[2], "rb") as source:
+            try:
+                counts = import_catalog(db, source)
+            except CatalogImportError as exc:
+                sys.exit(f"Import failed: {exc}")
+        print("Imported " + ", ".join(f"{count} {record_type}s" for record_type, count in counts.items()))
+    elif command == "export" and len(sys.argv) <= 3:
+        path = sys.argv[2] if len(sys.argv) == 3 else None
+        with SessionLocal() as db:
+            if path is None:
+                sys.stdout.writelines(export_catalog(db))
+            elif path.endswith(".zip"):
+                with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package, package.open("catalog.ndjson", "w") as member:
+                    for line in export_catalog(db):
+                        member.write(line.encode())
+            else:
+                with open(path, "w", encoding="utf-8") as target:
+                    target.writelines(export_catalog(db))
+    else:
+        sys.exit(__doc__)
@@ -0,0 +1,93 @@
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", "0")) # Seconds clients may reuse a response unchecked
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_CACHE_MAX_AGE}, must-revalidate"
+
+# Scopes. "catalog" covers the course listing; the others cover one resource
+# and everything its endpoints embed (a course scope covers its modules,
+# lessons and skills).
+CATALOG_SCOPE = "catalog"
+# Counts the writes the in-process skill index reflects (see skill_index). A
+# counter rather than a timestamp, so a worker can tell whether its own write
+# was the only change since its index was loaded.
+SKILL_INDEX_SCOPE = "skill-index"
+
+def course_scope(course_id: int) -> str:
+    return f"course:{course_id}"
+
+def module_scope(module_id: int) -> str:
+    return f"module:{module_id}"
+
+def lesson_scope(lesson_id: int) -> str:
+    return f"lesson:{lesson_id}"
+
+
+def new_version() -> int:
+    # Microsecond timestamps, so versions are not reused after a database reset
+    return time.time_ns() // 1000
+
+def bump(db: Session, scopes: Iterable[str]):
+    """Give each scope a new version inside db's current transaction.
+
+    The new version is the current timestamp, or the old version plus one if
+    that is larger, so it always moves forward. Call it before the write is
+    committed, so the version and the data change atomically.
+    """
+    scopes = sorted(set(scopes)) # A fixed order avoids lock-order deadlocks
+    if not scopes:
+        return
+    table = models.CatalogVersion.__table__
+    stmt = dialect_insert(db.get_bind(), table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"version": case((table.c.version >= stmt.excluded.version, table.c.version + 1), else_=stmt.excluded.version)}
+    )
+    version = new_version()
+    db.execute(stmt, [{"scope": scope, "version": version} for scope in scopes])
+
+def increment(db: Session, scope: str) -> int:
+    """Add one to scope's counter inside db's current transaction; returns the new value."""
+    table = models.CatalogVersion.__table__
+    stmt = dialect_insert(db.get_bind(), table).values(scope=scope, version=1)
+    stmt = stmt.on_conflict_do_update(index_elements=["scope"], set_={"version": table.c.version + 1})
+    return db.scalar(stmt.returning(table.c.version))
+
+def get_versions(db: Session, scopes: List[str]) -> Dict[str, int]:
+    """Return {scope: version} for the scopes that have a version, in one query."""
+    table = models.CatalogVersion.__table__
+    return dict(db.execute(select(table.c.scope, table.c.version).where(table.c.scope.in_(scopes))).all())
+
+def format_etag(versions: Dict[str, int], scopes: List[str]) -> Optional[str]:
+    """Return a strong ETag for the versions of scopes.
+
+    Returns None when a scope has no version row, i.e. the resource does not
+    exist or was created outside crud; such responses are not cacheable.
+    """
+    if any(scope not in versions for scope in scopes):
+        return None
+    return '"' + "-".join(format(versions[scope], "x") for scope in scopes) + '"'
+
+def etag(db: Session, scopes: List[str]) -> Optional[str]:
+    return format_etag(get_versions(db, scopes), scopes)
+
+def etag_matches(if_none_match: Optional[str], current_etag: str) -> bool:
+    """Evaluate an If-None-Match header against current_etag (weak comparison, per RFC 9110)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == current_etag:
+            return True
+    return False
@@ -0,0 +1,235 @@
+"""Full-text search over courses, modules and lessons.
+
+Course and module titles and descriptions, and lesson titles with their
+text or markdown content, are kept as documents of one search_documents
+index: an FTS5 table on SQLite, and on PostgreSQL a table with a weighted
+tsvector column under a GIN index. Titles rank above body text on both.
+
+crud calls index() and remove() inside its own transactions for every
+course, module or lesson it writes, so the index commits with the catalog.
+rebuild() recreates it from the catalog tables.
+
+Usage: python content_search.py rebuild
+"""
+import html
+import re
+import sys
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import (
+    BigInteger, Column, Computed, Index, Integer, MetaData, String, Table, Text,
+    case, delete, func, insert, literal, null, select, text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+
+SEARCH_LANGUAGE = "english" # PostgreSQL text search configuration
+INDEXED_LESSON_CONTENT_TYPES = ("text", "markdown")
+DOCUMENT_TYPES = ("course", "module", "lesson")
+SEARCH_MAX_TERMS = 16 # Further query words are ignored
+SEARCH_SNIPPET_WORDS = 24 # Approximate length of the body excerpt
+
+# Matches are marked with private-use characters inside the database, so the
+# text can be HTML-escaped before they become <mark> tags
+_MATCH_START, _MATCH_STOP = "\ue000", "\ue001"
+
+# Document keys interleave the three id spaces: id * 4 + type code
+_TYPE_CODES = {"course": 1, "module": 2, "lesson": 3}
+_KEY_STRIDE = 4
+
+def _document_columns(key_column: Column) -> List[Column]:
+    return [
+        key_column,
+        Column("doc_type", String, nullable=False),
+        Column("doc_id", Integer, nullable=False),
+        Column("course_id", Integer, nullable=False),
+        Column("module_id", Integer, nullable=True),
+        Column("title", Text, nullable=False),
+        Column("body", Text, nullable=False),
+    ]
+
+search_metadata = MetaData()
+# PostgreSQL: a plain table with a generated tsvector
+postgresql_documents = Table("search_documents", search_metadata,
+    *_document_columns(Column("id", BigInteger, primary_key=True, autoincrement=False)),
+    Column("document", TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_LANGUAGE}', title), 'A') || setweight(to_tsvector('{SEARCH_LANGUAGE}', body), 'B')",
+        persisted=True,
+    )),
+    Index("ix_search_documents_document", "document", postgresql_using="gin"),
+)
+# SQLite: the FTS5 table, addressed through its rowid; created by create_search_index()
+sqlite_documents = Table("search_documents", MetaData(),
+    *_document_columns(Column("rowid", Integer, key="id", primary_key=True, autoincrement=False)),
+)
+SQLITE_CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents USING fts5("
+    "title, body, doc_type UNINDEXED, doc_id UNINDEXED, course_id UNINDEXED, module_id UNINDEXED, "
+    "tokenize = 'porter unicode61 remove_diacritics 2')"
+)
+
+
+def _is_postgresql(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+def _documents_table(bind) -> Table:
+    return postgresql_documents if _is_postgresql(bind) else sqlite_documents
+
+def create_search_index(engine):
+    """Create the search_documents index for engine's dialect, if it does not exist yet."""
+    if _is_postgresql(engine):
+        search_metadata.create_all(bind=engine)
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(SQLITE_CREATE_INDEX))
+
+
+# Documents
+def _document_query(doc_type: str, ids: Optional[Iterable[int]] = None):
+    """SELECT producing the documents of the given ids of one type (all of them when ids is None)."""
+    if doc_type == "course":
+        courses = models.Course.__table__
+        query = select(
+            courses.c.id, courses.c.id, null(), courses.c.title, func.coalesce(courses.c.description, ""),
+        )
+        id_column = courses.c.id
+    elif doc_type == "module":
+        modules = models.Module.__table__
+        query = select(
+            modules.c.id, modules.c.course_id, null(), modules.c.title, func.coalesce(modules.c.description, ""),
+        )
+        id_column = modules.c.id
+    else:
+        lessons, modules = models.Lesson.__table__, models.Module.__table__
+        body = case(
+            (func.coalesce(lessons.c.content_type, "text").in_(INDEXED_LESSON_CONTENT_TYPES), func.coalesce(lessons.c.content, "")),
+            else_="",
+        )
+        query = select(
+            lessons.c.id, modules.c.course_id, lessons.c.module_id, lessons.c.title, body,
+        ).join(modules, modules.c.id == lessons.c.module_id)
+        id_column = lessons.c.id
+    query = query.add_columns(id_column * _KEY_STRIDE + _TYPE_CODES[doc_type], literal(doc_type))
+    if ids is not None:
+        query = query.where(id_column.in_(list(ids)))
+    return query
+
+_INSERT_COLUMNS = ["doc_id", "course_id", "module_id", "title", "body", "id", "doc_type"] # In _document_query order
+
+def _insert_documents(db: Session, doc_type: str, ids: Optional[Iterable[int]] = None):
+    table = _documents_table(db.get_bind())
+    db.execute(insert(table).from_select([table.c[name] for name in _INSERT_COLUMNS], _document_query(doc_type, ids)))
+
+def _keys(course_ids: Iterable[int], module_ids: Iterable[int], lesson_ids: Iterable[int]) -> List[int]:
+    return [
+        content_id * _KEY_STRIDE + _TYPE_CODES[doc_type]
+        for doc_type, content_ids in (("course", course_ids), ("module", module_ids), ("lesson", lesson_ids))
+        for content_id in content_ids
+    ]
+
+def remove(db: Session, course_ids: Iterable[int] = (), module_ids: Iterable[int] = (), lesson_ids: Iterable[int] = ()):
+    """Drop the documents of the given courses, modules and lessons."""
+    keys = _keys(course_ids, module_ids, lesson_ids)
+    if keys:
+        table = _documents_table(db.get_bind())
+        db.execute(delete(table).where(table.c.id.in_(keys)))
+
+def index(db: Session, course_ids: Iterable[int] = (), module_ids: Iterable[int] = (), lesson_ids: Iterable[int] = ()):
+    """(Re)write the documents of the given courses, modules and lessons from their flushed rows."""
+    course_ids, module_ids, lesson_ids = list(course_ids), list(module_ids), list(lesson_ids)
+    remove(db, course_ids, module_ids, lesson_ids)
+    for doc_type, ids in (("course", course_ids), ("module", module_ids), ("lesson", lesson_ids)):
+        if ids:
+            _insert_documents(db, doc_type, ids)
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Recreate every document from the catalog tables and commit. Returns the number of documents per type."""
+    bind = db.get_bind()
+    table = _documents_table(bind)
+    db.execute(delete(table))
+    for doc_type in DOCUMENT_TYPES:
+        _insert_documents(db, doc_type)
+    if not _is_postgresql(bind):
+        db.execute(text("INSERT INTO search_documents(search_documents) VALUES('optimize')")) # Merge the FTS5 segments
+    counts = dict(db.execute(select(table.c.doc_type, func.count()).group_by(table.c.doc_type)).all())
+    db.commit()
+    return {doc_type: counts.get(doc_type, 0) for doc_type in DOCUMENT_TYPES}
+
+
+# Queries
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+def _fts5_query(terms: List[str]) -> str:
+    # Every term must match; the last one as a prefix, for search-as-you-type
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+def _tsquery(terms: List[str]) -> str:
+    return " & ".join(terms) + ":*"
+
+SQLITE_SEARCH = (
+    "SELECT doc_type, doc_id, course_id, module_id, "
+    "highlight(search_documents, 0, :start, :stop) AS title, "
+    "snippet(search_documents, 1, :start, :stop, '…', :snippet_words) AS snippet, "
+    "-bm25(search_documents, 10.0, 1.0) AS score "
+    "FROM search_documents WHERE search_documents MATCH :query{type_filter} "
+    "ORDER BY bm25(search_documents, 10.0, 1.0), rowid LIMIT :limit OFFSET :skip"
+)
+# Ranks in a subquery first, so ts_headline only runs on the rows of the page
+POSTGRESQL_SEARCH = (
+    "SELECT d.doc_type, d.doc_id, d.course_id, d.module_id, "
+    "ts_headline('{language}', d.title, ranked.query, :title_options) AS title, "
+    "ts_headline('{language}', d.body, ranked.query, :snippet_options) AS snippet, "
+    "ranked.score "
+    "FROM (SELECT id, query, ts_rank_cd(document, query) AS score "
+    "FROM search_documents, to_tsquery('{language}', :query) query "
+    "WHERE document @@ query{type_filter} ORDER BY score DESC, id LIMIT :limit OFFSET :skip) ranked "
+    "JOIN search_documents d ON d.id = ranked.id ORDER BY ranked.score DESC, d.id"
+)
+
+def _marked(value: Optional[str]) -> str:
+    return html.escape(value or "").replace(_MATCH_START, "<mark>").replace(_MATCH_STOP, "</mark>")
+
+def search(db: Session, query: str, doc_type: Optional[str] = None, skip: int = 0, limit: int = 20) -> List[schemas.SearchResult]:
+    """Rank the documents matching every word of query (the last one as a prefix), best first.
+
+    Titles and snippets come back HTML-escaped, with the matched words in <mark> tags.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    type_filter = " AND doc_type = :doc_type" if doc_type is not None else ""
+    params = {"doc_type": doc_type, "skip": skip, "limit": limit}
+    if _is_postgresql(db.get_bind()):
+        statement = POSTGRESQL_SEARCH.format(language=SEARCH_LANGUAGE, type_filter=type_filter)
+        selectors = f'StartSel="{_MATCH_START}", StopSel="{_MATCH_STOP}"'
+        params.update(
+            query=_tsquery(terms),
+            title_options=f"HighlightAll=true, {selectors}",
+            snippet_options=f"MaxWords={SEARCH_SNIPPET_WORDS}, MinWords={SEARCH_SNIPPET_WORDS // 2}, {selectors}",
+        )
+    else:
+        statement = SQLITE_SEARCH.format(type_filter=type_filter)
+        params.update(query=_fts5_query(terms), start=_MATCH_START, stop=_MATCH_STOP, snippet_words=SEARCH_SNIPPET_WORDS)
+    rows = db.execute(text(statement), params).all()
+    return [
+        schemas.SearchResult(
+            type=row.doc_type, id=row.doc_id, course_id=row.course_id, module_id=row.module_id,
+            title=_marked(row.title), snippet=_marked(row.snippet), score=round(float(row.score), 6),
+        )
+        for row in rows
+    ]
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("Usage: python content_search.py rebuild")
+    create_search_index(engine)
+    with SessionLocal() as db:
+        counts = rebuild(db)
+    print("Indexed " + ", ".join(f"{count} {doc_type}s" for doc_type, count in counts.items()))
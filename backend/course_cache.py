@@ -0,0 +1,146 @@
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+COURSE_CACHE_SIZE = int(os.getenv("COURSE_CACHE_SIZE", "512")) # Serialized courses kept in memory per worker
+COURSE_VIEWS = ("full", "summary") # schemas.Course and schemas.CourseSummary
+
+
+class SharedCacheBackend(ABC):
+    """Interface for a cache shared between workers, such as Redis or memcached.
+
+    Values are opaque bytes. get returns None on a miss; backends may drop
+    entries at any time.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+
+class InMemorySharedBackend(SharedCacheBackend):
+    """Dict-backed SharedCacheBackend, standing in for a real shared cache in tests."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._values: Dict[str, bytes] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key: str, value: bytes):
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class CourseCache:
+    """Size-bounded LRU of serialized course JSON, keyed by course id, view and catalog version.
+
+    Only the latest version of each view of a course is kept. The version
+    comes from catalog_versions, so an entry stored under an older version
+    misses even if a write bypassed invalidate(). An optional shared backend
+    is checked on local misses, letting workers reuse each other's
+    serializations.
+    """
+
+    def __init__(self, maxsize: int = COURSE_CACHE_SIZE, shared: Optional[SharedCacheBackend] = None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self._lock = Lock()
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _shared_key(course_id: int, view: str) -> str:
+        return f"course-json:{view}:{course_id}"
+
+    def get(self, course_id: int, version: int, view: str = "full") -> Optional[bytes]:
+        key = (course_id, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        if self.shared is not None:
+            # Shared values are "<version>:<json>"
+            value = self.shared.get(self._shared_key(course_id, view))
+            if value is not None:
+                shared_version, _, body = value.partition(b":")
+                if shared_version == str(version).encode():
+                    self._store(key, version, body)
+                    with self._lock:
+                        self.shared_hits += 1
+                    return body
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, course_id: int, version: int, body: bytes, view: str = "full"):
+        self._store((course_id, view), version, body)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(course_id, view), str(version).encode() + b":" + body)
+
+    def _store(self, key: Tuple[int, str], version: int, body: bytes):
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] > version:
+                return # A newer version is already cached
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, course_id: int):
+        with self._lock:
+            for view in COURSE_VIEWS:
+                if self._entries.pop((course_id, view), None) is not None:
+                    self.invalidations += 1
+        if self.shared is not None:
+            for view in COURSE_VIEWS:
+                self.shared.delete(self._shared_key(course_id, view))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": sum(len(body) for _, body in self._entries.values()),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+                "shared_backend": type(self.shared).__name__ if self.shared is not None else None,
+            }
+
+
+course_cache = CourseCache()
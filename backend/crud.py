@@ -1,11 +1,182 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, exists, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, defer, joinedload, selectinload
+import analytics
+import catalog_versions
+import content_search
+import knowledge_tracing
 import models # Changed to absolute import
 import schemas # Changed to absolute import
-from passlib.context import CryptContext
-from typing import List, Optional
+from course_cache import course_cache
+from database import dialect_insert
+from pagination import keyset_page
+from quiz_cache import quiz_cache
+from skill_index import skill_index
+from password_hashing import password_hasher
+from principal_cache import principal_cache
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+
+
+# Catalog versions
+# Every write that changes a catalog response bumps the versions behind its
+# ETags (see catalog_versions) in the same transaction as the write, and drops
+# the serialized copies of the affected courses.
+def _bump_catalog(db: Session, course_ids: Iterable[int] = (), module_ids: Iterable[int] = (), lesson_ids: Iterable[int] = ()):
+    course_ids = list(course_ids)
+    catalog_versions.bump(db, [
+        catalog_versions.CATALOG_SCOPE,
+        *(catalog_versions.course_scope(course_id) for course_id in course_ids),
+        *(catalog_versions.module_scope(module_id) for module_id in module_ids),
+        *(catalog_versions.lesson_scope(lesson_id) for lesson_id in lesson_ids),
+    ])
+    for course_id in course_ids:
+        course_cache.invalidate(course_id)
+
+def _bump_skill_index(db: Session) -> int:
+    # For the writes the skill index reflects; returns the version to pass to its incremental update
+    return catalog_versions.increment(db, catalog_versions.SKILL_INDEX_SCOPE)
+
+def _course_id_for_module(db: Session, module_id: int) -> Optional[int]:
+    return db.query(models.Module.course_id).filter(models.Module.id == module_id).scalar()
+
+def _lesson_ids_for_modules(db: Session, module_ids: List[int]) -> List[int]:
+    if not module_ids:
+        return []
+    return db.scalars(select(models.Lesson.id).where(models.Lesson.module_id.in_(module_ids))).all()
+
+
+# Progress counters
+# Lesson totals of courses and modules, and completed lesson counts of
+# enrollments and their modules (models.ModuleProgress), are denormalized so
+# progress reads never touch lessons. Writes adjust them with relative updates
+# (count = count + n) in the write's own transaction, so concurrent writers
+# cannot lose each other's changes.
+def _adjust_lesson_totals(db: Session, course_id: int, module_id: int, delta: int):
+    db.execute(update(models.Module).where(models.Module.id == module_id).values(lesson_count=models.Module.lesson_count + delta).execution_options(synchronize_session=False))
+    db.execute(update(models.Course).where(models.Course.id == course_id).values(lesson_count=models.Course.lesson_count + delta).execution_options(synchronize_session=False))
+
+def _record_lesson_progress(db: Session, enrollment_id: int, lesson_id: int, delta: int):
+    """Count a completion change (1, -1, or 0 when nothing changed) and mark the lesson as last touched.
+
+    Lessons outside the enrollment's course are not counted.
+    """
+    touched_at = datetime.utcnow()
+    progress = models.ModuleProgress.__table__
+    # One upsert finds the lesson's module, checks it belongs to the enrollment's course and updates the module counters
+    in_course_module = (
+        select(literal(enrollment_id), models.Lesson.module_id, literal(max(delta, 0)), literal(lesson_id), literal(touched_at))
+        .join(models.Module, models.Module.id == models.Lesson.module_id)
+        .join(models.Enrollment, models.Enrollment.course_id == models.Module.course_id)
+        .where(models.Lesson.id == lesson_id, models.Enrollment.id == enrollment_id)
+    )
+    stmt = dialect_insert(db.get_bind(), progress).from_select(
+        ["enrollment_id", "module_id", "completed_lesson_count", "last_lesson_id", "last_activity_at"], in_course_module
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["enrollment_id", "module_id"],
+        set_={
+            "completed_lesson_count": progress.c.completed_lesson_count + delta,
+            "last_lesson_id": lesson_id,
+            "last_activity_at": touched_at,
+        },
+    )
+    if db.execute(stmt).rowcount:
+        db.execute(
+            update(models.Enrollment).where(models.Enrollment.id == enrollment_id).values(
+                completed_lesson_count=models.Enrollment.completed_lesson_count + delta,
+                last_lesson_id=lesson_id,
+                last_activity_at=touched_at,
+            ).execution_options(synchronize_session=False)
+        )
+        if delta:
+            analytics.record_completion_change(db, enrollment_id, delta)
+
+def _forget_lesson_progress(db: Session, course_id: int, lesson_ids: List[int], module_id: Optional[int] = None):
+    """Take lessons about to be deleted, and their completions, out of the progress counters.
+
+    The course's and module's lesson totals are left to the caller. Pass
+    module_id when all the lessons are in that module and it is not being
+    deleted itself.
+    """
+    if not lesson_ids:
+        return
+    completions = models.LessonCompletion
+    by_enrollment = (completions.enrollment_id == models.Enrollment.id, completions.lesson_id.in_(lesson_ids))
+    db.execute(
+        update(models.Enrollment)
+        .where(models.Enrollment.course_id == course_id, exists().where(*by_enrollment))
+        .values(completed_lesson_count=models.Enrollment.completed_lesson_count - select(func.count()).where(*by_enrollment).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+    if module_id is not None:
+        by_progress = (completions.enrollment_id == models.ModuleProgress.enrollment_id, completions.lesson_id.in_(lesson_ids))
+        db.execute(
+            update(models.ModuleProgress)
+            .where(models.ModuleProgress.module_id == module_id, exists().where(*by_progress))
+            .values(completed_lesson_count=models.ModuleProgress.completed_lesson_count - select(func.count()).where(*by_progress).scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+    for model in (models.Enrollment, models.ModuleProgress):
+        db.execute(
+            update(model).where(model.last_lesson_id.in_(lesson_ids)).values(last_lesson_id=None)
+            .execution_options(synchronize_session=False)
+        )
 
+# Eager-loading query plans
+# Each response model maps to the loader options needed to serialize it without
+# lazy loads. Collections use selectinload (one extra SELECT per relationship for
+# the whole page, no row multiplication); many-to-one relationships use joinedload.
+# Summary models never select Lesson.content.
+def _module_tree_options(module_loader, summary: bool = False):
+    lessons_loader = module_loader.selectinload(models.Module.lessons)
+    if summary:
+        lessons_loader = lessons_loader.defer(models.Lesson.content)
+    return (
+        lessons_loader,
+        module_loader.selectinload(models.Module.associated_skills),
+    )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _course_tree_options(course_loader=None, summary: bool = False):
+    if course_loader is None:
+        modules_loader = selectinload(models.Course.modules)
+        skills_loader = selectinload(models.Course.associated_skills)
+    else:
+        modules_loader = course_loader.selectinload(models.Course.modules)
+        skills_loader = course_loader.selectinload(models.Course.associated_skills)
+    return (*_module_tree_options(modules_loader, summary), skills_loader)
+
+QUERY_PLANS = {
+    schemas.Course: _course_tree_options(),
+    schemas.CourseSummary: _course_tree_options(summary=True),
+    schemas.Module: (
+        selectinload(models.Module.lessons),
+        selectinload(models.Module.associated_skills),
+    ),
+    schemas.ModuleSummary: (
+        selectinload(models.Module.lessons).defer(models.Lesson.content),
+        selectinload(models.Module.associated_skills),
+    ),
+    schemas.LessonSummary: (
+        defer(models.Lesson.content),
+    ),
+    schemas.Enrollment: (
+        joinedload(models.Enrollment.user),
+        selectinload(models.Enrollment.lesson_completions),
+        *_course_tree_options(joinedload(models.Enrollment.course)),
+    ),
+    schemas.EnrollmentSummary: (
+        joinedload(models.Enrollment.user),
+        selectinload(models.Enrollment.lesson_completions),
+        joinedload(models.Enrollment.course),
+    ),
+}
+
+def apply_query_plan(query, response_model: Optional[type] = None):
+    """Attach the eager-loading plan for response_model, if any, to query."""
+    if response_model is None:
+        return query
+    return query.options(*QUERY_PLANS.get(response_model, ()))
 
 # User CRUD
 def get_user(db: Session, user_id: int):
@@ -17,8 +188,11 @@ def get_user_by_email(db: Session, email: str):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
+def get_users_page(db: Session, cursor: Optional[str] = None, limit: int = 100):
+    return keyset_page(db.query(models.User), [models.User.id], cursor, limit)
+
 def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = password_hasher.hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -36,23 +210,45 @@ def update_user_by_admin(db: Session, user_id: int, user_update: schemas.UserUpd
         return None
 
     update_data = user_update.dict(exclude_unset=True)
+    # Role or status changes revoke tokens issued with the old claims
+    if any(key in ("is_admin", "is_active") and getattr(db_user, key) != value for key, value in update_data.items()):
+        db_user.token_version = (db_user.token_version or 0) + 1
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(user_id)
     return db_user
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    verified, _ = password_hasher.verify_and_update(plain_password, hashed_password)
+    return verified
 
 # Course CRUD
-def get_course(db: Session, course_id: int):
-    return db.query(models.Course).filter(models.Course.id == course_id).first()
+def get_course(db: Session, course_id: int, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Course), response_model)
+    return query.filter(models.Course.id == course_id).first()
+
+def get_courses(db: Session, skip: int = 0, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Course), response_model)
+    return query.offset(skip).limit(limit).all()
+
+def get_courses_page(db: Session, cursor: Optional[str] = None, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Course), response_model)
+    return keyset_page(query, [models.Course.id], cursor, limit)
 
-def get_courses(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Course).offset(skip).limit(limit).all()
+def get_course_ids(db: Session, skip: int = 0, limit: int = 100) -> List[int]:
+    return db.scalars(select(models.Course.id).order_by(models.Course.id).offset(skip).limit(limit)).all()
+
+def get_course_ids_page(db: Session, cursor: Optional[str] = None, limit: int = 100):
+    course_ids, next_cursor = keyset_page(db.query(models.Course.id), [models.Course.id], cursor, limit)
+    return [course_id for course_id, in course_ids], next_cursor
+
+def get_courses_by_ids(db: Session, course_ids: List[int], response_model: Optional[type] = None) -> List[models.Course]:
+    query = apply_query_plan(db.query(models.Course), response_model)
+    return query.filter(models.Course.id.in_(course_ids)).all()
 
 def create_course(db: Session, course: schemas.CourseCreate, instructor_id: Optional[int] = None):
     course_data = course.dict()
@@ -67,12 +263,15 @@ def create_course(db: Session, course: schemas.CourseCreate, instructor_id: Opti
     
     db_course = models.Course(**course_data, instructor_id=instructor_id if instructor_id is not None else course_data.get('instructor_id'))
     db.add(db_course)
+    db.flush()
+    _bump_catalog(db, course_ids=[db_course.id])
+    content_search.index(db, course_ids=[db_course.id])
     db.commit()
     db.refresh(db_course)
     return db_course
 
-def update_course(db: Session, course_id: int, course_update: schemas.CourseUpdate):
-    db_course = get_course(db, course_id=course_id)
+def update_course(db: Session, course_id: int, course_update: schemas.CourseUpdate, db_course: Optional[models.Course] = None):
+    db_course = db_course or get_course(db, course_id=course_id)
     if not db_course:
         return None
 
@@ -81,17 +280,32 @@ def update_course(db: Session, course_id: int, course_update: schemas.CourseUpda
         setattr(db_course, key, value)
     
     db.add(db_course) # Not strictly necessary if already in session and modified, but good practice
+    db.flush()
+    _bump_catalog(db, course_ids=[db_course.id])
+    index_version = _bump_skill_index(db) if update_data.keys() & {"title", "description"} else None
+    content_search.index(db, course_ids=[db_course.id])
     db.commit()
     db.refresh(db_course)
+    if index_version is not None:
+        skill_index.update_course(db_course.id, db_course.title, db_course.description, index_version)
     return db_course
 
-def delete_course(db: Session, course_id: int):
-    db_course = get_course(db, course_id=course_id)
+def delete_course(db: Session, course_id: int, db_course: Optional[models.Course] = None):
+    db_course = db_course or get_course(db, course_id=course_id)
     if not db_course:
         return None # Or raise an exception
     
+    module_ids = [module.id for module in db_course.modules] # Deleted with the course via cascade
+    lesson_ids = _lesson_ids_for_modules(db, module_ids)
+    _bump_catalog(db, course_ids=[course_id], module_ids=module_ids, lesson_ids=lesson_ids)
+    _forget_lesson_progress(db, course_id, lesson_ids)
+    db.execute(delete(models.ModuleProgress).where(models.ModuleProgress.module_id.in_(module_ids)))
+    analytics.forget_course(db, course_id)
+    content_search.remove(db, course_ids=[course_id], module_ids=module_ids, lesson_ids=lesson_ids)
+    index_version = _bump_skill_index(db)
     db.delete(db_course)
     db.commit()
+    skill_index.remove_course(course_id, module_ids, index_version)
     return True # Indicate successful deletion
 
 
@@ -99,18 +313,27 @@ def delete_course(db: Session, course_id: int):
 def create_module_for_course(db: Session, module: schemas.ModuleCreate, course_id: int):
     db_module = models.Module(**module.dict(), course_id=course_id)
     db.add(db_module)
+    db.flush()
+    _bump_catalog(db, course_ids=[course_id], module_ids=[db_module.id])
+    content_search.index(db, module_ids=[db_module.id])
     db.commit()
     db.refresh(db_module)
     return db_module
 
-def get_modules_for_course(db: Session, course_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Module).filter(models.Module.course_id == course_id).order_by(models.Module.order).offset(skip).limit(limit).all()
+def get_modules_for_course(db: Session, course_id: int, skip: int = 0, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Module), response_model)
+    return query.filter(models.Module.course_id == course_id).order_by(models.Module.order).offset(skip).limit(limit).all()
 
-def get_module(db: Session, module_id: int):
-    return db.query(models.Module).filter(models.Module.id == module_id).first()
+def get_modules_for_course_page(db: Session, course_id: int, cursor: Optional[str] = None, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Module), response_model).filter(models.Module.course_id == course_id)
+    return keyset_page(query, [models.Module.order, models.Module.id], cursor, limit)
 
-def update_module(db: Session, module_id: int, module_update: schemas.ModuleUpdate):
-    db_module = get_module(db, module_id=module_id)
+def get_module(db: Session, module_id: int, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Module), response_model)
+    return query.filter(models.Module.id == module_id).first()
+
+def update_module(db: Session, module_id: int, module_update: schemas.ModuleUpdate, db_module: Optional[models.Module] = None):
+    db_module = db_module or get_module(db, module_id=module_id)
     if not db_module:
         return None
 
@@ -119,17 +342,32 @@ def update_module(db: Session, module_id: int, module_update: schemas.ModuleUpda
         setattr(db_module, key, value)
     
     db.add(db_module)
+    db.flush()
+    _bump_catalog(db, course_ids=[db_module.course_id], module_ids=[db_module.id])
+    index_version = _bump_skill_index(db) if update_data.keys() & {"title", "description"} else None
+    content_search.index(db, module_ids=[db_module.id])
     db.commit()
     db.refresh(db_module)
+    if index_version is not None:
+        skill_index.update_module(db_module.id, db_module.title, db_module.description, index_version)
     return db_module
 
-def delete_module(db: Session, module_id: int):
-    db_module = get_module(db, module_id=module_id)
+def delete_module(db: Session, module_id: int, db_module: Optional[models.Module] = None):
+    db_module = db_module or get_module(db, module_id=module_id)
     if not db_module:
         return None
     
+    lesson_ids = _lesson_ids_for_modules(db, [db_module.id])
+    _bump_catalog(db, course_ids=[db_module.course_id], module_ids=[db_module.id], lesson_ids=lesson_ids)
+    _forget_lesson_progress(db, db_module.course_id, lesson_ids)
+    _adjust_lesson_totals(db, db_module.course_id, db_module.id, -len(lesson_ids))
+    db.execute(delete(models.ModuleProgress).where(models.ModuleProgress.module_id == db_module.id))
+    analytics.refresh_courses(db, [db_module.course_id])
+    content_search.remove(db, module_ids=[db_module.id], lesson_ids=lesson_ids)
+    index_version = _bump_skill_index(db)
     db.delete(db_module)
     db.commit()
+    skill_index.remove_module(module_id, index_version)
     return True
 
 
@@ -137,18 +375,29 @@ def delete_module(db: Session, module_id: int):
 def create_lesson_for_module(db: Session, lesson: schemas.LessonCreate, module_id: int):
     db_lesson = models.Lesson(**lesson.dict(), module_id=module_id)
     db.add(db_lesson)
+    db.flush()
+    course_id = _course_id_for_module(db, module_id)
+    _bump_catalog(db, course_ids=[course_id], module_ids=[module_id], lesson_ids=[db_lesson.id])
+    _adjust_lesson_totals(db, course_id, module_id, 1)
+    analytics.refresh_courses(db, [course_id]) # Completed enrollments are no longer complete
+    content_search.index(db, lesson_ids=[db_lesson.id])
     db.commit()
     db.refresh(db_lesson)
     return db_lesson
 
-def get_lessons_for_module(db: Session, module_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Lesson).filter(models.Lesson.module_id == module_id).order_by(models.Lesson.order).offset(skip).limit(limit).all()
+def get_lessons_for_module(db: Session, module_id: int, skip: int = 0, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Lesson), response_model)
+    return query.filter(models.Lesson.module_id == module_id).order_by(models.Lesson.order).offset(skip).limit(limit).all()
+
+def get_lessons_for_module_page(db: Session, module_id: int, cursor: Optional[str] = None, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Lesson), response_model).filter(models.Lesson.module_id == module_id)
+    return keyset_page(query, [models.Lesson.order, models.Lesson.id], cursor, limit)
 
 def get_lesson(db: Session, lesson_id: int):
     return db.query(models.Lesson).filter(models.Lesson.id == lesson_id).first()
 
-def update_lesson(db: Session, lesson_id: int, lesson_update: schemas.LessonUpdate):
-    db_lesson = get_lesson(db, lesson_id=lesson_id)
+def update_lesson(db: Session, lesson_id: int, lesson_update: schemas.LessonUpdate, db_lesson: Optional[models.Lesson] = None):
+    db_lesson = db_lesson or get_lesson(db, lesson_id=lesson_id)
     if not db_lesson:
         return None
 
@@ -157,75 +406,110 @@ def update_lesson(db: Session, lesson_id: int, lesson_update: schemas.LessonUpda
         setattr(db_lesson, key, value)
     
     db.add(db_lesson)
+    db.flush()
+    _bump_catalog(db, course_ids=[_course_id_for_module(db, db_lesson.module_id)], module_ids=[db_lesson.module_id], lesson_ids=[db_lesson.id])
+    content_search.index(db, lesson_ids=[db_lesson.id])
     db.commit()
     db.refresh(db_lesson)
+    quiz_cache.invalidate(lesson_id)
     return db_lesson
 
-def delete_lesson(db: Session, lesson_id: int):
-    db_lesson = get_lesson(db, lesson_id=lesson_id)
+def delete_lesson(db: Session, lesson_id: int, db_lesson: Optional[models.Lesson] = None):
+    db_lesson = db_lesson or get_lesson(db, lesson_id=lesson_id)
     if not db_lesson:
         return None
         
+    course_id = _course_id_for_module(db, db_lesson.module_id)
+    _bump_catalog(db, course_ids=[course_id], module_ids=[db_lesson.module_id], lesson_ids=[db_lesson.id])
+    _forget_lesson_progress(db, course_id, [db_lesson.id], module_id=db_lesson.module_id)
+    _adjust_lesson_totals(db, course_id, db_lesson.module_id, -1)
+    analytics.refresh_courses(db, [course_id])
+    content_search.remove(db, lesson_ids=[db_lesson.id])
     db.delete(db_lesson)
     db.commit()
+    quiz_cache.invalidate(lesson_id)
     return True
 
 
+# Ownership
+# Course, module and lesson writes are allowed to admins and to the course's
+# instructor. Each resolver loads the row to be written together with its
+# course's instructor_id in one query; the row is then handed to the mutation.
+class Ownership(NamedTuple):
+    resource: object
+    course_id: int
+    instructor_id: Optional[int]
+
+def get_course_ownership(db: Session, course_id: int) -> Optional[Ownership]:
+    db_course = get_course(db, course_id=course_id)
+    if db_course is None:
+        return None
+    return Ownership(db_course, db_course.id, db_course.instructor_id)
+
+def get_module_ownership(db: Session, module_id: int) -> Optional[Ownership]:
+    row = db.query(models.Module, models.Course.instructor_id).join(
+        models.Course, models.Module.course_id == models.Course.id
+    ).filter(models.Module.id == module_id).first()
+    if row is None:
+        return None
+    db_module, instructor_id = row
+    return Ownership(db_module, db_module.course_id, instructor_id)
+
+def get_lesson_ownership(db: Session, lesson_id: int) -> Optional[Ownership]:
+    row = db.query(models.Lesson, models.Module.course_id, models.Course.instructor_id).join(
+        models.Module, models.Lesson.module_id == models.Module.id
+    ).join(
+        models.Course, models.Module.course_id == models.Course.id
+    ).filter(models.Lesson.id == lesson_id).first()
+    if row is None:
+        return None
+    db_lesson, course_id, instructor_id = row
+    return Ownership(db_lesson, course_id, instructor_id)
+
+
 # Enrollment CRUD
-def create_enrollment(db: Session, enrollment: schemas.EnrollmentCreate):
-    db_enrollment = models.Enrollment(user_id=enrollment.user_id, course_id=enrollment.course_id)
-    db.add(db_enrollment)
+def create_enrollment(db: Session, enrollment: schemas.EnrollmentCreate, response_model: type = schemas.Enrollment):
+    # Returns None when the user is already enrolled. ON CONFLICT DO NOTHING over the
+    # unique (user_id, course_id) index also turns a concurrent duplicate into None
+    # rather than an IntegrityError.
+    table = models.Enrollment.__table__
+    stmt = dialect_insert(db.get_bind(), table).values(user_id=enrollment.user_id, course_id=enrollment.course_id)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "course_id"]).returning(table.c.id)
+    enrollment_id = db.scalar(stmt)
+    if enrollment_id is None:
+        db.rollback()
+        return None
+    analytics.record_enrollment(db, enrollment.course_id)
     db.commit()
-    db.refresh(db_enrollment)
-    return db_enrollment
+    # Loaded with the response model's query plan, which avoids lazy-loading the course tree per module
+    return get_enrollment(db, enrollment_id=enrollment_id, response_model=response_model)
 
 # Personalized Study Plan
 DEFAULT_PROFICIENCY_THRESHOLD = 70
 
-def generate_study_plan(db: Session, user_id: int, proficiency_threshold: int = DEFAULT_PROFICIENCY_THRESHOLD) -> schemas.StudyPlanResponse:
-    user_skills = get_user_skills_by_user(db, user_id=user_id, limit=1000) # Get all skills for the user
-
-    low_proficiency_skills = [us for us in user_skills if us.proficiency_score < proficiency_threshold]
-
-    recommendations: List[schemas.StudyRecommendationItem] = []
-    recommended_ids = set() # To avoid duplicate course/module recommendations
-
-    for user_skill in low_proficiency_skills:
-        skill_id = user_skill.skill_id
-        
-        # Find courses associated with this skill
-        courses_for_skill = db.query(models.Course).filter(models.Course.associated_skills.any(id=skill_id)).all()
-        for course in courses_for_skill:
-            if ("course", course.id) not in recommended_ids:
-                recommendations.append(schemas.StudyRecommendationItem(
-                    id=course.id,
-                    title=course.title,
-                    type="course",
-                    description=course.description
-                ))
-                recommended_ids.add(("course", course.id))
-
-        # Find modules associated with this skill
-        # We should also ensure the module is not part of an already recommended course for this skill,
-        # or decide if module-level recommendations are fine even if the parent course is suggested.
-        # For now, let's add modules even if their parent course is already recommended,
-        # as they offer more granular suggestions.
-        modules_for_skill = db.query(models.Module).filter(models.Module.associated_skills.any(id=skill_id)).all()
-        for module in modules_for_skill:
-            if ("module", module.id) not in recommended_ids:
-                # Optional: Check if user is enrolled in the course of this module
-                # Optional: Check if module's parent course is already recommended.
-                # For now, adding module directly.
-                recommendations.append(schemas.StudyRecommendationItem(
-                    id=module.id,
-                    title=module.title,
-                    type="module",
-                    description=module.description
-                ))
-                recommended_ids.add(("module", module.id))
-                
+def _weak_skills_query(user_id: int, proficiency_threshold: int):
+    return select(
+        models.UserSkill.skill_id,
+        func.max(proficiency_threshold - models.UserSkill.proficiency_score)
+    ).where(
+        models.UserSkill.user_id == user_id,
+        models.UserSkill.proficiency_score < proficiency_threshold
+    ).group_by(models.UserSkill.skill_id)
+
+def _study_plan_from_weak_skills(weak_skills, limit: int) -> schemas.StudyPlanResponse:
+    recommendations = [
+        schemas.StudyRecommendationItem(id=content_id, title=title, type=content_type, description=description)
+        for content_type, content_id, title, description in skill_index.recommend(dict(weak_skills), limit=limit)
+    ]
     return schemas.StudyPlanResponse(recommendations=recommendations)
 
+def generate_study_plan(db: Session, user_id: int, proficiency_threshold: int = DEFAULT_PROFICIENCY_THRESHOLD, limit: int = 100) -> schemas.StudyPlanResponse:
+    # Only the user's weak skills come from the database; the courses and modules
+    # teaching them are looked up and ranked in the in-memory skill index.
+    skill_index.refresh(db)
+    weak_skills = db.execute(_weak_skills_query(user_id, proficiency_threshold)).all()
+    return _study_plan_from_weak_skills(weak_skills, limit)
+
 # Skill CRUD
 def create_skill(db: Session, skill: schemas.SkillCreate):
     db_skill = models.Skill(**skill.dict())
@@ -243,6 +527,19 @@ def get_skill_by_name(db: Session, name: str):
 def get_skills(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Skill).offset(skip).limit(limit).all()
 
+def get_skills_page(db: Session, cursor: Optional[str] = None, limit: int = 100):
+    return keyset_page(db.query(models.Skill), [models.Skill.id], cursor, limit)
+
+def _course_ids_for_skill(db: Session, skill_id: int) -> List[int]:
+    # Courses embed their own and their modules' skills
+    direct = select(models.course_skill_association_table.c.course_id).where(
+        models.course_skill_association_table.c.skill_id == skill_id
+    )
+    via_modules = select(models.Module.course_id).join(
+        models.module_skill_association_table, models.module_skill_association_table.c.module_id == models.Module.id
+    ).where(models.module_skill_association_table.c.skill_id == skill_id)
+    return db.scalars(direct.union(via_modules)).all()
+
 def update_skill(db: Session, skill_id: int, skill_update: schemas.SkillUpdate):
     db_skill = get_skill(db, skill_id=skill_id)
     if not db_skill:
@@ -253,6 +550,7 @@ def update_skill(db: Session, skill_id: int, skill_update: schemas.SkillUpdate):
         setattr(db_skill, key, value)
         
     db.add(db_skill)
+    _bump_catalog(db, course_ids=_course_ids_for_skill(db, skill_id))
     db.commit()
     db.refresh(db_skill)
     return db_skill
@@ -262,8 +560,13 @@ def delete_skill(db: Session, skill_id: int):
     if not db_skill:
         return None
     
+    _bump_catalog(db, course_ids=_course_ids_for_skill(db, skill_id))
+    analytics.forget_skill(db, skill_id)
+    db.execute(delete(models.SkillAssessment).where(models.SkillAssessment.skill_id == skill_id))
+    index_version = _bump_skill_index(db)
     db.delete(db_skill)
     db.commit()
+    skill_index.remove_skill(skill_id, index_version)
     return True
 
 # Course-Skill Association CRUD
@@ -274,8 +577,11 @@ def add_skill_to_course(db: Session, course_id: int, skill_id: int):
         return None # Or raise error
     if db_skill not in db_course.associated_skills:
         db_course.associated_skills.append(db_skill)
+        _bump_catalog(db, course_ids=[db_course.id])
+        index_version = _bump_skill_index(db)
         db.commit()
         db.refresh(db_course)
+        skill_index.add_course_skill(skill_id, db_course.id, db_course.title, db_course.description, index_version)
     return db_course
 
 def remove_skill_from_course(db: Session, course_id: int, skill_id: int):
@@ -285,8 +591,11 @@ def remove_skill_from_course(db: Session, course_id: int, skill_id: int):
         return None # Or raise error
     if db_skill in db_course.associated_skills:
         db_course.associated_skills.remove(db_skill)
+        _bump_catalog(db, course_ids=[db_course.id])
+        index_version = _bump_skill_index(db)
         db.commit()
         db.refresh(db_course)
+        skill_index.remove_course_skill(skill_id, db_course.id, index_version)
     return db_course
 
 # Module-Skill Association CRUD
@@ -297,8 +606,11 @@ def add_skill_to_module(db: Session, module_id: int, skill_id: int):
         return None
     if db_skill not in db_module.associated_skills:
         db_module.associated_skills.append(db_skill)
+        _bump_catalog(db, course_ids=[db_module.course_id], module_ids=[db_module.id])
+        index_version = _bump_skill_index(db)
         db.commit()
         db.refresh(db_module)
+        skill_index.add_module_skill(skill_id, db_module.id, db_module.title, db_module.description, index_version)
     return db_module
 
 def remove_skill_from_module(db: Session, module_id: int, skill_id: int):
@@ -308,8 +620,11 @@ def remove_skill_from_module(db: Session, module_id: int, skill_id: int):
         return None
     if db_skill in db_module.associated_skills:
         db_module.associated_skills.remove(db_skill)
+        _bump_catalog(db, course_ids=[db_module.course_id], module_ids=[db_module.id])
+        index_version = _bump_skill_index(db)
         db.commit()
         db.refresh(db_module)
+        skill_index.remove_module_skill(skill_id, db_module.id, index_version)
     return db_module
 
 # UserSkill CRUD (User Skill Proficiency)
@@ -322,14 +637,33 @@ def get_user_skill(db: Session, user_id: int, skill_id: int):
 def get_user_skills_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     return db.query(models.UserSkill).filter(models.UserSkill.user_id == user_id).offset(skip).limit(limit).all()
 
+def _record_assessments(db: Session, user_id: int, proficiency_scores: Dict[int, int], assessed_at: datetime,
+                        lesson_id: Optional[int] = None, answer_counts: Optional[Dict[int, Tuple[int, int]]] = None):
+    # Append the scores, with any quiz's (correct, attempted) answers per skill, to the
+    # skill_assessments history in one executemany
+    if proficiency_scores:
+        answer_counts = answer_counts or {}
+        db.execute(insert(models.SkillAssessment), [
+            {
+                "user_id": user_id, "skill_id": skill_id, "proficiency_score": proficiency_score, "lesson_id": lesson_id,
+                "correct_answers": answer_counts.get(skill_id, (None, None))[0], "attempts": answer_counts.get(skill_id, (None, None))[1],
+                "assessed_at": assessed_at,
+            }
+            for skill_id, proficiency_score in proficiency_scores.items()
+        ])
+
 def create_user_skill(db: Session, user_skill: schemas.UserSkillCreate):
-    # last_assessed_at is handled by default/onupdate in the model
+    assessed_at = datetime.utcnow()
     db_user_skill = models.UserSkill(
         user_id=user_skill.user_id,
         skill_id=user_skill.skill_id,
-        proficiency_score=user_skill.proficiency_score
+        proficiency_score=user_skill.proficiency_score,
+        mastery_probability=knowledge_tracing.mastery_from_score(user_skill.proficiency_score),
+        last_assessed_at=assessed_at
     )
     db.add(db_user_skill)
+    analytics.record_proficiency_changes(db, [(user_skill.skill_id, None, user_skill.proficiency_score)])
+    _record_assessments(db, user_skill.user_id, {user_skill.skill_id: user_skill.proficiency_score}, assessed_at)
     db.commit()
     db.refresh(db_user_skill)
     return db_user_skill
@@ -338,62 +672,255 @@ def update_user_skill_proficiency(db: Session, user_skill_id: int, proficiency_s
     db_user_skill = db.query(models.UserSkill).filter(models.UserSkill.id == user_skill_id).first()
     if not db_user_skill:
         return None
+    analytics.record_proficiency_changes(db, [(db_user_skill.skill_id, db_user_skill.proficiency_score, proficiency_score)])
     db_user_skill.proficiency_score = proficiency_score
-    # last_assessed_at should auto-update due to onupdate in model
+    db_user_skill.mastery_probability = knowledge_tracing.mastery_from_score(proficiency_score)
+    db_user_skill.last_assessed_at = datetime.utcnow()
+    _record_assessments(db, db_user_skill.user_id, {db_user_skill.skill_id: proficiency_score}, db_user_skill.last_assessed_at)
     db.commit()
     db.refresh(db_user_skill)
     return db_user_skill
 
-def upsert_user_skill_proficiency(db: Session, user_id: int, skill_id: int, proficiency_score: int):
-    db_user_skill = get_user_skill(db, user_id=user_id, skill_id=skill_id)
-    if db_user_skill:
-        db_user_skill.proficiency_score = proficiency_score
-        # last_assessed_at will be updated by SQLAlchemy's onupdate
-    else:
-        db_user_skill = models.UserSkill(
-            user_id=user_id,
-            skill_id=skill_id,
-            proficiency_score=proficiency_score
-            # last_assessed_at will be set by default
+def upsert_user_skill_proficiency(db: Session, user_id: int, skill_id: int, proficiency_score: int, lesson_id: Optional[int] = None):
+    upsert_user_skill_proficiencies(db, user_id=user_id, proficiency_scores={skill_id: proficiency_score}, lesson_id=lesson_id)
+    return get_user_skill(db, user_id=user_id, skill_id=skill_id)
+
+def _lock_user_skills(db: Session, user_id: int, skill_ids: Iterable[int]) -> Dict[int, Tuple[int, Optional[float]]]:
+    # The previous (score, mastery) of the user's skills, for the analytics rollups and
+    # knowledge tracing; locked on PostgreSQL until commit
+    rows = db.execute(
+        select(models.UserSkill.skill_id, models.UserSkill.proficiency_score, models.UserSkill.mastery_probability)
+        .where(models.UserSkill.user_id == user_id, models.UserSkill.skill_id.in_(list(skill_ids)))
+        .with_for_update()
+    ).all()
+    return {row.skill_id: (row.proficiency_score, row.mastery_probability) for row in rows}
+
+def _user_skill_rows(user_id: int, masteries: Dict[int, float], assessed_at: datetime) -> List[dict]:
+    return [
+        {
+            "user_id": user_id,
+            "skill_id": skill_id,
+            "proficiency_score": knowledge_tracing.proficiency_score(mastery),
+            "mastery_probability": mastery,
+            "last_assessed_at": assessed_at
+        }
+        for skill_id, mastery in masteries.items()
+    ]
+
+def _write_user_skills(db: Session, user_id: int, skill_ids: Iterable[int], estimate: Callable[[Dict[int, Tuple[int, Optional[float]]]], Dict[int, float]],
+                       lesson_id: Optional[int] = None, answer_counts: Optional[Dict[int, Tuple[int, int]]] = None) -> Dict[int, float]:
+    # estimate maps the previous {skill_id: (score, mastery)} of skill_ids to their new
+    # mastery probabilities. Rows the lock found are updated by one INSERT ... ON
+    # CONFLICT DO UPDATE; the others are inserted with ON CONFLICT DO NOTHING, whose
+    # RETURNING tells which skills are new to the user. A row a concurrent first
+    # assessment created meanwhile is locked and estimated again from its values,
+    # so the analytics rollups count each (user, skill) once.
+    skill_ids = list(skill_ids)
+    assessed_at = datetime.utcnow()
+    table = models.UserSkill.__table__
+    previous = _lock_user_skills(db, user_id, skill_ids)
+    masteries = estimate(previous)
+    inserted = set()
+    new_skill_ids = [skill_id for skill_id in skill_ids if skill_id not in previous]
+    if new_skill_ids:
+        stmt = dialect_insert(db.get_bind(), table).values(_user_skill_rows(user_id, {skill_id: masteries[skill_id] for skill_id in new_skill_ids}, assessed_at))
+        stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "skill_id"]).returning(table.c.skill_id)
+        inserted = set(db.scalars(stmt).all())
+        raced = [skill_id for skill_id in new_skill_ids if skill_id not in inserted]
+        if raced:
+            previous.update(_lock_user_skills(db, user_id, raced))
+            masteries = estimate(previous)
+
+    updated = {skill_id: mastery for skill_id, mastery in masteries.items() if skill_id not in inserted}
+    if updated:
+        stmt = dialect_insert(db.get_bind(), table).values(_user_skill_rows(user_id, updated, assessed_at))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "skill_id"],
+            set_={
+                "proficiency_score": stmt.excluded.proficiency_score,
+                "mastery_probability": stmt.excluded.mastery_probability,
+                "last_assessed_at": stmt.excluded.last_assessed_at
+            }
         )
-        db.add(db_user_skill)
+        db.execute(stmt)
+    proficiency_scores = {skill_id: knowledge_tracing.proficiency_score(mastery) for skill_id, mastery in masteries.items()}
+    analytics.record_proficiency_changes(db, [
+        (skill_id, previous[skill_id][0] if skill_id in previous else None, proficiency_score)
+        for skill_id, proficiency_score in proficiency_scores.items()
+    ])
+    _record_assessments(db, user_id, proficiency_scores, assessed_at, lesson_id=lesson_id, answer_counts=answer_counts)
     db.commit()
-    db.refresh(db_user_skill)
-    return db_user_skill
+    return masteries
+
+def upsert_user_skill_proficiencies(db: Session, user_id: int, proficiency_scores: Dict[int, int], lesson_id: Optional[int] = None):
+    # Set scores directly; each resets the skill's knowledge-tracing estimate to score / 100
+    if not proficiency_scores:
+        return
+    masteries = {skill_id: knowledge_tracing.mastery_from_score(proficiency_score) for skill_id, proficiency_score in proficiency_scores.items()}
+    _write_user_skills(db, user_id, proficiency_scores, lambda previous: masteries, lesson_id=lesson_id)
+
+def trace_user_skill_proficiencies(db: Session, user_id: int, skill_results: Dict[int, Tuple[int, int]], lesson_id: Optional[int] = None) -> Dict[int, float]:
+    """Update the user's skill estimates with a graded quiz's {skill_id: (correct, attempted)} answers.
+
+    Writes the estimates and their scores, and returns the new mastery probabilities.
+    """
+    skill_results = {skill_id: counts for skill_id, counts in skill_results.items() if counts[1]}
+    if not skill_results:
+        return {}
+    return _write_user_skills(
+        db, user_id, skill_results, lambda previous: knowledge_tracing.trace(previous, skill_results),
+        lesson_id=lesson_id, answer_counts=skill_results
+    )
+
+def get_skill_assessments(db: Session, user_id: int, skill_id: int, since: datetime, limit: int = 500) -> List[models.SkillAssessment]:
+    """A user's assessments in a skill since a time, oldest first; the latest limit of them when there are more."""
+    # A backward range scan of ix_skill_assessments_user_skill_assessed_at
+    assessments = db.scalars(
+        select(models.SkillAssessment)
+        .where(
+            models.SkillAssessment.user_id == user_id,
+            models.SkillAssessment.skill_id == skill_id,
+            models.SkillAssessment.assessed_at >= since,
+        )
+        .order_by(models.SkillAssessment.assessed_at.desc())
+        .limit(limit)
+    ).all()
+    return assessments[::-1]
+
+def get_enrollments_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Enrollment), response_model)
+    return query.filter(models.Enrollment.user_id == user_id).offset(skip).limit(limit).all()
+
+def get_enrollments_by_user_page(db: Session, user_id: int, cursor: Optional[str] = None, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Enrollment), response_model).filter(models.Enrollment.user_id == user_id)
+    return keyset_page(query, [models.Enrollment.id], cursor, limit)
 
-def get_enrollments_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Enrollment).filter(models.Enrollment.user_id == user_id).offset(skip).limit(limit).all()
+def get_all_enrollments(db: Session, skip: int = 0, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Enrollment), response_model)
+    return query.offset(skip).limit(limit).all()
 
-def get_all_enrollments(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Enrollment).offset(skip).limit(limit).all()
+def get_all_enrollments_page(db: Session, cursor: Optional[str] = None, limit: int = 100, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Enrollment), response_model)
+    return keyset_page(query, [models.Enrollment.id], cursor, limit)
 
-import json # For handling completed_lessons JSON string
+def get_enrollment(db: Session, enrollment_id: int, response_model: Optional[type] = None):
+    query = apply_query_plan(db.query(models.Enrollment), response_model)
+    return query.filter(models.Enrollment.id == enrollment_id).first()
 
 def get_enrollment_by_user_and_course(db: Session, user_id: int, course_id: int):
     return db.query(models.Enrollment).filter(models.Enrollment.user_id == user_id, models.Enrollment.course_id == course_id).first()
 
-def mark_lesson_complete(db: Session, enrollment_id: int, lesson_id: int):
-    db_enrollment = db.query(models.Enrollment).filter(models.Enrollment.id == enrollment_id).first()
-    if not db_enrollment:
-        return None
-    
-    completed_lessons_list = json.loads(db_enrollment.completed_lessons)
-    if lesson_id not in completed_lessons_list:
-        completed_lessons_list.append(lesson_id)
-        db_enrollment.completed_lessons = json.dumps(completed_lessons_list)
-        db.commit()
-        db.refresh(db_enrollment)
-    return db_enrollment
+def get_enrollment_and_lesson_course(db: Session, enrollment_id: int, lesson_id: int) -> Optional[Tuple[models.Enrollment, Optional[int]]]:
+    # The enrollment with the course_id of lesson_id (None if there is no such lesson), in one query
+    lesson_course_id = (
+        select(models.Module.course_id)
+        .join(models.Lesson, models.Lesson.module_id == models.Module.id)
+        .where(models.Lesson.id == lesson_id)
+        .scalar_subquery()
+    )
+    row = db.query(models.Enrollment, lesson_course_id).filter(models.Enrollment.id == enrollment_id).first()
+    return tuple(row) if row is not None else None
+
+# Lesson completion
+# Each completion is its own row, so marking a lesson is a single-row upsert or
+# delete and concurrent clicks from several tabs cannot overwrite each other.
+def mark_lesson_complete(db: Session, enrollment_id: int, lesson_id: int, response_model: type = schemas.Enrollment):
+    stmt = dialect_insert(db.get_bind(), models.LessonCompletion.__table__).values(
+        enrollment_id=enrollment_id,
+        lesson_id=lesson_id
+    ).on_conflict_do_nothing(index_elements=["enrollment_id", "lesson_id"])
+    inserted = db.execute(stmt).rowcount
+    _record_lesson_progress(db, enrollment_id, lesson_id, inserted)
+    db.commit()
+    return get_enrollment(db, enrollment_id=enrollment_id, response_model=response_model)
 
-def mark_lesson_incomplete(db: Session, enrollment_id: int, lesson_id: int):
-    db_enrollment = db.query(models.Enrollment).filter(models.Enrollment.id == enrollment_id).first()
-    if not db_enrollment:
-        return None
-        
-    completed_lessons_list = json.loads(db_enrollment.completed_lessons)
-    if lesson_id in completed_lessons_list:
-        completed_lessons_list.remove(lesson_id)
-        db_enrollment.completed_lessons = json.dumps(completed_lessons_list)
-        db.commit()
-        db.refresh(db_enrollment)
-    return db_enrollment
+def mark_lesson_incomplete(db: Session, enrollment_id: int, lesson_id: int, response_model: type = schemas.Enrollment):
+    deleted = db.execute(
+        delete(models.LessonCompletion).where(
+            models.LessonCompletion.enrollment_id == enrollment_id,
+            models.LessonCompletion.lesson_id == lesson_id
+        )
+    ).rowcount
+    _record_lesson_progress(db, enrollment_id, lesson_id, -deleted)
+    db.commit()
+    return get_enrollment(db, enrollment_id=enrollment_id, response_model=response_model)
+
+
+# Progress
+def _percent(completed: int, total: int) -> float:
+    return round(100 * completed / total, 1) if total else 0.0
+
+def get_progress_for_user(db: Session, user_id: int) -> List[schemas.EnrollmentProgress]:
+    """Progress of each of the user's enrollments and their modules, from the counters, in one query.
+
+    The resume pointer is the first lesson of the course, in module and lesson
+    order, without a completion; it walks the (course_id, order) and
+    (module_id, order) indexes and stops at the first gap.
+    """
+    enrollment, course, module, progress = models.Enrollment, models.Course, models.Module, models.ModuleProgress
+    next_module = aliased(models.Module)
+    next_lesson = (
+        select(models.Lesson.id)
+        .join(next_module, next_module.id == models.Lesson.module_id)
+        .where(
+            next_module.course_id == enrollment.course_id,
+            # Enrollment is two levels up, out of reach of auto-correlation
+            ~exists().where(models.LessonCompletion.enrollment_id == enrollment.id, models.LessonCompletion.lesson_id == models.Lesson.id).correlate_except(models.LessonCompletion),
+        )
+        .order_by(next_module.order, next_module.id, models.Lesson.order, models.Lesson.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(
+            enrollment.id, enrollment.course_id, course.title.label("course_title"), course.lesson_count.label("course_lessons"),
+            enrollment.completed_lesson_count, enrollment.last_lesson_id, enrollment.last_activity_at, next_lesson.label("next_lesson_id"),
+            module.id.label("module_id"), module.title.label("module_title"), module.lesson_count.label("module_lessons"),
+            progress.completed_lesson_count.label("module_completed"), progress.last_lesson_id.label("module_last_lesson_id"),
+            progress.last_activity_at.label("module_last_activity_at"),
+        )
+        .join(course, course.id == enrollment.course_id)
+        .outerjoin(module, module.course_id == enrollment.course_id)
+        .outerjoin(progress, (progress.enrollment_id == enrollment.id) & (progress.module_id == module.id))
+        .where(enrollment.user_id == user_id)
+        .order_by(enrollment.id, module.order, module.id)
+    ).all()
+
+    enrollments: Dict[int, schemas.EnrollmentProgress] = {}
+    for row in rows:
+        item = enrollments.get(row.id)
+        if item is None:
+            item = enrollments[row.id] = schemas.EnrollmentProgress(
+                enrollment_id=row.id, course_id=row.course_id, course_title=row.course_title,
+                completed_lessons=row.completed_lesson_count, total_lessons=row.course_lessons,
+                percent=_percent(row.completed_lesson_count, row.course_lessons),
+                last_lesson_id=row.last_lesson_id, last_activity_at=row.last_activity_at, next_lesson_id=row.next_lesson_id,
+            )
+        if row.module_id is not None:
+            completed = row.module_completed or 0
+            item.modules.append(schemas.ModuleProgress(
+                module_id=row.module_id, title=row.module_title, completed_lessons=completed, total_lessons=row.module_lessons,
+                percent=_percent(completed, row.module_lessons),
+                last_lesson_id=row.module_last_lesson_id, last_activity_at=row.module_last_activity_at,
+            ))
+    return list(enrollments.values())
+
+# Async read paths
+# Used by the handlers that run on the event loop, so a slow query only waits on
+# the database instead of blocking every other request on the worker.
+async def get_user_async(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def update_password_hash_async(db: AsyncSession, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    await db.commit()
+    return db_user
+
+async def generate_study_plan_async(db: AsyncSession, user_id: int, proficiency_threshold: int = DEFAULT_PROFICIENCY_THRESHOLD, limit: int = 100) -> schemas.StudyPlanResponse:
+    await db.run_sync(skill_index.refresh)
+    result = await db.execute(_weak_skills_query(user_id, proficiency_threshold))
+    return _study_plan_from_weak_skills(result.all(), limit)
@@ -0,0 +1,214 @@
+"""Knowledge-tracing proficiency model.
+
+A learner's proficiency in a skill is the Bayesian Knowledge Tracing estimate
+of the probability that they have mastered it (UserSkill.mastery_probability),
+stored as a 0-100 score in UserSkill.proficiency_score. Each graded quiz is
+evidence: the estimate is updated with the submission's correct and attempted
+answers per skill, then by the chance of learning the skill in between.
+
+Answers within one submission are taken as simultaneous observations, so a
+submission's update depends only on its per-skill counts: with slip s and
+guess g, c correct answers out of n multiply the odds of mastery by
+((1 - s) / g) ** c * (s / (1 - g)) ** (n - c). Every skill of a submission
+is updated in one vectorized step.
+
+Scores set directly (by an admin, or recorded before this model) reset the
+estimate to score / 100. recompute() replays every learner's assessment
+history with the current parameters, streaming the histories in batches of
+whole users and tracing each batch in one pass over packed arrays.
+
+Usage: python knowledge_tracing.py recompute
+"""
+import sys
+from itertools import chain
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+import analytics
+import models
+
+BKT_PRIOR = 0.3 # P(mastered) before any evidence
+BKT_LEARN = 0.1 # P(learning the skill between two assessments)
+BKT_SLIP = 0.1 # P(wrong answer despite mastery)
+BKT_GUESS = 0.2 # P(right answer without mastery)
+MASTERY_BOUNDS = (0.001, 0.999) # Estimates are clipped to these, so scores of 0 or 100 stay revisable
+RECOMPUTE_BATCH_SIZE = 10000 # Assessments read per batch by recompute(); a batch is extended to whole users
+
+_CORRECT_LOG_ODDS = np.log((1 - BKT_SLIP) / BKT_GUESS)
+_WRONG_LOG_ODDS = np.log(BKT_SLIP / (1 - BKT_GUESS))
+
+
+def update_mastery(mastery: np.ndarray, correct: np.ndarray, attempts: np.ndarray) -> np.ndarray:
+    """The mastery estimates after observing correct out of attempts answers, element-wise."""
+    mastery = np.clip(mastery, *MASTERY_BOUNDS)
+    log_odds = np.log(mastery / (1 - mastery)) + correct * _CORRECT_LOG_ODDS + (attempts - correct) * _WRONG_LOG_ODDS
+    posterior = 1 / (1 + np.exp(-log_odds))
+    return np.clip(posterior + (1 - posterior) * BKT_LEARN, *MASTERY_BOUNDS)
+
+def mastery_from_score(proficiency_score: int) -> float:
+    return proficiency_score / 100
+
+def proficiency_score(mastery: float) -> int:
+    return int(round(mastery * 100))
+
+def current_mastery(previous: Optional[Tuple[int, Optional[float]]]) -> float:
+    """The estimate to update, from a UserSkill's (proficiency_score, mastery_probability), or None for no row."""
+    if previous is None:
+        return BKT_PRIOR
+    score, mastery = previous
+    return mastery if mastery is not None else mastery_from_score(score)
+
+def trace(previous: Dict[int, Tuple[int, Optional[float]]], skill_results: Dict[int, Tuple[int, int]]) -> Dict[int, float]:
+    """Update the estimates of a submission's {skill_id: (correct, attempted)} skills at once.
+
+    previous maps skill ids to the learner's (proficiency_score, mastery_probability);
+    skills without a row start from BKT_PRIOR.
+    """
+    skill_ids = list(skill_results)
+    mastery = np.array([current_mastery(previous.get(skill_id)) for skill_id in skill_ids], dtype=float)
+    counts = np.array([skill_results[skill_id] for skill_id in skill_ids], dtype=float).reshape(-1, 2)
+    return dict(zip(skill_ids, update_mastery(mastery, counts[:, 0], counts[:, 1]).tolist()))
+
+
+# Batch recompute
+def replay(new_group: np.ndarray, scores: np.ndarray, correct: np.ndarray, attempts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Trace packed assessment histories. Returns (mastery after each assessment, final mastery per history).
+
+    The arrays hold one assessment per element, histories contiguous and in time
+    order, new_group marking the first of each. Assessments with negative
+    attempts are direct scores. Step k updates every history's k-th assessment
+    at once, so the loop runs as many times as the longest history is long.
+    """
+    group = np.cumsum(new_group) - 1
+    starts = np.flatnonzero(new_group)
+    position = np.arange(len(group)) - starts[group]
+    order = np.argsort(position, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(position))))
+
+    group_mastery = np.full(len(starts), BKT_PRIOR)
+    event_mastery = np.empty(len(group))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        events = order[lo:hi]
+        groups = group[events]
+        observed = attempts[events] >= 0
+        group_mastery[groups] = np.where(
+            observed,
+            update_mastery(group_mastery[groups], correct[events], attempts[events]),
+            scores[events] / 100,
+        )
+        event_mastery[events] = group_mastery[groups]
+    return event_mastery, group_mastery
+
+def _packed(rows, width: int) -> np.ndarray:
+    # Rows as a (len(rows), width) float array; np.array() would probe every Row for the array protocol
+    return np.fromiter(chain.from_iterable(rows), dtype=float, count=len(rows) * width).reshape(-1, width)
+
+def _user_skill_keys(user_ids: np.ndarray, skill_ids: np.ndarray) -> np.ndarray:
+    return (user_ids.astype(np.int64) << 32) | skill_ids.astype(np.int64)
+
+def _history_batches(db: Session, batch_size: int) -> Iterator[np.ndarray]:
+    """Yield the packed (id, user_id, skill_id, score, correct, attempts) assessments in history order.
+
+    Rows are streamed batch_size at a time, and each batch holds whole users: the
+    rows of the last user of a partition are carried into the next batch.
+    """
+    assessments = models.SkillAssessment.__table__
+    result = db.execute(
+        select(
+            assessments.c.id, assessments.c.user_id, assessments.c.skill_id, assessments.c.proficiency_score,
+            func.coalesce(assessments.c.correct_answers, 0), func.coalesce(assessments.c.attempts, -1),
+        )
+        .order_by(assessments.c.user_id, assessments.c.skill_id, assessments.c.assessed_at, assessments.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    carried = np.empty((0, 6), dtype=np.int64)
+    for rows in result.partitions():
+        packed = np.concatenate((carried, _packed(rows, 6).astype(np.int64)))
+        last_user_start = np.searchsorted(packed[:, 1], packed[-1, 1])
+        carried = packed[last_user_start:]
+        if last_user_start:
+            yield packed[:last_user_start]
+    if len(carried):
+        yield carried
+
+def _recompute_batch(db: Session, batch: np.ndarray) -> Tuple[int, int]:
+    # Replays the histories of the batch's users and writes what changed; returns the rows updated per table
+    assessments = models.SkillAssessment.__table__
+    user_skills = models.UserSkill.__table__
+    ids, user_ids, skill_ids, scores, correct, attempts = batch.T
+
+    keys = _user_skill_keys(user_ids, skill_ids)
+    new_group = np.concatenate(([True], keys[1:] != keys[:-1]))
+    event_mastery, group_mastery = replay(new_group, scores, correct, attempts)
+    group_keys = keys[new_group]
+
+    event_scores = np.rint(event_mastery * 100).astype(np.int64)
+    changed_events = np.flatnonzero((attempts >= 0) & (event_scores != scores))
+    if len(changed_events):
+        db.execute(
+            update(assessments).where(assessments.c.id == bindparam("b_id")).values(proficiency_score=bindparam("b_score")),
+            [{"b_id": int(ids[i]), "b_score": int(event_scores[i])} for i in changed_events],
+        )
+
+    # Match the batch's user_skills rows to their histories through the sorted (user_id, skill_id) keys
+    skill_rows = db.execute(select(
+        user_skills.c.id, user_skills.c.user_id, user_skills.c.skill_id, user_skills.c.proficiency_score,
+        func.coalesce(user_skills.c.mastery_probability, -1.0),
+    ).where(user_skills.c.user_id.between(int(user_ids[0]), int(user_ids[-1])))).all()
+    changed_user_skills = []
+    if skill_rows:
+        packed = _packed(skill_rows, 5)
+        row_ids, row_users, row_skills, row_scores = packed[:, :4].astype(np.int64).T
+        row_mastery = packed[:, 4]
+        row_keys = _user_skill_keys(row_users, row_skills)
+        matches = np.minimum(np.searchsorted(group_keys, row_keys), len(group_keys) - 1)
+        has_history = group_keys[matches] == row_keys
+        mastery = group_mastery[matches]
+        new_scores = np.rint(mastery * 100).astype(np.int64)
+        changed = has_history & ((new_scores != row_scores) | ~np.isclose(mastery, row_mastery, rtol=0, atol=1e-9))
+        changed_user_skills = [
+            {"b_id": int(row_ids[i]), "b_score": int(new_scores[i]), "b_mastery": float(mastery[i])}
+            for i in np.flatnonzero(changed)
+        ]
+    if changed_user_skills:
+        db.execute(
+            update(user_skills).where(user_skills.c.id == bindparam("b_id")).values(
+                proficiency_score=bindparam("b_score"),
+                mastery_probability=bindparam("b_mastery"),
+                last_assessed_at=user_skills.c.last_assessed_at, # A recompute is not an assessment
+            ),
+            changed_user_skills,
+        )
+    return len(changed_events), len(changed_user_skills)
+
+def recompute(db: Session, batch_size: int = RECOMPUTE_BATCH_SIZE) -> Dict[str, int]:
+    """Replay every assessment history with the current parameters and commit.
+
+    Rewrites the scores of quiz assessments and the UserSkill estimates that
+    changed, then reconciles the analytics rollups. Histories are read and
+    replayed batch_size assessments at a time, so memory use does not grow
+    with the history. Returns the number of rows updated per table.
+    """
+    counts = {"skill_assessments": 0, "user_skills": 0}
+    replayed = False
+    for batch in _history_batches(db, batch_size):
+        changed_assessments, changed_user_skills = _recompute_batch(db, batch)
+        counts["skill_assessments"] += changed_assessments
+        counts["user_skills"] += changed_user_skills
+        replayed = True
+    if replayed:
+        analytics.reconcile(db) # Commits
+    return counts
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    if sys.argv[1:] != ["recompute"]:
+        sys.exit("Usage: python knowledge_tracing.py recompute")
+    with SessionLocal() as db:
+        counts = recompute(db)
+    print("Updated " + ", ".join(f"{count} {table}" for table, count in counts.items()))
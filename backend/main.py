@@ -1,17 +1,68 @@
-from fastapi import Depends, FastAPI, HTTPException, status
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, Response, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional, List # Ensure List is imported here as it's used later
+from typing import Dict, Optional, List, Tuple, Union # Ensure List is imported here as it's used later
 
+import admin_exports
+import analytics
+import catalog_transfer
+import catalog_versions
+import content_search
 import crud
+import knowledge_tracing
+import migrations
 import models
 import schemas
-from database import SessionLocal, engine, get_db # Changed to absolute import
-
-models.Base.metadata.create_all(bind=engine)
+from course_cache import course_cache
+from database import SessionLocal, engine, get_async_db, get_db, pool_metrics # Changed to absolute import
+from pagination import InvalidCursor
+from password_hashing import HashingPoolSaturated, password_hasher
+from principal_cache import principal_cache
+from quiz_cache import quiz_cache
+from request_metrics import InstrumentedRoute, RequestMetricsMiddleware, request_metrics
+from skill_index import skill_index
+
+logger = logging.getLogger(__name__)
+
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+def _reconcile_analytics():
+    with SessionLocal() as reconcile_db:
+        return analytics.reconcile(reconcile_db)
+
+async def reconcile_analytics_periodically():
+    # Full recompute of the admin analytics rollups, correcting any drift of the incremental updates
+    while True:
+        await asyncio.sleep(analytics.ANALYTICS_RECONCILE_INTERVAL)
+        try:
+            await run_in_threadpool(_reconcile_analytics)
+        except Exception:
+            logger.exception("Analytics reconcile failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With several workers, disable this and run `python migrations.py upgrade` once per deploy
+    if RUN_MIGRATIONS_ON_STARTUP:
+        migrations.upgrade(engine)
+    with SessionLocal() as startup_db:
+        skill_index.load(startup_db)
+    # With several workers, consider ANALYTICS_RECONCILE_INTERVAL=0 and a scheduled `python analytics.py reconcile`
+    reconciler = asyncio.create_task(reconcile_analytics_periodically()) if analytics.ANALYTICS_RECONCILE_INTERVAL > 0 else None
+    yield
+    if reconciler is not None:
+        reconciler.cancel()
 
 # JWT Configuration
 SECRET_KEY = "your-secret-key"  # In a real app, use a strong, environment-variable-based key
@@ -20,7 +71,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = InstrumentedRoute # Times each endpoint separately from serialization
 
 origins = [
     "http://localhost:3000",
@@ -33,8 +85,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Query-Count", "Server-Timing"],
 )
 
+# Per-route timings, SQL counts and sizes for every handler: X-Query-Count and
+# Server-Timing headers on each response, totals at /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request: Request, exc: HashingPoolSaturated):
+    # Shed load instead of queueing bcrypt work without bound
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many sign-in requests, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": "Invalid pagination cursor"})
+
+@app.exception_handler(catalog_transfer.CatalogImportError)
+async def catalog_import_error_handler(request: Request, exc: catalog_transfer.CatalogImportError):
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": f"Invalid catalog file: {exc}"})
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -45,7 +119,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -59,24 +133,62 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_email(db, email=token_data.email)
-    if user is None:
+
+    user_id = payload.get("uid")
+    token_version = payload.get("ver", 0)
+    if user_id is not None:
+        # Fast path: a cached principal whose token version matches needs no query
+        principal = principal_cache.get(user_id)
+        if principal is not None and principal.token_version == token_version:
+            return principal
+        user = await crud.get_user_async(db, user_id=user_id)
+    else:
+        # Tokens issued before user ids were embedded in the claims
+        user = await crud.get_user_by_email_async(db, email=token_data.email)
+    if user is None or (user.token_version or 0) != token_version:
         raise credentials_exception
-    return user
 
-async def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+    principal = schemas.Principal.model_validate(user)
+    principal_cache.put(principal)
+    return principal
+
+async def get_current_admin_user(current_user: schemas.Principal = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform this action")
     return current_user
 
+# Course write permissions: admins, or the instructor of the owning course.
+# Each dependency resolves the target and its owner in one query and returns
+# the crud.Ownership, whose resource the endpoint passes to the mutation.
+def _authorize_course_write(ownership: Optional[crud.Ownership], current_user: schemas.Principal, resource_name: str) -> crud.Ownership:
+    if ownership is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{resource_name} not found")
+    if not current_user.is_admin and (ownership.instructor_id is None or ownership.instructor_id != current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Not authorized for this {resource_name.lower()}")
+    return ownership
+
+def get_course_write_access(course_id: int, db: Session = Depends(get_db), current_user: schemas.Principal = Depends(get_current_user)):
+    return _authorize_course_write(crud.get_course_ownership(db, course_id=course_id), current_user, "Course")
+
+def get_module_write_access(module_id: int, db: Session = Depends(get_db), current_user: schemas.Principal = Depends(get_current_user)):
+    return _authorize_course_write(crud.get_module_ownership(db, module_id=module_id), current_user, "Module")
+
+def get_lesson_write_access(lesson_id: int, db: Session = Depends(get_db), current_user: schemas.Principal = Depends(get_current_user)):
+    return _authorize_course_write(crud.get_lesson_ownership(db, lesson_id=lesson_id), current_user, "Lesson")
+
 # Admin User Management
-@app.get("/admin/users/", response_model=List[schemas.User])
+@app.get("/admin/users/", response_model=Union[List[schemas.User], schemas.Page[schemas.User]])
 def admin_read_users(
-    skip: int = 0, 
-    limit: int = 100, 
+    skip: int = Query(0, ge=0), 
+    limit: int = Query(100, ge=1, le=1000), 
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db), 
     admin_user: models.User = Depends(get_current_admin_user)
 ):
+    # Passing cursor (empty for the first page) switches to keyset pagination and a Page envelope
+    if cursor is not None:
+        users, next_cursor = crud.get_users_page(db, cursor=cursor, limit=limit)
+        return {"items": users, "next_cursor": next_cursor}
     users = crud.get_users(db, skip=skip, limit=limit)
     return users
 
@@ -102,18 +214,142 @@ def admin_update_user_details(
     return updated_user
 
 # Admin Enrollment Management
-@app.get("/admin/enrollments/", response_model=List[schemas.Enrollment])
+@app.get("/admin/enrollments/", response_model=Union[List[schemas.Enrollment], schemas.Page[schemas.Enrollment], List[schemas.EnrollmentSummary], schemas.Page[schemas.EnrollmentSummary]])
 def admin_read_all_enrollments(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    summary: bool = False,
     db: Session = Depends(get_db),
     admin_user: models.User = Depends(get_current_admin_user)
 ):
-    enrollments = crud.get_all_enrollments(db, skip=skip, limit=limit)
-    # The schemas.Enrollment.from_orm method handles parsing of completed_lessons
-    return [schemas.Enrollment.from_orm(e) for e in enrollments]
+    # summary=true swaps the nested module/lesson tree for a CourseBrief
+    enrollment_schema = schemas.EnrollmentSummary if summary else schemas.Enrollment
+    if cursor is not None:
+        enrollments, next_cursor = crud.get_all_enrollments_page(db, cursor=cursor, limit=limit, response_model=enrollment_schema)
+        return schemas.Page[enrollment_schema](items=[enrollment_schema.model_validate(e) for e in enrollments], next_cursor=next_cursor)
+    enrollments = crud.get_all_enrollments(db, skip=skip, limit=limit, response_model=enrollment_schema)
+    return [enrollment_schema.model_validate(e) for e in enrollments]
+
+def _admin_export_response(rows_for, export_format: str, name: str) -> StreamingResponse:
+    if export_format not in admin_exports.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of {', '.join(admin_exports.EXPORT_FORMATS)}",
+        )
+
+    def lines():
+        # The request's session is closed before the body is streamed, so use our own
+        with SessionLocal() as export_db:
+            for chunk in admin_exports.export_chunks(rows_for(export_db), export_format):
+                yield chunk.encode()
+
+    return StreamingResponse(
+        lines(),
+        media_type=admin_exports.EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
+    )
+
+@app.get("/admin/enrollments/export")
+def admin_export_enrollments(format: str = "csv", admin_user: models.User = Depends(get_current_admin_user)):
+    # Flat rows with user email, course title and completed lesson count, as CSV or NDJSON
+    return _admin_export_response(admin_exports.enrollment_rows, format, "enrollments")
+
+@app.get("/admin/user-skills/export")
+def admin_export_user_skills(format: str = "csv", admin_user: models.User = Depends(get_current_admin_user)):
+    # Flat rows with user email and skill name, as CSV or NDJSON
+    return _admin_export_response(admin_exports.user_skill_rows, format, "user-skills")
+
+# Admin Analytics
+# Served from rollup rows kept by the analytics module, so each answer reads a
+# fixed number of rows however many enrollments and scores there are.
+@app.get("/admin/analytics/courses", response_model=List[schemas.CourseAnalytics])
+def admin_read_course_analytics(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    return analytics.get_course_analytics(db, skip=skip, limit=limit)
+
+@app.get("/admin/analytics/courses/{course_id}", response_model=schemas.CourseAnalytics)
+def admin_read_course_analytics_for(course_id: int, db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    course_analytics = analytics.get_course_analytics_for(db, course_id=course_id)
+    if course_analytics is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
+    return course_analytics
+
+@app.get("/admin/analytics/courses/{course_id}/activity", response_model=schemas.CourseActivity)
+def admin_read_course_activity(course_id: int, days: int = 30, db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    # Daily enrollments, completions and active learners of the course's cohort over the last days days
+    if not 1 <= days <= analytics.ACTIVITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {analytics.ACTIVITY_MAX_DAYS}")
+    if crud.get_course(db, course_id=course_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
+    return analytics.get_course_activity(db, course_id=course_id, days=days)
+
+@app.get("/admin/analytics/skills", response_model=List[schemas.SkillAnalytics])
+def admin_read_skill_analytics(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    return analytics.get_skill_analytics(db, skip=skip, limit=limit)
+
+@app.get("/admin/analytics/skills/{skill_id}", response_model=schemas.SkillAnalytics)
+def admin_read_skill_analytics_for(skill_id: int, db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    skill_analytics = analytics.get_skill_analytics(db, skill_id=skill_id)
+    if not skill_analytics:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Skill not found")
+    return skill_analytics[0]
+
+@app.get("/admin/users/{user_id}/skills/{skill_id}/history", response_model=schemas.SkillTrajectory)
+def admin_read_skill_history(user_id: int, skill_id: int, days: int = 90, limit: int = 500, db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    return read_skill_trajectory(db, user_id, skill_id, days, limit)
+
+@app.post("/admin/analytics/reconcile")
+def admin_reconcile_analytics(admin_user: models.User = Depends(get_current_admin_user)):
+    # Recompute the rollups now; returns the number of rows that were corrected per table
+    return _reconcile_analytics()
+
+# Admin Database Monitoring
+@app.get("/admin/db/pool")
+def admin_read_pool_metrics(admin_user: models.User = Depends(get_current_admin_user)):
+    # Connection pool checkout counts, wait times and current occupancy
+    return pool_metrics.snapshot(engine.pool)
+
+@app.get("/admin/password-hashing")
+def admin_read_password_hashing_metrics(admin_user: models.User = Depends(get_current_admin_user)):
+    # Hashing pool queue depth, rejections and bcrypt timings
+    return password_hasher.metrics()
+
+@app.get("/admin/course-cache")
+def admin_read_course_cache_metrics(admin_user: models.User = Depends(get_current_admin_user)):
+    # Serialized course cache size, hit/miss/eviction counters
+    return course_cache.metrics()
+
+# Admin Catalog Import/Export
+@app.post("/admin/catalog/import")
+def admin_import_catalog(
+    file: UploadFile = File(...), db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)
+):
+    # NDJSON or a zipped package of NDJSON files, see catalog_transfer
+    return catalog_transfer.import_catalog(db, file.file)
+
+def _catalog_export_lines():
+    # The request's session is closed before the body is streamed, so use our own
+    with SessionLocal() as export_db:
+        for line in catalog_transfer.export_catalog(export_db):
+            yield line.encode()
+
+@app.get("/admin/catalog/export")
+def admin_export_catalog(admin_user: models.User = Depends(get_current_admin_user)):
+    return StreamingResponse(
+        _catalog_export_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="catalog.ndjson"'},
+    )
 
 # Admin Skill Management
+@app.get("/admin/skill-index/check")
+def admin_check_skill_index(
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user)
+):
+    # Lists any differences between the in-memory skill index and the database
+    return skill_index.check_consistency(db)
+
 @app.post("/admin/skills/", response_model=schemas.Skill, status_code=status.HTTP_201_CREATED)
 def admin_create_skill(
     skill: schemas.SkillCreate, 
@@ -125,13 +361,17 @@ def admin_create_skill(
         raise HTTPException(status_code=400, detail="Skill with this name already exists")
     return crud.create_skill(db=db, skill=skill)
 
-@app.get("/admin/skills/", response_model=List[schemas.Skill])
+@app.get("/admin/skills/", response_model=Union[List[schemas.Skill], schemas.Page[schemas.Skill]])
 def admin_read_skills(
-    skip: int = 0, 
-    limit: int = 100, 
+    skip: int = Query(0, ge=0), 
+    limit: int = Query(100, ge=1, le=1000), 
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db), 
     admin_user: models.User = Depends(get_current_admin_user)
 ):
+    if cursor is not None:
+        skills, next_cursor = crud.get_skills_page(db, cursor=cursor, limit=limit)
+        return {"items": skills, "next_cursor": next_cursor}
     skills = crud.get_skills(db, skip=skip, limit=limit)
     return skills
 
@@ -191,17 +431,31 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not crud.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user_by_email_async(db, email=form_data.username)
+    verified, new_hash = False, None
+    if user:
+        # bcrypt runs on the hashing pool so the event loop stays free
+        verified, new_hash = await password_hasher.verify_and_update_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored hash used an outdated cost factor
+        await crud.update_password_hash_async(db, user, new_hash)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "adm": user.is_admin,
+            "act": user.is_active,
+            "ver": user.token_version or 0,
+        },
+        expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer", "is_admin": user.is_admin}
 
@@ -213,36 +467,117 @@ async def read_users_me(current_user: schemas.User = Depends(get_current_user)):
 async def root():
     return {"message": "Hello World from CognitiveLabsSchool Backend!"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics(admin_user: models.User = Depends(get_current_admin_user)):
+    # Prometheus text format; per-route request counts, latency, SQL and response size totals. Admins only, like the other metrics
+    return PlainTextResponse(request_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# Catalog HTTP caching
+def check_catalog_etag(request: Request, response: Response, db: Session, scopes: List[str]) -> Tuple[Optional[Response], Dict[str, int]]:
+    """Return a 304 if the client's copy of a catalog response is current, else set its ETag.
+
+    Also returns the versions read. Call before loading anything, so the ETag
+    can never describe newer data than the body it is sent with.
+    """
+    versions = catalog_versions.get_versions(db, scopes)
+    etag = catalog_versions.format_etag(versions, scopes)
+    if etag is None:
+        return None, versions
+    headers = {"ETag": etag, "Cache-Control": catalog_versions.CATALOG_CACHE_CONTROL}
+    if catalog_versions.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers), versions
+    response.headers.update(headers)
+    return None, versions
+
+def serialized_courses(db: Session, course_ids: List[int], versions: Optional[Dict[str, int]] = None, summary: bool = False) -> List[bytes]:
+    """Return the schemas.Course (or CourseSummary) JSON of each existing course, in order.
+
+    Current entries come from course_cache as pre-encoded bytes; the rest are
+    loaded in one query, serialized and cached under the version read first.
+    Pass versions when the course scopes were already read for the request.
+    """
+    course_schema = schemas.CourseSummary if summary else schemas.Course
+    view = "summary" if summary else "full"
+    if versions is None:
+        versions = catalog_versions.get_versions(db, [catalog_versions.course_scope(course_id) for course_id in course_ids])
+    bodies: Dict[int, bytes] = {}
+    for course_id in course_ids:
+        version = versions.get(catalog_versions.course_scope(course_id))
+        body = course_cache.get(course_id, version, view) if version is not None else None
+        if body is not None:
+            bodies[course_id] = body
+
+    missing = [course_id for course_id in course_ids if course_id not in bodies]
+    if missing:
+        for db_course in crud.get_courses_by_ids(db, missing, response_model=course_schema):
+            body = course_schema.model_validate(db_course).model_dump_json().encode()
+            version = versions.get(catalog_versions.course_scope(db_course.id))
+            if version is not None:
+                course_cache.put(db_course.id, version, body, view)
+            bodies[db_course.id] = body
+    return [bodies[course_id] for course_id in course_ids if course_id in bodies]
+
+def json_bytes_response(body: bytes, response: Response) -> Response:
+    # Pre-encoded JSON bypasses response_model validation; keep headers already set on response
+    return Response(content=body, media_type="application/json", headers=dict(response.headers))
+
+# Search
+# Ranked full-text search over course, module and lesson text, from the index
+# content_search keeps in step with the catalog writes.
+@app.get("/search", response_model=List[schemas.SearchResult])
+def search_catalog(q: str, doc_type: Optional[str] = Query(None, alias="type"), skip: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)):
+    if doc_type is not None and doc_type not in content_search.DOCUMENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"type must be one of: {', '.join(content_search.DOCUMENT_TYPES)}")
+    return content_search.search(db, q, doc_type=doc_type, skip=skip, limit=limit)
+
+@app.post("/admin/proficiency/recompute")
+def admin_recompute_proficiency(db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    # Rows updated per table by replaying every assessment history
+    return knowledge_tracing.recompute(db)
+
+@app.post("/admin/search/rebuild")
+def admin_rebuild_search_index(db: Session = Depends(get_db), admin_user: models.User = Depends(get_current_admin_user)):
+    # Documents indexed per type
+    return content_search.rebuild(db)
+
 # Course Endpoints
 @app.post("/courses/", response_model=schemas.Course, status_code=status.HTTP_201_CREATED)
 def create_new_course(course: schemas.CourseCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     # Assuming current_user is the instructor, or add specific role check
     return crud.create_course(db=db, course=course, instructor_id=current_user.id)
 
-@app.get("/courses/", response_model=List[schemas.Course])
-def read_courses(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    courses = crud.get_courses(db, skip=skip, limit=limit)
-    return courses
-
-@app.get("/courses/{course_id}", response_model=schemas.Course)
-def read_course(course_id: int, db: Session = Depends(get_db)):
-    db_course = crud.get_course(db, course_id=course_id)
-    if db_course is None:
+# summary=true omits lesson bodies (schemas.CourseSummary) for catalog listings
+@app.get("/courses/", response_model=Union[List[schemas.Course], schemas.Page[schemas.Course], List[schemas.CourseSummary], schemas.Page[schemas.CourseSummary]])
+def read_courses(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=1000), cursor: Optional[str] = None, summary: bool = False, db: Session = Depends(get_db)):
+    not_modified, _ = check_catalog_etag(request, response, db, [catalog_versions.CATALOG_SCOPE])
+    if not_modified:
+        return not_modified
+    if cursor is not None:
+        course_ids, next_cursor = crud.get_course_ids_page(db, cursor=cursor, limit=limit)
+        items = b"[" + b",".join(serialized_courses(db, course_ids, summary=summary)) + b"]"
+        return json_bytes_response(b'{"items":' + items + b',"next_cursor":' + json.dumps(next_cursor).encode() + b"}", response)
+    course_ids = crud.get_course_ids(db, skip=skip, limit=limit)
+    return json_bytes_response(b"[" + b",".join(serialized_courses(db, course_ids, summary=summary)) + b"]", response)
+
+@app.get("/courses/{course_id}", response_model=Union[schemas.Course, schemas.CourseSummary])
+def read_course(course_id: int, request: Request, response: Response, summary: bool = False, db: Session = Depends(get_db)):
+    not_modified, versions = check_catalog_etag(request, response, db, [catalog_versions.course_scope(course_id)])
+    if not_modified:
+        return not_modified
+    bodies = serialized_courses(db, [course_id], versions, summary=summary)
+    if not bodies:
         raise HTTPException(status_code=404, detail="Course not found")
-    return db_course
+    return json_bytes_response(bodies[0], response)
 
 @app.put("/courses/{course_id}", response_model=schemas.Course)
 def update_course_details(
     course_id: int, 
     course_update: schemas.CourseUpdate, 
     db: Session = Depends(get_db), 
-    admin_user: models.User = Depends(get_current_admin_user) # Ensures only admin can update
+    admin_user: models.User = Depends(get_current_admin_user), # Ensures only admin can update
+    ownership: crud.Ownership = Depends(get_course_write_access)
 ):
-    db_course = crud.get_course(db, course_id=course_id)
-    if db_course is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
-    
-    updated_course = crud.update_course(db=db, course_id=course_id, course_update=course_update)
+    updated_course = crud.update_course(db=db, course_id=course_id, course_update=course_update, db_course=ownership.resource)
     if updated_course is None: # Should not happen if course was found, but good for safety
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not update course")
     return updated_course
@@ -251,13 +586,10 @@ def update_course_details(
 def delete_course_by_id(
     course_id: int, 
     db: Session = Depends(get_db), 
-    admin_user: models.User = Depends(get_current_admin_user) # Ensures only admin can delete
+    admin_user: models.User = Depends(get_current_admin_user), # Ensures only admin can delete
+    ownership: crud.Ownership = Depends(get_course_write_access)
 ):
-    db_course = crud.get_course(db, course_id=course_id)
-    if db_course is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Course not found")
-    
-    crud.delete_course(db=db, course_id=course_id)
+    crud.delete_course(db=db, course_id=course_id, db_course=ownership.resource)
     return None # FastAPI will return 204 No Content
 
 # Course-Skill Association Endpoints
@@ -282,27 +614,29 @@ def admin_remove_skill_from_course(
 # Module Endpoints
 @app.post("/courses/{course_id}/modules/", response_model=schemas.Module, status_code=status.HTTP_201_CREATED)
 def create_new_module_for_course(
-    course_id: int, module: schemas.ModuleCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)
+    course_id: int, module: schemas.ModuleCreate, db: Session = Depends(get_db), ownership: crud.Ownership = Depends(get_course_write_access)
 ):
-    db_course = crud.get_course(db, course_id=course_id)
-    if db_course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-    # Allow if current user is admin OR the instructor of the course
-    if not current_user.is_admin and (db_course.instructor_id is None or db_course.instructor_id != current_user.id):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add modules to this course")
+    # Allowed for admins and the instructor of the course
     return crud.create_module_for_course(db=db, module=module, course_id=course_id)
 
-@app.get("/courses/{course_id}/modules/", response_model=List[schemas.Module])
-def read_modules_for_course(course_id: int, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+@app.get("/courses/{course_id}/modules/", response_model=Union[List[schemas.Module], schemas.Page[schemas.Module], List[schemas.ModuleSummary], schemas.Page[schemas.ModuleSummary]])
+def read_modules_for_course(course_id: int, request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=1000), cursor: Optional[str] = None, summary: bool = False, db: Session = Depends(get_db)):
+    not_modified, _ = check_catalog_etag(request, response, db, [catalog_versions.course_scope(course_id)])
+    if not_modified:
+        return not_modified
     db_course = crud.get_course(db, course_id=course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    modules = crud.get_modules_for_course(db, course_id=course_id, skip=skip, limit=limit)
-    return modules
+    module_schema = schemas.ModuleSummary if summary else schemas.Module
+    if cursor is not None:
+        modules, next_cursor = crud.get_modules_for_course_page(db, course_id=course_id, cursor=cursor, limit=limit, response_model=module_schema)
+        return schemas.Page[module_schema](items=[module_schema.model_validate(module) for module in modules], next_cursor=next_cursor)
+    modules = crud.get_modules_for_course(db, course_id=course_id, skip=skip, limit=limit, response_model=module_schema)
+    return [module_schema.model_validate(module) for module in modules]
 
 @app.get("/modules/{module_id}", response_model=schemas.Module)
 def read_module_details(module_id: int, db: Session = Depends(get_db)):
-    db_module = crud.get_module(db, module_id=module_id)
+    db_module = crud.get_module(db, module_id=module_id, response_model=schemas.Module)
     if db_module is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Module not found")
     return db_module
@@ -312,16 +646,11 @@ def update_module_details(
     module_id: int,
     module_update: schemas.ModuleUpdate,
     db: Session = Depends(get_db),
-    admin_user: models.User = Depends(get_current_admin_user) # Ensures only admin can update
+    admin_user: models.User = Depends(get_current_admin_user), # Ensures only admin can update
+    ownership: crud.Ownership = Depends(get_module_write_access)
 ):
-    db_module = crud.get_module(db, module_id=module_id)
-    if db_module is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Module not found")
-    
-    # Optional: Check if module belongs to a course the admin has rights to, if necessary
     # For now, admin can edit any module.
-
-    updated_module = crud.update_module(db=db, module_id=module_id, module_update=module_update)
+    updated_module = crud.update_module(db=db, module_id=module_id, module_update=module_update, db_module=ownership.resource)
     if updated_module is None:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not update module")
     return updated_module
@@ -330,13 +659,10 @@ def update_module_details(
 def delete_module_by_id(
     module_id: int,
     db: Session = Depends(get_db),
-    admin_user: models.User = Depends(get_current_admin_user) # Ensures only admin can delete
+    admin_user: models.User = Depends(get_current_admin_user), # Ensures only admin can delete
+    ownership: crud.Ownership = Depends(get_module_write_access)
 ):
-    db_module = crud.get_module(db, module_id=module_id)
-    if db_module is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Module not found")
-
-    crud.delete_module(db=db, module_id=module_id)
+    crud.delete_module(db=db, module_id=module_id, db_module=ownership.resource)
     return None
 
 # Module-Skill Association Endpoints
@@ -358,60 +684,39 @@ def admin_remove_skill_from_module(
         raise HTTPException(status_code=404, detail="Module or Skill not found, or skill not associated")
     return updated_module
 
-async def get_current_admin_or_instructor_for_lesson(
-    lesson_id: int, 
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
-):
-    db_lesson = crud.get_lesson(db, lesson_id=lesson_id)
-    if not db_lesson:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lesson not found")
-    
-    db_module = crud.get_module(db, module_id=db_lesson.module_id)
-    if not db_module: # Should not happen if lesson exists with valid module_id
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent module not found")
-
-    db_course = crud.get_course(db, course_id=db_module.course_id)
-    if not db_course: # Should not happen
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent course not found")
-
-    if not current_user.is_admin and (db_course.instructor_id is None or db_course.instructor_id != current_user.id):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized for this lesson")
-    return current_user # or could return the lesson/module/course if needed by endpoint
-
 # Lesson Endpoints
 @app.post("/modules/{module_id}/lessons/", response_model=schemas.Lesson, status_code=status.HTTP_201_CREATED)
 def create_new_lesson_for_module(
-    module_id: int, lesson: schemas.LessonCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)
+    module_id: int, lesson: schemas.LessonCreate, db: Session = Depends(get_db), ownership: crud.Ownership = Depends(get_module_write_access)
 ):
-    db_module = crud.get_module(db, module_id=module_id)
-    if db_module is None:
-        raise HTTPException(status_code=404, detail="Module not found")
-    db_course = crud.get_course(db, course_id=db_module.course_id)
-    # Allow if current user is admin OR the instructor of the course the module belongs to
-    if not current_user.is_admin and (db_course.instructor_id is None or db_course.instructor_id != current_user.id):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add lessons to this module")
+    # Allowed for admins and the instructor of the course the module belongs to
     return crud.create_lesson_for_module(db=db, lesson=lesson, module_id=module_id)
 
-@app.get("/modules/{module_id}/lessons/", response_model=List[schemas.Lesson])
-def read_lessons_for_module(module_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@app.get("/modules/{module_id}/lessons/", response_model=Union[List[schemas.Lesson], schemas.Page[schemas.Lesson], List[schemas.LessonSummary], schemas.Page[schemas.LessonSummary]])
+def read_lessons_for_module(module_id: int, request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None, summary: bool = False, db: Session = Depends(get_db)):
+    not_modified, _ = check_catalog_etag(request, response, db, [catalog_versions.module_scope(module_id)])
+    if not_modified:
+        return not_modified
     db_module = crud.get_module(db, module_id=module_id)
     if db_module is None:
         raise HTTPException(status_code=404, detail="Module not found")
-    lessons = crud.get_lessons_for_module(db, module_id=module_id, skip=skip, limit=limit)
-    return lessons
+    lesson_schema = schemas.LessonSummary if summary else schemas.Lesson
+    if cursor is not None:
+        lessons, next_cursor = crud.get_lessons_for_module_page(db, module_id=module_id, cursor=cursor, limit=limit, response_model=lesson_schema)
+        return schemas.Page[lesson_schema](items=[lesson_schema.model_validate(lesson) for lesson in lessons], next_cursor=next_cursor)
+    lessons = crud.get_lessons_for_module(db, module_id=module_id, skip=skip, limit=limit, response_model=lesson_schema)
+    return [lesson_schema.model_validate(lesson) for lesson in lessons]
 
 @app.put("/lessons/{lesson_id}", response_model=schemas.Lesson)
 def update_lesson_details(
     lesson_id: int,
     lesson_update: schemas.LessonUpdate,
     db: Session = Depends(get_db),
-    # Use the new dependency to ensure admin or correct instructor
-    authorized_user: models.User = Depends(get_current_admin_or_instructor_for_lesson)
+    # Ensures the lesson exists and the user is an admin or the course's instructor
+    ownership: crud.Ownership = Depends(get_lesson_write_access)
 ):
-    # The dependency already checks if lesson exists and if user is authorized
-    updated_lesson = crud.update_lesson(db=db, lesson_id=lesson_id, lesson_update=lesson_update)
-    if updated_lesson is None: # Should ideally not happen if get_lesson in dependency worked
+    updated_lesson = crud.update_lesson(db=db, lesson_id=lesson_id, lesson_update=lesson_update, db_lesson=ownership.resource)
+    if updated_lesson is None: # Should not happen, the dependency loaded the lesson
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not update lesson")
     return updated_lesson
 
@@ -419,15 +724,16 @@ def update_lesson_details(
 def delete_lesson_by_id(
     lesson_id: int,
     db: Session = Depends(get_db),
-    # Use the new dependency
-    authorized_user: models.User = Depends(get_current_admin_or_instructor_for_lesson)
+    ownership: crud.Ownership = Depends(get_lesson_write_access)
 ):
-    # Dependency ensures lesson exists and user is authorized
-    crud.delete_lesson(db=db, lesson_id=lesson_id)
+    crud.delete_lesson(db=db, lesson_id=lesson_id, db_lesson=ownership.resource)
     return None
 
 @app.get("/lessons/{lesson_id}", response_model=schemas.Lesson)
-def read_lesson(lesson_id: int, db: Session = Depends(get_db)):
+def read_lesson(lesson_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    not_modified, _ = check_catalog_etag(request, response, db, [catalog_versions.lesson_scope(lesson_id)])
+    if not_modified:
+        return not_modified
     db_lesson = crud.get_lesson(db, lesson_id=lesson_id)
     if db_lesson is None:
         raise HTTPException(status_code=404, detail="Lesson not found")
@@ -451,53 +757,22 @@ def submit_quiz_answers(
         raise HTTPException(status_code=500, detail="Quiz content is missing")
 
     try:
-        quiz_data = json.loads(db_lesson.content)
-        questions = quiz_data.get("questions", [])
+        compiled_quiz = quiz_cache.get(lesson_id, db_lesson.content)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Invalid quiz content format")
 
-    if not questions:
+    if not compiled_quiz.total_questions:
         return schemas.QuizSubmissionResult(lesson_id=lesson_id, overall_score=0, score_per_skill={})
 
-    correct_answers_count = 0
-    total_questions = len(questions)
-    
-    skill_scores: Dict[int, List[bool]] = {} # skill_id: [is_correct]
-
-    # Create a map for quick question lookup
-    question_map = {q.get("id"): q for q in questions}
-
-    for user_answer in submission.answers:
-        question_id_str = str(user_answer.question_id) # Ensure string comparison if IDs are numbers in JSON
-        question_details = question_map.get(question_id_str)
-        
-        if question_details:
-            is_correct = (str(question_details.get("correctAnswer")) == str(user_answer.selected_option_id))
-            if is_correct:
-                correct_answers_count += 1
-            
-            # Track skill performance
-            skill_ids = question_details.get("skill_ids", [])
-            if isinstance(skill_ids, list): # Ensure it's a list
-                for skill_id in skill_ids:
-                    if isinstance(skill_id, int): # Ensure skill_id is an int
-                        if skill_id not in skill_scores:
-                            skill_scores[skill_id] = []
-                        skill_scores[skill_id].append(is_correct)
+    total_questions = compiled_quiz.total_questions
+    correct_answers_count, skill_results = compiled_quiz.grade(submission.answers)
 
     overall_score = (correct_answers_count / total_questions) * 100 if total_questions > 0 else 0
     
-    final_skill_scores: Dict[int, float] = {}
-    for skill_id, results in skill_scores.items():
-        if results:
-            skill_correct_count = sum(1 for r in results if r)
-            skill_proficiency = (skill_correct_count / len(results)) * 100
-            final_skill_scores[skill_id] = round(skill_proficiency, 2)
-            # Upsert user skill proficiency
-            crud.upsert_user_skill_proficiency(db, user_id=current_user.id, skill_id=skill_id, proficiency_score=int(round(skill_proficiency)))
-            
-    # Ensure keys in score_per_skill are strings for JSON compatibility if needed by Pydantic/client
-    # The schema QuizSubmissionResult has Optional[Dict[int, float]], so int keys are fine here.
+    # Knowledge tracing updates each skill's mastery estimate with this quiz's answers,
+    # and writes all of them as proficiency scores in one statement and transaction
+    masteries = crud.trace_user_skill_proficiencies(db, user_id=current_user.id, skill_results=skill_results, lesson_id=lesson_id)
+    final_skill_scores = {skill_id: round(mastery * 100, 2) for skill_id, mastery in masteries.items()}
 
     return schemas.QuizSubmissionResult(
         lesson_id=lesson_id,
@@ -513,63 +788,98 @@ def enroll_in_course(enrollment: schemas.EnrollmentCreate, db: Session = Depends
     db_course = crud.get_course(db, course_id=enrollment.course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    existing_enrollment = crud.get_enrollment_by_user_and_course(db, user_id=current_user.id, course_id=enrollment.course_id)
-    if existing_enrollment:
+    db_enrollment = crud.create_enrollment(db=db, enrollment=enrollment)
+    if db_enrollment is None:
         raise HTTPException(status_code=400, detail="User already enrolled in this course")
-    return crud.create_enrollment(db=db, enrollment=enrollment)
+    return db_enrollment
+
+@app.get("/users/me/enrollments/", response_model=Union[List[schemas.Enrollment], schemas.Page[schemas.Enrollment], List[schemas.EnrollmentSummary], schemas.Page[schemas.EnrollmentSummary]])
+def read_my_enrollments(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user), skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=1000), cursor: Optional[str] = None, summary: bool = False):
+    enrollment_schema = schemas.EnrollmentSummary if summary else schemas.Enrollment
+    if cursor is not None:
+        enrollments, next_cursor = crud.get_enrollments_by_user_page(db, user_id=current_user.id, cursor=cursor, limit=limit, response_model=enrollment_schema)
+        return schemas.Page[enrollment_schema](items=[enrollment_schema.model_validate(e) for e in enrollments], next_cursor=next_cursor)
+    enrollments = crud.get_enrollments_by_user(db, user_id=current_user.id, skip=skip, limit=limit, response_model=enrollment_schema)
+    return [enrollment_schema.model_validate(e) for e in enrollments]
+
+@app.get("/users/me/progress", response_model=List[schemas.EnrollmentProgress])
+def read_my_progress(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+    # Completed/total counts per enrollment and module plus a resume pointer, without loading lessons
+    return crud.get_progress_for_user(db, user_id=current_user.id)
+
+def read_skill_trajectory(db: Session, user_id: int, skill_id: int, days: int, limit: int) -> schemas.SkillTrajectory:
+    if days < 1:
+        raise HTTPException(status_code=400, detail="days must be at least 1")
+    since = datetime.utcnow() - timedelta(days=days)
+    assessments = crud.get_skill_assessments(db, user_id=user_id, skill_id=skill_id, since=since, limit=limit)
+    return schemas.SkillTrajectory(
+        user_id=user_id, skill_id=skill_id, since=since,
+        assessments=[schemas.SkillAssessment.model_validate(assessment) for assessment in assessments],
+    )
 
-@app.get("/users/me/enrollments/", response_model=List[schemas.Enrollment])
-def read_my_enrollments(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user), skip: int = 0, limit: int = 10):
-    enrollments = crud.get_enrollments_by_user(db, user_id=current_user.id, skip=skip, limit=limit)
-    # Use the custom from_orm in the schema to parse completed_lessons
-    return [schemas.Enrollment.from_orm(e) for e in enrollments]
+@app.get("/users/me/skills/{skill_id}/history", response_model=schemas.SkillTrajectory)
+def read_my_skill_history(skill_id: int, days: int = 90, limit: int = 500, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # The learner's proficiency scores in the skill over the last days days, oldest first
+    return read_skill_trajectory(db, current_user.id, skill_id, days, limit)
 
 @app.get("/users/me/study-plan", response_model=schemas.StudyPlanResponse)
 async def get_my_study_plan(
-    db: Session = Depends(get_db),
+    proficiency_threshold: int = Query(crud.DEFAULT_PROFICIENCY_THRESHOLD, ge=0, le=100),
+    limit: int = Query(100, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Generates and returns a personalized study plan for the current user
-    based on their skill proficiencies.
+    based on their skill proficiencies. Items covering the most weak skills
+    (those scored below proficiency_threshold) come first.
     """
-    # Optional: Allow passing proficiency_threshold as a query parameter
-    study_plan = crud.generate_study_plan(db=db, user_id=current_user.id)
+    study_plan = await crud.generate_study_plan_async(
+        db=db, user_id=current_user.id, proficiency_threshold=proficiency_threshold, limit=limit
+    )
     if not study_plan.recommendations:
         # You could return an empty list or a specific message
         # For now, returning the empty list as per StudyPlanResponse schema
         pass
     return study_plan
 
-@app.post("/enrollments/{enrollment_id}/lessons/{lesson_id}/complete", response_model=schemas.Enrollment)
-def mark_lesson_as_complete(
-    enrollment_id: int, lesson_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)
-):
-    db_enrollment = db.query(models.Enrollment).filter(models.Enrollment.id == enrollment_id).first()
-    if not db_enrollment:
+def get_own_enrollment_for_lesson(db: Session, enrollment_id: int, lesson_id: int, current_user: schemas.User) -> models.Enrollment:
+    """Return the current user's enrollment, after checking that lesson_id is a lesson of its course."""
+    row = crud.get_enrollment_and_lesson_course(db, enrollment_id=enrollment_id, lesson_id=lesson_id)
+    if row is None:
         raise HTTPException(status_code=404, detail="Enrollment not found")
+    db_enrollment, lesson_course_id = row
     if db_enrollment.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this enrollment")
+    if lesson_course_id is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    if lesson_course_id != db_enrollment.course_id:
+        raise HTTPException(status_code=400, detail="Lesson is not part of the enrolled course")
+    return db_enrollment
+
+@app.post("/enrollments/{enrollment_id}/lessons/{lesson_id}/complete", response_model=Union[schemas.Enrollment, schemas.EnrollmentSummary])
+def mark_lesson_as_complete(
+    enrollment_id: int, lesson_id: int, summary: bool = False, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)
+):
+    get_own_enrollment_for_lesson(db, enrollment_id, lesson_id, current_user)
     
-    updated_enrollment = crud.mark_lesson_complete(db, enrollment_id=enrollment_id, lesson_id=lesson_id)
+    enrollment_schema = schemas.EnrollmentSummary if summary else schemas.Enrollment
+    updated_enrollment = crud.mark_lesson_complete(db, enrollment_id=enrollment_id, lesson_id=lesson_id, response_model=enrollment_schema)
     if not updated_enrollment: # Should not happen if enrollment was found, but good practice
         raise HTTPException(status_code=404, detail="Failed to mark lesson complete")
-    return schemas.Enrollment.from_orm(updated_enrollment)
+    return enrollment_schema.model_validate(updated_enrollment)
 
-@app.post("/enrollments/{enrollment_id}/lessons/{lesson_id}/incomplete", response_model=schemas.Enrollment)
+@app.post("/enrollments/{enrollment_id}/lessons/{lesson_id}/incomplete", response_model=Union[schemas.Enrollment, schemas.EnrollmentSummary])
 def mark_lesson_as_incomplete(
-    enrollment_id: int, lesson_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)
+    enrollment_id: int, lesson_id: int, summary: bool = False, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)
 ):
-    db_enrollment = db.query(models.Enrollment).filter(models.Enrollment.id == enrollment_id).first()
-    if not db_enrollment:
-        raise HTTPException(status_code=404, detail="Enrollment not found")
-    if db_enrollment.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this enrollment")
+    get_own_enrollment_for_lesson(db, enrollment_id, lesson_id, current_user)
 
-    updated_enrollment = crud.mark_lesson_incomplete(db, enrollment_id=enrollment_id, lesson_id=lesson_id)
+    enrollment_schema = schemas.EnrollmentSummary if summary else schemas.Enrollment
+    updated_enrollment = crud.mark_lesson_incomplete(db, enrollment_id=enrollment_id, lesson_id=lesson_id, response_model=enrollment_schema)
     if not updated_enrollment: # Should not happen if enrollment was found
         raise HTTPException(status_code=404, detail="Failed to mark lesson incomplete")
-    return schemas.Enrollment.from_orm(updated_enrollment)
+    return enrollment_schema.model_validate(updated_enrollment)
 
 # Temp endpoint to seed data
 @app.post("/seed_data/", status_code=status.HTTP_201_CREATED)
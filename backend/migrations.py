@@ -0,0 +1,497 @@
+"""Versioned schema migrations.
+
+Each migration is a function of the engine, listed in MIGRATIONS under a
+version number. upgrade() applies the ones not yet recorded in the
+schema_migrations table, in order. Version 1 creates the schema the app had
+before migrations existed, and tables added since are created by their
+migration, both from the frozen definitions below rather than the current
+models: every later schema change is a migration. Migrations are written to
+be idempotent, because databases created before this module already have
+some of the later tables and columns.
+
+Usage: python migrations.py [upgrade | current]
+"""
+import json
+import sys
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, inspect, select, text
+
+import catalog_versions
+from database import dialect_insert
+
+migration_metadata = MetaData()
+schema_migrations_table = Table("schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", String, nullable=False)
+)
+
+
+# Frozen table definitions: each table as the migration creating it left it.
+# Never edit these; change the schema with a new migration instead.
+frozen_metadata = MetaData()
+
+# Version 1, the schema before migrations
+users_v1 = Table("users", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("is_active", Boolean),
+    Column("full_name", String, index=True, nullable=True),
+    Column("is_admin", Boolean)
+)
+courses_v1 = Table("courses", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, index=True, nullable=False),
+    Column("description", Text, nullable=True),
+    Column("instructor_id", Integer, ForeignKey("users.id"), nullable=True)
+)
+modules_v1 = Table("modules", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, index=True, nullable=False),
+    Column("description", Text, nullable=True),
+    Column("course_id", Integer, ForeignKey("courses.id"), nullable=False),
+    Column("order", Integer, nullable=False)
+)
+lessons_v1 = Table("lessons", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, index=True, nullable=False),
+    Column("content", Text, nullable=True),
+    Column("content_type", String),
+    Column("module_id", Integer, ForeignKey("modules.id"), nullable=False),
+    Column("order", Integer, nullable=False)
+)
+enrollments_v1 = Table("enrollments", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("course_id", Integer, ForeignKey("courses.id"), nullable=False),
+    Column("enrolled_at", String), # ISO timestamps until version 10
+    Column("completed_lessons", Text) # JSON list of lesson ids, moved to lesson_completions by version 2
+)
+skills_v1 = Table("skills", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True, nullable=False),
+    Column("description", Text, nullable=True)
+)
+user_skills_v1 = Table("user_skills", frozen_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("skill_id", Integer, ForeignKey("skills.id"), nullable=False),
+    Column("proficiency_score", Integer, nullable=False),
+    Column("last_assessed_at", String)
+)
+course_skill_association_v1 = Table("course_skill_association", frozen_metadata,
+    Column("course_id", Integer, ForeignKey("courses.id"), primary_key=True),
+    Column("skill_id", Integer, ForeignKey("skills.id"), primary_key=True)
+)
+module_skill_association_v1 = Table("module_skill_association", frozen_metadata,
+    Column("module_id", Integer, ForeignKey("modules.id"), primary_key=True),
+    Column("skill_id", Integer, ForeignKey("skills.id"), primary_key=True)
+)
+BASE_SCHEMA_TABLES = [
+    users_v1, courses_v1, modules_v1, lessons_v1, enrollments_v1, skills_v1, user_skills_v1,
+    course_skill_association_v1, module_skill_association_v1,
+]
+
+lesson_completions_v2 = Table("lesson_completions", frozen_metadata,
+    Column("enrollment_id", Integer, ForeignKey("enrollments.id"), primary_key=True),
+    Column("lesson_id", Integer, ForeignKey("lessons.id"), primary_key=True),
+    Column("completed_at", String)
+)
+catalog_versions_v6 = Table("catalog_versions", frozen_metadata,
+    Column("scope", String, primary_key=True),
+    Column("version", BigInteger, nullable=False)
+)
+module_progress_v7 = Table("module_progress", frozen_metadata,
+    Column("enrollment_id", Integer, ForeignKey("enrollments.id"), primary_key=True),
+    Column("module_id", Integer, ForeignKey("modules.id"), primary_key=True),
+    Column("completed_lesson_count", Integer, nullable=False),
+    Column("last_lesson_id", Integer, ForeignKey("lessons.id", ondelete="SET NULL"), nullable=True),
+    Column("last_activity_at", String, nullable=True)
+)
+course_stats_v8 = Table("course_stats", frozen_metadata,
+    Column("course_id", Integer, ForeignKey("courses.id"), primary_key=True),
+    Column("enrollment_count", Integer, nullable=False),
+    Column("completed_enrollment_count", Integer, nullable=False),
+    Column("lesson_completion_count", Integer, nullable=False)
+)
+skill_stats_v8 = Table("skill_stats", frozen_metadata,
+    Column("skill_id", Integer, ForeignKey("skills.id"), primary_key=True),
+    Column("user_count", Integer, nullable=False),
+    Column("proficiency_sum", BigInteger, nullable=False)
+)
+skill_proficiency_buckets_v8 = Table("skill_proficiency_buckets", frozen_metadata,
+    Column("skill_id", Integer, ForeignKey("skills.id"), primary_key=True),
+    Column("bucket", Integer, primary_key=True),
+    Column("user_count", Integer, nullable=False)
+)
+# Version 9: the search index, FTS5 on SQLite and a generated tsvector on PostgreSQL
+SEARCH_INDEX_V9 = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents USING fts5("
+        "title, body, doc_type UNINDEXED, doc_id UNINDEXED, course_id UNINDEXED, module_id UNINDEXED, "
+        "tokenize = 'porter unicode61 remove_diacritics 2')",
+    ],
+    "postgresql": [
+        "CREATE TABLE IF NOT EXISTS search_documents (id BIGINT NOT NULL, doc_type VARCHAR NOT NULL, "
+        "doc_id INTEGER NOT NULL, course_id INTEGER NOT NULL, module_id INTEGER, title TEXT NOT NULL, body TEXT NOT NULL, "
+        "document TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('english', title), 'A') || "
+        "setweight(to_tsvector('english', body), 'B')) STORED, PRIMARY KEY (id))",
+        "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING gin (document)",
+    ],
+}
+skill_assessments_v10 = Table("skill_assessments", frozen_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("skill_id", Integer, ForeignKey("skills.id"), nullable=False),
+    Column("proficiency_score", Integer, nullable=False),
+    Column("lesson_id", Integer, nullable=True),
+    Column("assessed_at", DateTime, nullable=False),
+    Index("ix_skill_assessments_user_skill_assessed_at", "user_id", "skill_id", "assessed_at")
+)
+
+
+def create_base_schema(engine):
+    """Create the tables of the schema before migrations, where they do not exist yet."""
+    frozen_metadata.create_all(bind=engine, tables=BASE_SCHEMA_TABLES)
+
+
+def migrate_completed_lessons_to_table(engine):
+    """Move the legacy Enrollment.completed_lessons JSON lists into lesson_completions.
+
+    Safe to run on every startup: migrated rows have their JSON column cleared,
+    and databases created without the legacy column are skipped entirely.
+    Returns the number of enrollments migrated.
+    """
+    lesson_completions_v2.create(bind=engine, checkfirst=True)
+    columns = {column["name"] for column in inspect(engine).get_columns("enrollments")}
+    if "completed_lessons" not in columns:
+        return 0
+
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT id, completed_lessons FROM enrollments "
+            "WHERE completed_lessons IS NOT NULL AND completed_lessons != '[]'"
+        )).all()
+        if not rows:
+            return 0
+
+        migrated_at = datetime.utcnow().isoformat() # Timestamps were ISO strings until version 10
+        completions = []
+        for enrollment_id, completed_lessons in rows:
+            try:
+                lesson_ids = json.loads(completed_lessons)
+            except json.JSONDecodeError:
+                lesson_ids = []
+            if not isinstance(lesson_ids, list):
+                lesson_ids = []
+            for lesson_id in dict.fromkeys(lesson_ids): # De-duplicate, keep order
+                if isinstance(lesson_id, int):
+                    completions.append({"enrollment_id": enrollment_id, "lesson_id": lesson_id, "completed_at": migrated_at})
+
+        if completions:
+            stmt = dialect_insert(conn, lesson_completions_v2).on_conflict_do_nothing(
+                index_elements=["enrollment_id", "lesson_id"]
+            )
+            conn.execute(stmt, completions)
+        conn.execute(
+            text("UPDATE enrollments SET completed_lessons = NULL WHERE id = :id"),
+            [{"id": enrollment_id} for enrollment_id, _ in rows]
+        )
+    return len(rows)
+
+
+def add_user_skill_unique_index(engine):
+    """Add the unique (user_id, skill_id) index to user_skills tables created without it.
+
+    Duplicate proficiency rows are collapsed first, keeping the most recent one.
+    """
+    indexes = {index["name"] for index in inspect(engine).get_indexes("user_skills")}
+    if "uq_user_skills_user_skill" in indexes:
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM user_skills WHERE id NOT IN "
+            "(SELECT max_id FROM (SELECT MAX(id) AS max_id FROM user_skills GROUP BY user_id, skill_id) AS latest)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX uq_user_skills_user_skill ON user_skills (user_id, skill_id)"))
+
+
+def add_user_token_version_column(engine):
+    """Add users.token_version to databases created before it existed."""
+    columns = {column["name"] for column in inspect(engine).get_columns("users")}
+    if "token_version" in columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def add_hot_query_indexes(engine):
+    """Add the composite indexes and unique constraints backing the hot crud lookups.
+
+    Duplicate enrollments of a user in a course are merged into the oldest one,
+    keeping every lesson completion, before the unique index is created.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO lesson_completions (enrollment_id, lesson_id, completed_at) "
+            "SELECT kept.id, lc.lesson_id, lc.completed_at FROM lesson_completions lc "
+            "JOIN enrollments e ON e.id = lc.enrollment_id "
+            "JOIN (SELECT user_id, course_id, MIN(id) AS id FROM enrollments GROUP BY user_id, course_id) kept "
+            "ON kept.user_id = e.user_id AND kept.course_id = e.course_id "
+            "WHERE e.id <> kept.id "
+            "ON CONFLICT DO NOTHING"
+        ))
+        duplicate_enrollments = (
+            "SELECT id FROM enrollments WHERE id NOT IN "
+            "(SELECT kept_id FROM (SELECT MIN(id) AS kept_id FROM enrollments GROUP BY user_id, course_id) AS kept)"
+        )
+        conn.execute(text(f"DELETE FROM lesson_completions WHERE enrollment_id IN ({duplicate_enrollments})"))
+        conn.execute(text(f"DELETE FROM enrollments WHERE id IN ({duplicate_enrollments})"))
+
+        for statement in (
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_enrollments_user_course ON enrollments (user_id, course_id)",
+            'CREATE INDEX IF NOT EXISTS ix_modules_course_order ON modules (course_id, "order", id)',
+            'CREATE INDEX IF NOT EXISTS ix_lessons_module_order ON lessons (module_id, "order", id)',
+            "CREATE INDEX IF NOT EXISTS ix_course_skill_association_skill ON course_skill_association (skill_id, course_id)",
+            "CREATE INDEX IF NOT EXISTS ix_module_skill_association_skill ON module_skill_association (skill_id, module_id)",
+            "CREATE INDEX IF NOT EXISTS ix_lesson_completions_lesson ON lesson_completions (lesson_id)",
+        ):
+            conn.execute(text(statement))
+
+
+def add_catalog_versions(engine):
+    """Create catalog_versions and give every existing catalog resource a version.
+
+    Resources without a version row get no ETag, so this makes the existing
+    catalog cacheable. Rows already present are left alone.
+    """
+    table = catalog_versions_v6
+    table.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        scopes = [catalog_versions.CATALOG_SCOPE]
+        scopes += [catalog_versions.course_scope(course_id) for course_id in conn.execute(select(courses_v1.c.id)).scalars()]
+        scopes += [catalog_versions.module_scope(module_id) for module_id in conn.execute(select(modules_v1.c.id)).scalars()]
+        scopes += [catalog_versions.lesson_scope(lesson_id) for lesson_id in conn.execute(select(lessons_v1.c.id)).scalars()]
+        version = catalog_versions.new_version()
+        conn.execute(
+            dialect_insert(conn, table).on_conflict_do_nothing(index_elements=["scope"]),
+            [{"scope": scope, "version": version} for scope in scopes]
+        )
+
+
+def add_progress_counters(engine):
+    """Add the lesson totals and progress counters and compute them from the existing rows.
+
+    Completions of lessons outside the enrollment's course are not counted,
+    as in crud.
+    """
+    column_types = {
+        "courses": {"lesson_count": "INTEGER NOT NULL DEFAULT 0"},
+        "modules": {"lesson_count": "INTEGER NOT NULL DEFAULT 0"},
+        "enrollments": {
+            "completed_lesson_count": "INTEGER NOT NULL DEFAULT 0",
+            "last_lesson_id": "INTEGER REFERENCES lessons (id) ON DELETE SET NULL",
+            "last_activity_at": "VARCHAR",
+        },
+    }
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in column_types.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+    module_progress_v7.create(bind=engine, checkfirst=True)
+
+    counted_completions = (
+        "SELECT lc.enrollment_id, lc.lesson_id, lc.completed_at, l.module_id FROM lesson_completions lc "
+        "JOIN lessons l ON l.id = lc.lesson_id JOIN modules m ON m.id = l.module_id "
+        "JOIN enrollments e ON e.id = lc.enrollment_id AND e.course_id = m.course_id"
+    )
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE modules SET lesson_count = (SELECT COUNT(*) FROM lessons WHERE lessons.module_id = modules.id)"))
+        conn.execute(text(
+            "UPDATE courses SET lesson_count = (SELECT COUNT(*) FROM lessons JOIN modules ON modules.id = lessons.module_id "
+            "WHERE modules.course_id = courses.id)"
+        ))
+        conn.execute(text("DELETE FROM module_progress"))
+        conn.execute(text(
+            "INSERT INTO module_progress (enrollment_id, module_id, completed_lesson_count, last_lesson_id, last_activity_at) "
+            f"SELECT c.enrollment_id, c.module_id, COUNT(*), "
+            f"(SELECT latest.lesson_id FROM ({counted_completions}) latest WHERE latest.enrollment_id = c.enrollment_id "
+            "AND latest.module_id = c.module_id ORDER BY latest.completed_at DESC, latest.lesson_id DESC LIMIT 1), "
+            f"MAX(c.completed_at) FROM ({counted_completions}) c GROUP BY c.enrollment_id, c.module_id"
+        ))
+        conn.execute(text(
+            "UPDATE enrollments SET "
+            "completed_lesson_count = (SELECT COALESCE(SUM(completed_lesson_count), 0) FROM module_progress WHERE module_progress.enrollment_id = enrollments.id), "
+            "last_lesson_id = (SELECT last_lesson_id FROM module_progress WHERE module_progress.enrollment_id = enrollments.id "
+            "ORDER BY last_activity_at DESC, last_lesson_id DESC LIMIT 1), "
+            "last_activity_at = (SELECT MAX(last_activity_at) FROM module_progress WHERE module_progress.enrollment_id = enrollments.id)"
+        ))
+
+def add_analytics_rollups(engine):
+    """Create the admin analytics rollup tables and fill them from the existing rows.
+
+    An enrollment is complete once its counted lessons reach the course's
+    lesson_count; scores fall in bands of 10 points, 100 in the last one.
+    """
+    frozen_metadata.create_all(bind=engine, tables=[course_stats_v8, skill_stats_v8, skill_proficiency_buckets_v8])
+    with engine.begin() as conn:
+        for table in ("course_stats", "skill_stats", "skill_proficiency_buckets"):
+            conn.execute(text(f"DELETE FROM {table}"))
+        conn.execute(text(
+            "INSERT INTO course_stats (course_id, enrollment_count, completed_enrollment_count, lesson_completion_count) "
+            "SELECT e.course_id, COUNT(*), "
+            "SUM(CASE WHEN c.lesson_count > 0 AND e.completed_lesson_count >= c.lesson_count THEN 1 ELSE 0 END), "
+            "SUM(e.completed_lesson_count) FROM enrollments e JOIN courses c ON c.id = e.course_id GROUP BY e.course_id"
+        ))
+        conn.execute(text(
+            "INSERT INTO skill_stats (skill_id, user_count, proficiency_sum) "
+            "SELECT skill_id, COUNT(*), SUM(proficiency_score) FROM user_skills GROUP BY skill_id"
+        ))
+        conn.execute(text(
+            "INSERT INTO skill_proficiency_buckets (skill_id, bucket, user_count) "
+            "SELECT skill_id, bucket, COUNT(*) FROM (SELECT skill_id, CASE WHEN proficiency_score < 0 THEN 0 "
+            "WHEN proficiency_score >= 90 THEN 9 ELSE proficiency_score / 10 END AS bucket FROM user_skills) scores "
+            "GROUP BY skill_id, bucket"
+        ))
+
+def add_search_index(engine):
+    """Create the full-text search index (FTS5 or tsvector, by dialect) and fill it from the catalog.
+
+    Documents are keyed by id * 4 + 1, 2 or 3 for courses, modules and
+    lessons; only text and markdown lessons have their content indexed.
+    """
+    is_postgresql = engine.dialect.name == "postgresql"
+    with engine.begin() as conn:
+        for statement in SEARCH_INDEX_V9["postgresql" if is_postgresql else "sqlite"]:
+            conn.execute(text(statement))
+        conn.execute(text("DELETE FROM search_documents"))
+        key_column = "id" if is_postgresql else "rowid"
+        for documents in (
+            "SELECT id * 4 + 1, 'course', id, id, NULL, title, COALESCE(description, '') FROM courses",
+            "SELECT id * 4 + 2, 'module', id, course_id, NULL, title, COALESCE(description, '') FROM modules",
+            "SELECT l.id * 4 + 3, 'lesson', l.id, m.course_id, l.module_id, l.title, "
+            "CASE WHEN COALESCE(l.content_type, 'text') IN ('text', 'markdown') THEN COALESCE(l.content, '') ELSE '' END "
+            "FROM lessons l JOIN modules m ON m.id = l.module_id",
+        ):
+            conn.execute(text(f"INSERT INTO search_documents ({key_column}, doc_type, doc_id, course_id, module_id, title, body) {documents}"))
+        if not is_postgresql:
+            conn.execute(text("INSERT INTO search_documents(search_documents) VALUES('optimize')")) # Merge the FTS5 segments
+
+TIMESTAMP_COLUMNS = {
+    "enrollments": ("enrolled_at", "last_activity_at"),
+    "lesson_completions": ("completed_at",),
+    "user_skills": ("last_assessed_at",),
+    "module_progress": ("last_activity_at",),
+}
+
+def add_skill_assessments_and_timestamps(engine):
+    """Convert the ISO string timestamps to DateTime, add skill_assessments and the time-window indexes.
+
+    PostgreSQL columns are altered to TIMESTAMP. SQLite has no timestamp type:
+    values are rewritten in SQLAlchemy's fixed-width DateTime format
+    (YYYY-MM-DD HH:MM:SS.ffffff), so they sort and compare as stored. Each
+    user's current skill scores are recorded as their first assessments.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in TIMESTAMP_COLUMNS.items():
+            column_types = {column["name"]: column["type"] for column in inspector.get_columns(table)}
+            for column in columns:
+                if engine.dialect.name == "postgresql":
+                    if not isinstance(column_types[column], DateTime):
+                        conn.execute(text(
+                            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE TIMESTAMP USING NULLIF({column}, '')::timestamp"
+                        ))
+                else:
+                    conn.execute(text(
+                        f"UPDATE {table} SET {column} = substr(replace({column}, 'T', ' ') || '.000000', 1, 26) "
+                        f"WHERE {column} LIKE '%T%' OR length({column}) = 19"
+                    ))
+
+    skill_assessments_v10.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for statement in (
+            "CREATE INDEX IF NOT EXISTS ix_enrollments_course_enrolled_at ON enrollments (course_id, enrolled_at)",
+            "CREATE INDEX IF NOT EXISTS ix_lesson_completions_lesson_completed_at ON lesson_completions (lesson_id, completed_at)",
+            "DROP INDEX IF EXISTS ix_lesson_completions_lesson", # A prefix of the index above
+        ):
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO skill_assessments (user_id, skill_id, proficiency_score, assessed_at) "
+            "SELECT us.user_id, us.skill_id, us.proficiency_score, us.last_assessed_at FROM user_skills us "
+            "WHERE us.last_assessed_at IS NOT NULL AND NOT EXISTS "
+            "(SELECT 1 FROM skill_assessments sa WHERE sa.user_id = us.user_id AND sa.skill_id = us.skill_id)"
+        ))
+
+def add_knowledge_tracing_columns(engine):
+    """Add the mastery estimates and per-assessment answer counts for knowledge tracing.
+
+    Existing scores become the starting estimates (score / 100); their
+    assessments keep no answer counts, so recomputes treat them as set directly.
+    """
+    column_types = {
+        "user_skills": {"mastery_probability": "FLOAT"},
+        "skill_assessments": {"correct_answers": "INTEGER", "attempts": "INTEGER"},
+    }
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in column_types.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        conn.execute(text("UPDATE user_skills SET mastery_probability = proficiency_score / 100.0 WHERE mastery_probability IS NULL"))
+
+MIGRATIONS = [
+    (1, "create base schema", create_base_schema),
+    (2, "move completed lessons to lesson_completions", migrate_completed_lessons_to_table),
+    (3, "unique user_skills (user_id, skill_id)", add_user_skill_unique_index),
+    (4, "users.token_version", add_user_token_version_column),
+    (5, "composite indexes for hot queries", add_hot_query_indexes),
+    (6, "catalog_versions for ETags", add_catalog_versions),
+    (7, "progress counters", add_progress_counters),
+    (8, "admin analytics rollups", add_analytics_rollups),
+    (9, "full-text search index", add_search_index),
+    (10, "skill_assessments and DateTime timestamps", add_skill_assessments_and_timestamps),
+    (11, "knowledge-tracing estimates", add_knowledge_tracing_columns),
+]
+
+
+def current_version(engine) -> int:
+    migration_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        versions = conn.execute(select(schema_migrations_table.c.version)).scalars().all()
+    return max(versions, default=0)
+
+def upgrade(engine):
+    """Apply pending migrations in version order. Returns the versions applied."""
+    applied = []
+    version = current_version(engine)
+    for migration_version, name, migrate in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        migrate(engine)
+        with engine.begin() as conn:
+            conn.execute(schema_migrations_table.insert().values(
+                version=migration_version, name=name, applied_at=datetime.utcnow().isoformat()
+            ))
+        applied.append(migration_version)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        print(f"Applied migrations: {upgrade(engine) or 'none'}")
+    elif command == "current":
+        print(f"Schema version: {current_version(engine)}")
+    else:
+        sys.exit(__doc__)
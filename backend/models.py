@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, Text, ForeignKey, Table
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Integer, String, Text, ForeignKey, Index, Table
 from sqlalchemy.orm import relationship
 from database import Base # Changed to absolute import
 from datetime import datetime
@@ -6,13 +6,15 @@ from datetime import datetime
 # Association table for Course and Skill (Many-to-Many)
 course_skill_association_table = Table('course_skill_association', Base.metadata,
     Column('course_id', Integer, ForeignKey('courses.id'), primary_key=True),
-    Column('skill_id', Integer, ForeignKey('skills.id'), primary_key=True)
+    Column('skill_id', Integer, ForeignKey('skills.id'), primary_key=True),
+    Index('ix_course_skill_association_skill', 'skill_id', 'course_id') # Reverse lookup: courses for a skill
 )
 
 # Association table for Module and Skill (Many-to-Many)
 module_skill_association_table = Table('module_skill_association', Base.metadata,
     Column('module_id', Integer, ForeignKey('modules.id'), primary_key=True),
-    Column('skill_id', Integer, ForeignKey('skills.id'), primary_key=True)
+    Column('skill_id', Integer, ForeignKey('skills.id'), primary_key=True),
+    Index('ix_module_skill_association_skill', 'skill_id', 'module_id') # Reverse lookup: modules for a skill
 )
 
 class User(Base):
@@ -24,6 +26,7 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     full_name = Column(String, index=True, nullable=True)
     is_admin = Column(Boolean, default=False) # Added for admin functionality
+    token_version = Column(Integer, nullable=False, default=0) # Bumped to revoke issued tokens
     # Add other fields like role, etc. as needed
 
     enrollments = relationship("Enrollment", back_populates="user")
@@ -37,6 +40,7 @@ class Course(Base):
     title = Column(String, index=True, nullable=False)
     description = Column(Text, nullable=True)
     instructor_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Or a dedicated Instructor table
+    lesson_count = Column(Integer, nullable=False, default=0) # Lessons across all modules, kept by crud
 
     instructor = relationship("User") # If using User as instructor
     modules = relationship("Module", back_populates="course", cascade="all, delete-orphan")
@@ -50,12 +54,16 @@ class Course(Base):
 
 class Module(Base):
     __tablename__ = "modules"
+    __table_args__ = (
+        Index("ix_modules_course_order", "course_id", "order", "id"), # Modules of a course in display order
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     description = Column(Text, nullable=True)
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
     order = Column(Integer, nullable=False, default=0) # To maintain module order
+    lesson_count = Column(Integer, nullable=False, default=0) # Kept by crud
 
     course = relationship("Course", back_populates="modules")
     lessons = relationship("Lesson", back_populates="module", cascade="all, delete-orphan")
@@ -68,6 +76,9 @@ class Module(Base):
 
 class Lesson(Base):
     __tablename__ = "lessons"
+    __table_args__ = (
+        Index("ix_lessons_module_order", "module_id", "order", "id"), # Lessons of a module in display order
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
@@ -77,19 +88,54 @@ class Lesson(Base):
     order = Column(Integer, nullable=False, default=0) # To maintain lesson order within a module
 
     module = relationship("Module", back_populates="lessons")
+    completions = relationship("LessonCompletion", back_populates="lesson", cascade="all, delete-orphan")
 
 
 class Enrollment(Base):
     __tablename__ = "enrollments"
+    __table_args__ = (
+        # A user enrolls in a course once; also serves lookups by user_id alone
+        Index("uq_enrollments_user_course", "user_id", "course_id", unique=True),
+        Index("ix_enrollments_course_enrolled_at", "course_id", "enrolled_at"), # Enrollments of a course in a time window
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
-    enrolled_at = Column(String, default=lambda: datetime.utcnow().isoformat()) # Using string for simplicity with SQLite
-    completed_lessons = Column(Text, default="[]") # Store as JSON string list of lesson IDs
+    enrolled_at = Column(DateTime, default=datetime.utcnow)
+    # Progress counters, kept by crud as lessons are completed, added and removed
+    completed_lesson_count = Column(Integer, nullable=False, default=0)
+    last_lesson_id = Column(Integer, ForeignKey("lessons.id", ondelete="SET NULL"), nullable=True) # Last lesson marked complete or incomplete
+    last_activity_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="enrollments")
     course = relationship("Course", back_populates="enrollments")
+    lesson_completions = relationship(
+        "LessonCompletion",
+        back_populates="enrollment",
+        cascade="all, delete-orphan",
+        order_by="(LessonCompletion.completed_at, LessonCompletion.lesson_id)"
+    )
+
+    @property
+    def completed_lessons(self):
+        # Lesson IDs in completion order, read from the lesson_completions rows
+        return [completion.lesson_id for completion in self.lesson_completions]
+
+
+class LessonCompletion(Base):
+    __tablename__ = "lesson_completions"
+    __table_args__ = (
+        # Completions removed with their lesson, and a lesson's completions in a time window
+        Index("ix_lesson_completions_lesson_completed_at", "lesson_id", "completed_at"),
+    )
+
+    enrollment_id = Column(Integer, ForeignKey("enrollments.id"), primary_key=True)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), primary_key=True)
+    completed_at = Column(DateTime, default=datetime.utcnow)
+
+    enrollment = relationship("Enrollment", back_populates="lesson_completions")
+    lesson = relationship("Lesson", back_populates="completions")
 
 
 class Skill(Base):
@@ -113,12 +159,81 @@ class Skill(Base):
 
 class UserSkill(Base):
     __tablename__ = "user_skills"
+    __table_args__ = (
+        # One proficiency row per user and skill; also the ON CONFLICT target for bulk upserts
+        Index("uq_user_skills_user_skill", "user_id", "skill_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     skill_id = Column(Integer, ForeignKey("skills.id"), nullable=False)
     proficiency_score = Column(Integer, nullable=False, default=0) # e.g., 0-100
-    last_assessed_at = Column(String, default=lambda: datetime.utcnow().isoformat(), onupdate=lambda: datetime.utcnow().isoformat())
+    mastery_probability = Column(Float, nullable=True) # Knowledge-tracing estimate behind proficiency_score; None reads as proficiency_score / 100
+    last_assessed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user_profile = relationship("User", back_populates="skill_proficiencies")
     skill_definition = relationship("Skill", back_populates="user_proficiencies")
+
+
+class ModuleProgress(Base):
+    # Per-module progress counters of an enrollment; a row exists once a lesson of the module is touched
+    __tablename__ = "module_progress"
+
+    enrollment_id = Column(Integer, ForeignKey("enrollments.id"), primary_key=True)
+    module_id = Column(Integer, ForeignKey("modules.id"), primary_key=True)
+    completed_lesson_count = Column(Integer, nullable=False, default=0)
+    last_lesson_id = Column(Integer, ForeignKey("lessons.id", ondelete="SET NULL"), nullable=True)
+    last_activity_at = Column(DateTime, nullable=True)
+
+
+class SkillAssessment(Base):
+    # Append-only history of proficiency scores; UserSkill holds the latest one
+    __tablename__ = "skill_assessments"
+    __table_args__ = (
+        Index("ix_skill_assessments_user_skill_assessed_at", "user_id", "skill_id", "assessed_at"), # A learner's trajectory in a skill
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    skill_id = Column(Integer, ForeignKey("skills.id"), nullable=False)
+    proficiency_score = Column(Integer, nullable=False)
+    lesson_id = Column(Integer, nullable=True) # The graded quiz, if any; not a foreign key, so history outlives lessons
+    correct_answers = Column(Integer, nullable=True) # The quiz answers counted towards the skill; None for a directly set score
+    attempts = Column(Integer, nullable=True)
+    assessed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Admin analytics rollups, maintained by the analytics module
+class CourseStats(Base):
+    __tablename__ = "course_stats"
+
+    course_id = Column(Integer, ForeignKey("courses.id"), primary_key=True)
+    enrollment_count = Column(Integer, nullable=False, default=0)
+    completed_enrollment_count = Column(Integer, nullable=False, default=0) # Enrollments with every lesson completed
+    lesson_completion_count = Column(Integer, nullable=False, default=0) # Sum of the enrollments' completed lesson counts
+
+
+class SkillStats(Base):
+    __tablename__ = "skill_stats"
+
+    skill_id = Column(Integer, ForeignKey("skills.id"), primary_key=True)
+    user_count = Column(Integer, nullable=False, default=0)
+    proficiency_sum = Column(BigInteger, nullable=False, default=0)
+
+
+class SkillProficiencyBucket(Base):
+    # Users per skill and proficiency band: bucket n holds scores 10n to 10n+9, bucket 9 also 100
+    __tablename__ = "skill_proficiency_buckets"
+
+    skill_id = Column(Integer, ForeignKey("skills.id"), primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    user_count = Column(Integer, nullable=False, default=0)
+
+
+class CatalogVersion(Base):
+    # One row per catalog scope ("catalog", "course:1", "module:2", "lesson:3"),
+    # bumped by every write that changes what the scope's endpoints return
+    __tablename__ = "catalog_versions"
+
+    scope = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False)
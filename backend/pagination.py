@@ -0,0 +1,50 @@
+import base64
+import json
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by encode_cursor for this key."""
+
+
+def encode_cursor(values: Sequence[int]) -> str:
+    """Pack the sort key of the last row on a page into an opaque, URL-safe token."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, key_length: int) -> List[int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != key_length or not all(type(value) is int for value in values):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def keyset_page(query, key_columns: Sequence, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """Return one page of query ordered by key_columns, starting after cursor.
+
+    The cursor becomes a range condition on an indexed key instead of an OFFSET,
+    so every page costs the same however deep it is. An empty or missing cursor
+    starts at the first page; limit must be at least 1. Returns (rows,
+    next_cursor); next_cursor is None on the last page.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if cursor:
+        values = decode_cursor(cursor, len(key_columns))
+        if len(key_columns) == 1:
+            query = query.filter(key_columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*key_columns) > tuple_(*values))
+
+    rows = query.order_by(*key_columns).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in key_columns])
+    return rows, next_cursor
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Password hashing configuration, read from the environment.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread") # "thread" or "process"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32")) # Waiting jobs before rejecting
+
+# Pinning min and max rounds to the configured cost makes hashes made with any
+# other cost "need update", so they are transparently rehashed on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing pool's queue is full; the API answers 429."""
+
+
+# Worker functions live at module level so a process pool can pickle them.
+# Each returns its own duration, which also works across process boundaries.
+def _timed_hash(password: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    hashed_password = pwd_context.hash(password)
+    return hashed_password, time.perf_counter() - started
+
+def _timed_verify_and_update(password: str, hashed_password: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    started = time.perf_counter()
+    result = pwd_context.verify_and_update(password, hashed_password)
+    return result, time.perf_counter() - started
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread or process pool, away from the event loop.
+
+    At most workers + max_queue jobs are accepted at once; further submissions
+    raise HashingPoolSaturated instead of queueing without limit.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE, executor: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self._lock = Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingPoolSaturated()
+            self.pending += 1
+            executor = self._get_executor()
+        future = executor.submit(fn, *args)
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _job_done(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+            if future.exception() is None:
+                _, seconds = future.result()
+                self.completed += 1
+                self.hash_seconds_total += seconds
+                self.hash_seconds_max = max(self.hash_seconds_max, seconds)
+
+    # Blocking API, for sync code already running in the threadpool
+    def hash(self, password: str) -> str:
+        return self._submit(_timed_hash, password).result()[0]
+
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Return (verified, new_hash); new_hash is set when the stored hash needs a rehash."""
+        return self._submit(_timed_verify_and_update, password, hashed_password).result()[0]
+
+    # Async API, for handlers on the event loop
+    async def hash_async(self, password: str) -> str:
+        result, _ = await asyncio.wrap_future(self._submit(_timed_hash, password))
+        return result
+
+    async def verify_and_update_async(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        result, _ = await asyncio.wrap_future(self._submit(_timed_verify_and_update, password, hashed_password))
+        return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.executor_kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.pending,
+                "queue_depth": max(0, self.pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "hash_seconds_total": round(self.hash_seconds_total, 6),
+                "hash_seconds_max": round(self.hash_seconds_max, 6),
+                "hash_seconds_avg": round(self.hash_seconds_total / self.completed, 6) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher()
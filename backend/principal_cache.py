@@ -0,0 +1,58 @@
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Tuple
+
+import schemas
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30")) # Also the revocation bound across workers
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """Short-TTL, size-bounded LRU of authenticated principals keyed by user id.
+
+    Lets get_current_user skip the users table for most requests. Entries are
+    dropped on admin changes to the user, but only in the worker serving the
+    change: revoking a user's tokens (a token_version bump) takes effect on
+    the other workers when their entry expires. The TTL is therefore the
+    revocation bound, and should stay at seconds; checking a shared version
+    on every hit would cost the query this cache exists to save.
+    """
+
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS, maxsize: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._entries: "OrderedDict[int, Tuple[float, schemas.Principal]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[schemas.Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def put(self, principal: schemas.Principal):
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
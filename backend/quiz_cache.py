@@ -0,0 +1,129 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import schemas
+
+QUIZ_CACHE_SIZE = 1024 # Maximum number of compiled quizzes kept in memory
+
+
+class CompiledQuiz:
+    """Answer key for one quiz lesson, prepared once for repeated grading.
+
+    Question ids are interned to integer slots. Each slot holds the correct
+    answer, and the (slot, skill index) pairs of every question and skill it
+    counts towards are packed into two arrays, so grading a submission needs
+    no JSON parsing or type checks, and per-skill totals are two bincounts.
+    """
+    __slots__ = ("total_questions", "slots_by_question_id", "answer_key", "skill_ids", "pair_slots", "pair_skill_indices")
+
+    def __init__(self, questions: List[dict]):
+        self.total_questions = len(questions)
+        self.slots_by_question_id: Dict[str, int] = {}
+        self.answer_key: List[str] = []
+        self.skill_ids: List[int] = []
+        skill_indices_by_slot: List[Tuple[int, ...]] = []
+
+        skill_index_by_id: Dict[int, int] = {}
+        for question in questions:
+            skill_ids = question.get("skill_ids", [])
+            if not isinstance(skill_ids, list):
+                skill_ids = []
+            skill_indices = []
+            for skill_id in skill_ids:
+                if isinstance(skill_id, int):
+                    if skill_id not in skill_index_by_id:
+                        skill_index_by_id[skill_id] = len(self.skill_ids)
+                        self.skill_ids.append(skill_id)
+                    skill_indices.append(skill_index_by_id[skill_id])
+
+            # A repeated question id replaces the earlier question, as the old question_map did
+            question_id = question.get("id")
+            slot = self.slots_by_question_id.get(question_id)
+            if slot is None:
+                slot = len(self.answer_key)
+                self.slots_by_question_id[question_id] = slot
+                self.answer_key.append(None)
+                skill_indices_by_slot.append(())
+            self.answer_key[slot] = str(question.get("correctAnswer"))
+            skill_indices_by_slot[slot] = tuple(skill_indices)
+
+        self.pair_slots = np.array([slot for slot, indices in enumerate(skill_indices_by_slot) for _ in indices], dtype=np.intp)
+        self.pair_skill_indices = np.array([index for indices in skill_indices_by_slot for index in indices], dtype=np.intp)
+
+    def grade(self, answers: List[schemas.UserAnswer]) -> Tuple[int, Dict[int, Tuple[int, int]]]:
+        """Return the number of correct answers and {skill_id: (correct, attempted)}."""
+        answer_slots = []
+        answer_correct = []
+        for user_answer in answers:
+            slot = self.slots_by_question_id.get(str(user_answer.question_id))
+            if slot is None:
+                continue
+            answer_slots.append(slot)
+            answer_correct.append(self.answer_key[slot] == str(user_answer.selected_option_id))
+        correct_answers_count = sum(answer_correct)
+        if not answer_slots or not len(self.pair_slots):
+            return correct_answers_count, {}
+
+        # Answers and correct answers per slot, spread over the (slot, skill) pairs and summed per skill
+        slot_count = len(self.answer_key)
+        slot_attempts = np.bincount(answer_slots, minlength=slot_count)
+        slot_correct = np.bincount(answer_slots, weights=answer_correct, minlength=slot_count)
+        skill_count = len(self.skill_ids)
+        skill_attempts = np.bincount(self.pair_skill_indices, weights=slot_attempts[self.pair_slots], minlength=skill_count)
+        skill_correct = np.bincount(self.pair_skill_indices, weights=slot_correct[self.pair_slots], minlength=skill_count)
+
+        skill_results = {
+            self.skill_ids[i]: (int(skill_correct[i]), int(skill_attempts[i])) for i in np.flatnonzero(skill_attempts)
+        }
+        return correct_answers_count, skill_results
+
+
+def compile_quiz(content: str) -> CompiledQuiz:
+    """Parse quiz lesson content. Raises json.JSONDecodeError on malformed content."""
+    quiz_data = json.loads(content)
+    return CompiledQuiz(quiz_data.get("questions", []))
+
+
+class QuizCache:
+    """Size-bounded LRU of compiled quizzes keyed by (lesson_id, content hash).
+
+    Only the latest content version of a lesson is kept. The content hash makes
+    stale entries miss even if a write bypassed invalidate().
+    """
+
+    def __init__(self, maxsize: int = QUIZ_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._entries: "OrderedDict[int, Tuple[bytes, CompiledQuiz]]" = OrderedDict()
+
+    def get(self, lesson_id: int, content: str) -> CompiledQuiz:
+        content_hash = hashlib.blake2b(content.encode(), digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(lesson_id)
+            if entry is not None and entry[0] == content_hash:
+                self._entries.move_to_end(lesson_id)
+                return entry[1]
+
+        compiled = compile_quiz(content)
+        with self._lock:
+            self._entries[lesson_id] = (content_hash, compiled)
+            self._entries.move_to_end(lesson_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def invalidate(self, lesson_id: int):
+        with self._lock:
+            self._entries.pop(lesson_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+quiz_cache = QuizCache()
@@ -0,0 +1,220 @@
+"""Per-route request instrumentation.
+
+RequestMetricsMiddleware times every request and records, under its route
+template (e.g. /courses/{course_id}): wall time, SQL statement count and
+SQL time (from the database query counter), serialization time and
+response size. Each response carries them in a Server-Timing header, and
+request_metrics renders the totals in the Prometheus text format for
+/metrics. Requests running more than N_PLUS_ONE_QUERY_THRESHOLD statements
+are logged as likely N+1 queries.
+
+Serialization time is measured by InstrumentedRoute, which notes when the
+endpoint returns: the time from then until the response starts is spent
+validating and encoding the return value.
+"""
+import functools
+import inspect
+import logging
+import os
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+from database import count_queries
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_QUERY_THRESHOLD = int(os.getenv("N_PLUS_ONE_QUERY_THRESHOLD", "25")) # SQL statements per request before warning
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds
+UNMATCHED_ROUTE = "<unmatched>" # Label for 404s, so unknown paths cannot grow the label set
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.response_bytes = 0
+        self.n_plus_one_warnings = 0
+        self.duration_buckets = [0] * len(REQUEST_DURATION_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+
+class RequestMetrics:
+    """Thread-safe per-route totals, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._routes: Dict[Tuple[str, str], RouteStats] = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float, queries: int, query_seconds: float,
+               serialization_seconds: float, response_bytes: int, n_plus_one: bool = False):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats()
+            stats.requests += 1
+            stats.seconds += seconds
+            stats.queries += queries
+            stats.query_seconds += query_seconds
+            stats.serialization_seconds += serialization_seconds
+            stats.response_bytes += response_bytes
+            stats.n_plus_one_warnings += n_plus_one
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            for index, bound in enumerate(REQUEST_DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats.duration_buckets[index] += 1
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                "# HELP http_requests_total Requests handled, by route template and status code.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'http_requests_total{{{_labels(method, route)},status="{status}"}} {count}')
+
+            lines += [
+                "# HELP http_request_duration_seconds Wall time from request start to response start.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), stats in routes:
+                labels = _labels(method, route)
+                for bound, count in zip(REQUEST_DURATION_BUCKETS, stats.duration_buckets):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.requests}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.seconds:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.requests}")
+
+            for name, description, attribute in (
+                ("http_request_sql_queries_total", "SQL statements executed.", "queries"),
+                ("http_request_sql_seconds_total", "Time spent executing SQL statements.", "query_seconds"),
+                ("http_request_serialization_seconds_total", "Time from endpoint return to response start.", "serialization_seconds"),
+                ("http_response_bytes_total", "Response body bytes sent.", "response_bytes"),
+                ("http_request_n_plus_one_warnings_total", f"Requests that ran more than {N_PLUS_ONE_QUERY_THRESHOLD} SQL statements.", "n_plus_one_warnings"),
+            ):
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+                for (method, route), stats in routes:
+                    value = getattr(stats, attribute)
+                    lines.append(f"{name}{{{_labels(method, route)}}} {value:.6f}" if isinstance(value, float) else f"{name}{{{_labels(method, route)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(method: str, route: str) -> str:
+    route = route.replace("\\", "\\\\").replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+request_metrics = RequestMetrics()
+
+
+# Endpoint timing
+# The active request's timing lives in a ContextVar; the object itself is
+# shared, so sync endpoints running in the threadpool can still update it.
+class RequestTiming:
+    def __init__(self):
+        self.endpoint_returned_at: Optional[float] = None
+
+_current_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("current_request_timing", default=None)
+
+def _note_endpoint_return():
+    timing = _current_request_timing.get()
+    if timing is not None:
+        timing.endpoint_returned_at = time.perf_counter()
+
+def _timed_endpoint(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _note_endpoint_return()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _note_endpoint_return()
+    return timed
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that records when its endpoint returns, to separate serialization time."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request_metrics and adding X-Query-Count and Server-Timing headers."""
+
+    def __init__(self, app, metrics: RequestMetrics = request_metrics, n_plus_one_threshold: int = N_PLUS_ONE_QUERY_THRESHOLD):
+        self.app = app
+        self.metrics = metrics
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        timing = RequestTiming()
+        timing_token = _current_request_timing.set(timing)
+        response = {"status": 500, "started_at": None, "bytes": 0}
+
+        with count_queries() as counter:
+            async def send_with_metrics(message):
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    response["started_at"] = now = time.perf_counter()
+                    serialization = now - timing.endpoint_returned_at if timing.endpoint_returned_at is not None else 0.0
+                    server_timing = (
+                        f'app;dur={(now - started_at) * 1000:.1f}, '
+                        f'db;dur={counter.seconds * 1000:.1f};desc="{counter.count} queries", '
+                        f"serialize;dur={serialization * 1000:.1f}"
+                    )
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(counter.count).encode()),
+                        (b"server-timing", server_timing.encode()),
+                    ]
+                elif message["type"] == "http.response.body":
+                    response["bytes"] += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            finally:
+                _current_request_timing.reset(timing_token)
+                self._record(scope, started_at, timing, response, counter)
+
+    def _record(self, scope, started_at, timing, response, counter):
+        route = scope.get("route")
+        route_path = route.path if isinstance(route, APIRoute) else UNMATCHED_ROUTE
+        # Streamed responses keep running queries after the response starts; count those too
+        response_started_at = response["started_at"] or time.perf_counter()
+        serialization = response_started_at - timing.endpoint_returned_at if timing.endpoint_returned_at is not None else 0.0
+        n_plus_one = counter.count > self.n_plus_one_threshold
+        if n_plus_one:
+            logger.warning(
+                "Possible N+1 queries: %s %s ran %d SQL statements (threshold %d)",
+                scope["method"], route_path, counter.count, self.n_plus_one_threshold,
+            )
+        self.metrics.record(
+            scope["method"], route_path, response["status"],
+            seconds=response_started_at - started_at, queries=counter.count, query_seconds=counter.seconds,
+            serialization_seconds=serialization, response_bytes=response["bytes"], n_plus_one=n_plus_one,
+        )
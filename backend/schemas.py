@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict # Ensure Dict is imported
-from datetime import datetime # Added for enrolled_at
+import json
+from pydantic import BaseModel, field_validator
+from typing import Generic, Optional, List, Dict, TypeVar # Ensure Dict is imported
+from datetime import date, datetime # Added for enrolled_at
 
 # Skill Schemas
 class SkillBase(BaseModel):
@@ -36,6 +37,10 @@ class User(UserBase):
 
     model_config = {"from_attributes": True}
 
+class Principal(User):
+    # The authenticated user handed to endpoints; cached between requests
+    token_version: int = 0
+
 class UserUpdateAdmin(BaseModel):
     full_name: Optional[str] = None
     is_active: Optional[bool] = None
@@ -55,12 +60,28 @@ class UserSkillUpdate(BaseModel):
 
 class UserSkill(UserSkillBase):
     id: int
-    last_assessed_at: str # Stored as ISO string
+    mastery_probability: Optional[float] = None # Knowledge-tracing estimate behind proficiency_score
+    last_assessed_at: datetime
     skill: Skill # Nested skill information
     user: UserBase # Nested basic user information
 
     model_config = {"from_attributes": True}
 
+class SkillAssessment(BaseModel):
+    proficiency_score: int
+    lesson_id: Optional[int] = None # The graded quiz, if any
+    correct_answers: Optional[int] = None # The quiz's answers in the skill, if graded
+    attempts: Optional[int] = None
+    assessed_at: datetime
+
+    model_config = {"from_attributes": True}
+
+class SkillTrajectory(BaseModel):
+    user_id: int
+    skill_id: int
+    since: datetime
+    assessments: List[SkillAssessment] # Oldest first
+
 # Module Schemas
 class ModuleBase(BaseModel):
     title: str
@@ -116,7 +137,7 @@ class QuizSubmissionCreate(BaseModel):
 class QuizSubmissionResult(BaseModel):
     lesson_id: int
     overall_score: float # e.g., percentage 0.0 to 100.0
-    score_per_skill: Optional[Dict[int, float]] = None # Mapping skill_id (int) to score for that skill
+    score_per_skill: Optional[Dict[int, float]] = None # Mapping skill_id (int) to the updated proficiency estimate (0-100)
 
 
 # Update Module schema to include lessons
@@ -129,6 +150,25 @@ class Module(ModuleBase): # Re-declare to update
     model_config = {"from_attributes": True}
 
 
+# Summary schemas for catalog listings: the same tree without lesson bodies
+class LessonSummary(BaseModel):
+    id: int
+    module_id: int
+    title: str
+    content_type: Optional[str] = "text"
+    order: Optional[int] = 0
+
+    model_config = {"from_attributes": True}
+
+class ModuleSummary(ModuleBase):
+    id: int
+    course_id: int
+    lessons: List[LessonSummary] = []
+    associated_skills: List[Skill] = []
+
+    model_config = {"from_attributes": True}
+
+
 # Course Schemas
 class CourseBase(BaseModel):
     title: str
@@ -150,6 +190,14 @@ class Course(CourseBase):
 
     model_config = {"from_attributes": True}
 
+class CourseSummary(CourseBase):
+    id: int
+    instructor_id: Optional[int] = None
+    modules: List[ModuleSummary] = []
+    associated_skills: List[Skill] = []
+
+    model_config = {"from_attributes": True}
+
 # Enrollment Schemas
 class EnrollmentBase(BaseModel):
     user_id: int
@@ -158,31 +206,106 @@ class EnrollmentBase(BaseModel):
 class EnrollmentCreate(EnrollmentBase):
     pass
 
-import json # For parsing completed_lessons
+class CourseBrief(BaseModel):
+    # The course fields of an enrollment summary, without the module/lesson tree
+    id: int
+    title: str
+    description: Optional[str] = None
+    instructor_id: Optional[int] = None
+
+    model_config = {"from_attributes": True}
 
-class Enrollment(EnrollmentBase):
+class EnrollmentSummary(EnrollmentBase):
     id: int
-    enrolled_at: datetime 
-    user: User 
-    course: Course 
+    enrolled_at: datetime
+    user: User
+    course: CourseBrief
     completed_lessons: List[int] # Will be a list of lesson IDs
 
     model_config = {"from_attributes": True}
 
+    @field_validator("completed_lessons", mode="before")
     @classmethod
-    def from_orm(cls, obj: any) -> "Enrollment":
-        # Custom from_orm to parse completed_lessons from JSON string to list
-        data = super().from_orm(obj).dict()
-        if isinstance(obj.completed_lessons, str):
+    def parse_completed_lessons(cls, value):
+        # Legacy rows stored completed_lessons as a JSON string
+        if isinstance(value, str):
             try:
-                data['completed_lessons'] = json.loads(obj.completed_lessons)
+                value = json.loads(value)
             except json.JSONDecodeError:
-                data['completed_lessons'] = [] # Default to empty list on error
-        elif isinstance(obj.completed_lessons, list): # Already a list (e.g. if directly set)
-             data['completed_lessons'] = obj.completed_lessons
-        else:
-            data['completed_lessons'] = []
-        return cls(**data)
+                return [] # Default to empty list on error
+        return value if isinstance(value, list) else []
+
+class Enrollment(EnrollmentSummary):
+    course: Course
+
+# Progress Schemas
+# Read from the denormalized counters, without loading lessons
+class ModuleProgress(BaseModel):
+    module_id: int
+    title: str
+    completed_lessons: int
+    total_lessons: int
+    percent: float
+    last_lesson_id: Optional[int] = None
+    last_activity_at: Optional[datetime] = None
+
+class EnrollmentProgress(BaseModel):
+    enrollment_id: int
+    course_id: int
+    course_title: str
+    completed_lessons: int
+    total_lessons: int
+    percent: float
+    last_lesson_id: Optional[int] = None # Last lesson marked complete or incomplete
+    last_activity_at: Optional[datetime] = None
+    next_lesson_id: Optional[int] = None # First incomplete lesson in course order; None when all are done
+    modules: List[ModuleProgress] = []
+
+# Admin Analytics Schemas
+class CourseAnalytics(BaseModel):
+    course_id: int
+    title: str
+    lesson_count: int
+    enrollments: int
+    completed_enrollments: int # Enrollments with every lesson completed
+    completion_rate: float # Percent of enrollments completed
+    average_progress: float # Percent of lessons completed, averaged over enrollments
+
+class ProficiencyBucket(BaseModel):
+    min_score: int
+    max_score: int
+    users: int
+
+class SkillAnalytics(BaseModel):
+    skill_id: int
+    name: str
+    users: int # Users with a proficiency score for the skill
+    average_proficiency: Optional[float] = None
+    distribution: List[ProficiencyBucket]
+
+class DailyActivity(BaseModel):
+    day: date
+    enrollments: int # New enrollments
+    lesson_completions: int
+    active_learners: int # Learners who completed at least one lesson that day
+
+class CourseActivity(BaseModel):
+    course_id: int
+    since: datetime # Start of the first day, UTC
+    enrollments: int
+    lesson_completions: int
+    active_learners: int # Learners who completed at least one lesson in the window
+    daily: List[DailyActivity] # Oldest first, one entry per day
+
+# Search Schemas
+class SearchResult(BaseModel):
+    type: str # 'course', 'module' or 'lesson'
+    id: int
+    course_id: int
+    module_id: Optional[int] = None # Set for lessons
+    title: str # HTML-escaped, matched words in <mark> tags
+    snippet: str # Excerpt of the description or lesson content, marked the same way
+    score: float # Higher is more relevant
 
 # Update User schema to resolve forward reference if needed, or handle via separate endpoint
 # User.update_forward_refs() # If Enrollment was a forward reference string
@@ -207,3 +330,11 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+
+
+# Pagination Schemas
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None # Pass back as ?cursor= to fetch the next page; None on the last page
@@ -0,0 +1,226 @@
+from array import array
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import catalog_versions
+import models
+
+
+class SkillContentIndex:
+    """In-process inverted index from skill_id to the courses and modules teaching it.
+
+    Postings are stored as compact integer arrays per skill, with one
+    (title, description) summary per indexed course and module. The index is
+    loaded once at startup and then kept current by the crud write paths, so
+    study plans can be answered without touching the association tables.
+
+    The index is per process, and records the version of
+    catalog_versions.SKILL_INDEX_SCOPE it reflects. Only the writes the index
+    reflects increment that counter (skill links, skill deletes, and course
+    and module edits and deletes), so lesson edits never cause a reload. A
+    worker's own write is applied incrementally and advances the recorded
+    version when it was the only change since; refresh() reloads the index
+    when another worker's write moved the counter.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.loaded = False
+        self._course_ids_by_skill: Dict[int, array] = {}
+        self._module_ids_by_skill: Dict[int, array] = {}
+        self._course_summaries: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._module_summaries: Dict[int, Tuple[str, Optional[str]]] = {}
+        self.version = 0 # SKILL_INDEX_SCOPE counter the index reflects
+
+    @staticmethod
+    def _stored_version(db: Session) -> int:
+        scope = catalog_versions.SKILL_INDEX_SCOPE
+        return catalog_versions.get_versions(db, [scope]).get(scope, 0)
+
+    def load(self, db: Session):
+        self._load(db, self._stored_version(db))
+
+    def refresh(self, db: Session) -> bool:
+        """Reload the index if another worker's write moved its version.
+
+        Costs one query when the index is current. Returns whether it reloaded.
+        """
+        version = self._stored_version(db)
+        with self._lock:
+            if self.loaded and version == self.version:
+                return False
+        self._load(db, version, keep_newer=True)
+        return True
+
+    def _advance(self, version: int):
+        # Called under the lock with the version a write of this worker incremented the counter to.
+        # If another write came in between, the old version stays and refresh() reloads.
+        if self.loaded and self.version == version - 1:
+            self.version = version
+
+    def _load(self, db: Session, version: int, keep_newer: bool = False):
+        # version is read before the rows: a write committed in between only causes one more reload
+        course_rows = db.execute(
+            select(
+                models.course_skill_association_table.c.skill_id,
+                models.Course.id,
+                models.Course.title,
+                models.Course.description
+            ).join(models.Course, models.Course.id == models.course_skill_association_table.c.course_id)
+        ).all()
+        module_rows = db.execute(
+            select(
+                models.module_skill_association_table.c.skill_id,
+                models.Module.id,
+                models.Module.title,
+                models.Module.description
+            ).join(models.Module, models.Module.id == models.module_skill_association_table.c.module_id)
+        ).all()
+
+        course_ids_by_skill: Dict[int, array] = {}
+        course_summaries = {}
+        for skill_id, course_id, title, description in course_rows:
+            course_ids_by_skill.setdefault(skill_id, array("i")).append(course_id)
+            course_summaries[course_id] = (title, description)
+
+        module_ids_by_skill: Dict[int, array] = {}
+        module_summaries = {}
+        for skill_id, module_id, title, description in module_rows:
+            module_ids_by_skill.setdefault(skill_id, array("i")).append(module_id)
+            module_summaries[module_id] = (title, description)
+
+        with self._lock:
+            if keep_newer and self.loaded and self.version > version:
+                return # Another thread installed a newer state while these rows were read
+            self._course_ids_by_skill = course_ids_by_skill
+            self._module_ids_by_skill = module_ids_by_skill
+            self._course_summaries = course_summaries
+            self._module_summaries = module_summaries
+            self.version = version
+            self.loaded = True
+
+    # Incremental maintenance, called by crud after a successful commit with
+    # the SKILL_INDEX_SCOPE version its write incremented the counter to
+    def add_course_skill(self, skill_id: int, course_id: int, title: str, description: Optional[str], version: int):
+        with self._lock:
+            self._advance(version)
+            postings = self._course_ids_by_skill.setdefault(skill_id, array("i"))
+            if course_id not in postings:
+                postings.append(course_id)
+            self._course_summaries[course_id] = (title, description)
+
+    def remove_course_skill(self, skill_id: int, course_id: int, version: int):
+        with self._lock:
+            self._advance(version)
+            postings = self._course_ids_by_skill.get(skill_id)
+            if postings is not None and course_id in postings:
+                postings.remove(course_id)
+
+    def add_module_skill(self, skill_id: int, module_id: int, title: str, description: Optional[str], version: int):
+        with self._lock:
+            self._advance(version)
+            postings = self._module_ids_by_skill.setdefault(skill_id, array("i"))
+            if module_id not in postings:
+                postings.append(module_id)
+            self._module_summaries[module_id] = (title, description)
+
+    def remove_module_skill(self, skill_id: int, module_id: int, version: int):
+        with self._lock:
+            self._advance(version)
+            postings = self._module_ids_by_skill.get(skill_id)
+            if postings is not None and module_id in postings:
+                postings.remove(module_id)
+
+    def update_course(self, course_id: int, title: str, description: Optional[str], version: int):
+        with self._lock:
+            self._advance(version)
+            if course_id in self._course_summaries:
+                self._course_summaries[course_id] = (title, description)
+
+    def update_module(self, module_id: int, title: str, description: Optional[str], version: int):
+        with self._lock:
+            self._advance(version)
+            if module_id in self._module_summaries:
+                self._module_summaries[module_id] = (title, description)
+
+    def remove_course(self, course_id: int, module_ids: List[int], version: int):
+        with self._lock:
+            self._advance(version)
+            self._remove_from_postings(self._course_ids_by_skill, {course_id})
+            self._course_summaries.pop(course_id, None)
+            self._remove_from_postings(self._module_ids_by_skill, set(module_ids))
+            for module_id in module_ids:
+                self._module_summaries.pop(module_id, None)
+
+    def remove_module(self, module_id: int, version: int):
+        with self._lock:
+            self._advance(version)
+            self._remove_from_postings(self._module_ids_by_skill, {module_id})
+            self._module_summaries.pop(module_id, None)
+
+    def remove_skill(self, skill_id: int, version: int):
+        with self._lock:
+            self._advance(version)
+            self._course_ids_by_skill.pop(skill_id, None)
+            self._module_ids_by_skill.pop(skill_id, None)
+
+    @staticmethod
+    def _remove_from_postings(postings_by_skill: Dict[int, array], ids: set):
+        if not ids:
+            return
+        for skill_id, postings in postings_by_skill.items():
+            if any(content_id in ids for content_id in postings):
+                postings_by_skill[skill_id] = array("i", (content_id for content_id in postings if content_id not in ids))
+
+    # Queries
+    def recommend(self, skill_gaps: Dict[int, int], limit: int = 100) -> List[Tuple[str, int, str, Optional[str]]]:
+        """Rank the courses and modules covering the given {skill_id: gap} weak skills.
+
+        Items covering more weak skills come first, then those with the larger
+        total gap below the threshold. Returns (type, id, title, description) tuples.
+        """
+        scores: Dict[Tuple[str, int], List[int]] = {}
+        with self._lock:
+            for skill_id, gap in skill_gaps.items():
+                for content_type, postings_by_skill in (("course", self._course_ids_by_skill), ("module", self._module_ids_by_skill)):
+                    for content_id in postings_by_skill.get(skill_id, ()):
+                        score = scores.setdefault((content_type, content_id), [0, 0])
+                        score[0] += 1
+                        score[1] += gap
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1][0], -item[1][1], item[0][0], item[0][1]))[:limit]
+            results = []
+            for (content_type, content_id), _ in ranked:
+                summaries = self._course_summaries if content_type == "course" else self._module_summaries
+                title, description = summaries[content_id]
+                results.append((content_type, content_id, title, description))
+        return results
+
+    def check_consistency(self, db: Session) -> Dict[str, list]:
+        """Compare the index against the association tables and content rows.
+
+        Returns the differences found; every list is empty when the index is consistent.
+        """
+        expected = SkillContentIndex()
+        expected.load(db)
+        with self._lock:
+            report = {}
+            for content_type, actual_postings, expected_postings, actual_summaries, expected_summaries in (
+                ("course", self._course_ids_by_skill, expected._course_ids_by_skill, self._course_summaries, expected._course_summaries),
+                ("module", self._module_ids_by_skill, expected._module_ids_by_skill, self._module_summaries, expected._module_summaries),
+            ):
+                actual_links = {(skill_id, content_id) for skill_id, postings in actual_postings.items() for content_id in postings}
+                expected_links = {(skill_id, content_id) for skill_id, postings in expected_postings.items() for content_id in postings}
+                report[f"missing_{content_type}_links"] = sorted(expected_links - actual_links)
+                report[f"extra_{content_type}_links"] = sorted(actual_links - expected_links)
+                report[f"stale_{content_type}_summaries"] = sorted(
+                    content_id for content_id, summary in expected_summaries.items()
+                    if actual_summaries.get(content_id) != summary
+                )
+        return report
+
+
+skill_index = SkillContentIndex()
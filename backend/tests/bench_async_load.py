@@ -0,0 +1,165 @@
+"""p50/p99 latency of a mixed read load on one uvicorn worker.
+
+Each client sends --requests requests cycling through /users/me/, the study
+plan, /courses/ and the user's enrollments. Every client count runs twice:
+once with the async handlers on AsyncSession, and once with the same
+handlers given a BlockingSession, which runs their statements with a sync
+Session on the event loop thread, as the handlers did before they were
+moved to AsyncSession.
+
+Measured, SQLite file, 10 requests per client:
+- 8 clients: p99 130 ms async, 118 ms blocking
+- 16 clients: p99 241 ms async, 240 ms blocking
+- 32 clients: p99 513 ms async, none timed out. Blocking: 113 of 320
+  requests passed the 60 s client timeout, and the p99 of the rest was 30 s.
+  With more requests in flight than the sync pool's 15 connections, the loop
+  blocks on a checkout while finished threadpool handlers wait for the same
+  loop to release theirs, until the 30 s pool timeout.
+Up to 16 clients, the async path brings no gain.
+
+Usage: python tests/bench_async_load.py [--clients 8 16 32] [--requests 10] [--session async blocking]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import bench_common
+from bench_common import heading, ms, percentile, report
+
+import httpx
+import uvicorn
+
+import database
+import main
+
+from helpers import ADMIN_CREDENTIALS
+
+SESSIONS = ("async", "blocking")
+
+PATHS = ("/users/me/", "/users/me/study-plan", "/courses/", "/users/me/enrollments/")
+CLIENT_TIMEOUT_SECONDS = 60
+STARTUP_TIMEOUT_SECONDS = 30
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class BlockingSession:
+    """The AsyncSession methods the async handlers use, run synchronously with a sync Session.
+
+    Each statement blocks the event loop for its full duration.
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    async def execute(self, statement, *args, **kwargs):
+        return self._db.execute(statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return self._db.get(entity, ident, **kwargs)
+
+    async def commit(self):
+        self._db.commit()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self._db, *args, **kwargs)
+
+async def get_blocking_db():
+    db = database.SessionLocal()
+    try:
+        yield BlockingSession(db)
+    finally:
+        db.close()
+
+def serve(port: int, session: str):
+    """Run the app under uvicorn, with one worker, in this process."""
+    if session == "blocking":
+        main.app.dependency_overrides[database.get_async_db] = get_blocking_db
+    uvicorn.run(main.app, host="127.0.0.1", port=port, workers=1, log_level="critical") # Pool timeouts are counted by the clients
+
+def start_server(port: int, session: str) -> subprocess.Popen:
+    """A server process on a fresh benchmark database; returns once it answers."""
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port), "--session", session])
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/").raise_for_status()
+            return server
+        except httpx.TransportError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.terminate()
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.2)
+
+def sign_in(base_url: str) -> dict:
+    """Seed the sample catalog, sign in as its admin and enroll in the first course."""
+    with httpx.Client(base_url=base_url) as client:
+        client.post("/seed_data/").raise_for_status()
+        response = client.post("/token", data={"username": ADMIN_CREDENTIALS[0], "password": ADMIN_CREDENTIALS[1]})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        user_id = client.get("/users/me/", headers=headers).json()["id"]
+        client.post("/enrollments/", json={"user_id": user_id, "course_id": 1}, headers=headers).raise_for_status()
+    return headers
+
+async def run_client(base_url: str, headers: dict, requests: int, latencies: list, offset: int) -> tuple:
+    """Send requests requests, recording each latency; returns the numbers that timed out and failed."""
+    timeouts = failures = 0
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=CLIENT_TIMEOUT_SECONDS) as client:
+        for n in range(requests):
+            started_at = time.perf_counter()
+            try:
+                response = await client.get(PATHS[(offset + n) % len(PATHS)])
+            except httpx.TimeoutException:
+                timeouts += 1
+                continue
+            except httpx.TransportError: # Connection dropped by the server
+                failures += 1
+                continue
+            if response.is_error:
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - started_at)
+    return timeouts, failures
+
+async def run_load(base_url: str, headers: dict, clients: int, requests: int):
+    latencies = []
+    outcomes = await asyncio.gather(*(run_client(base_url, headers, requests, latencies, offset) for offset in range(clients)))
+    return latencies, sum(timeouts for timeouts, _ in outcomes), sum(failures for _, failures in outcomes)
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--session", choices=SESSIONS, nargs="+", default=list(SESSIONS))
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS) # Set for the server process
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.session[0])
+        return
+
+    heading(f"uvicorn, one worker, {args.requests} requests per client over {', '.join(PATHS)}")
+    for session in args.session:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(port, session)
+        try:
+            headers = sign_in(base_url)
+            for clients in args.clients:
+                latencies, timeouts, failures = asyncio.run(run_load(base_url, headers, clients, args.requests))
+                figures = [f"p50 {ms(percentile(latencies, 50))}", f"p99 {ms(percentile(latencies, 99))}"] if latencies else []
+                report(f"{session} sessions, {clients} clients", *figures, f"{timeouts} timed out", f"{failures} failed")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,86 @@
+"""Full against summary catalog listings: response size and time.
+
+Lists /courses/ with and without summary=true through TestClient, with the
+course cache cleared before each request, on the seed catalog repeated
+--scale times, first with the seed lesson bodies and then with 4 KB ones.
+Quoted, x1000 (3000 courses, 4000 lessons):
+
+  seed bodies (avg 43 B)       full               summary
+  /courses/?limit=100          53.9 KB  18.3 ms   46.3 KB  20.2 ms
+  /courses/?limit=1000         542 KB  163 ms     467 KB  161 ms
+  4 KB lesson bodies
+  /courses/?limit=100          578 KB  18.7 ms    46.3 KB  19.5 ms
+  /courses/?limit=1000         5.87 MB 184 ms     467 KB  156 ms
+
+Usage: python tests/bench_catalog_summary.py [--scale 1000] [--repeat 10]
+"""
+import argparse
+import io
+import json
+
+import bench_common
+from bench_common import heading, median, ms, report, size
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+import catalog_transfer
+import main
+import models
+from course_cache import course_cache
+from database import SessionLocal, engine
+
+LIMITS = (100, 1000)
+LARGE_LESSON_BYTES = 4000
+ID_FIELDS = ("id", "course_id", "module_id")
+
+
+def scaled_seed_catalog(scale: int) -> bytes:
+    """The /seed_data/ catalog, exported and repeated scale times."""
+    with SessionLocal() as db:
+        records = [json.loads(line) for line in catalog_transfer.export_catalog(db)]
+    stride = 1 + max(record["id"] for record in records)
+    lines = []
+    for copy in range(1, scale):
+        for record in records:
+            lines.append(json.dumps({**record, **{field: record[field] + copy * stride for field in ID_FIELDS if field in record}}))
+    return ("\n".join(lines) + "\n").encode()
+
+def measure(client: TestClient, repeat: int):
+    for limit in LIMITS:
+        figures = []
+        for summary in (False, True):
+            url = f"/courses/?limit={limit}" + ("&summary=true" if summary else "")
+            responses = []
+
+            def request():
+                course_cache.clear() # Uncached: every course is loaded and serialized
+                responses.append(client.get(url))
+
+            samples = bench_common.timed(request, repeat)
+            assert responses[-1].status_code == 200, responses[-1].text
+            figures.append(f"{'summary' if summary else 'full'} {size(len(responses[-1].content))} {ms(median(samples))}")
+        report(f"/courses/?limit={limit}", *figures)
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        assert client.post("/seed_data/").status_code == 201
+        with SessionLocal() as db:
+            catalog_transfer.import_catalog(db, io.BytesIO(scaled_seed_catalog(args.scale)))
+
+        heading(f"Seed catalog x{args.scale}, seed lesson bodies, uncached, median of {args.repeat}")
+        measure(client, args.repeat)
+
+        with engine.begin() as conn:
+            conn.execute(update(models.Lesson).values(content="x" * LARGE_LESSON_BYTES))
+        heading(f"Seed catalog x{args.scale}, {size(LARGE_LESSON_BYTES)} lesson bodies, uncached, median of {args.repeat}")
+        measure(client, args.repeat)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,101 @@
+"""Shared setup for the benchmark scripts, tests/bench_*.py.
+
+The benchmarks reproduce the figures quoted in the commits that introduced
+each optimization. They are plain scripts, not collected by pytest; run them
+from backend/:
+
+    python tests/bench_principal_cache.py
+
+Importing this module points DATABASE_URL at a fresh SQLite file in a
+temporary directory (removed at exit) before any app module is imported, so
+a benchmark never touches sql_app.db. Absolute timings depend on the
+machine; the ratios, sizes and statement counts are what the commits compare.
+
+Where the "before" code no longer exists, a script can run itself against an
+earlier commit with run_in_tree. The app modules then come from that commit,
+checked out in a temporary git worktree, and the script and this module from
+the current tree.
+"""
+import atexit
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from typing import Callable, List
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.environ.get("BENCH_BACKEND_DIR") or os.path.dirname(TESTS_DIR) # Set by run_in_tree
+sys.path[:0] = [BACKEND_DIR, TESTS_DIR]
+
+WORK_DIR = tempfile.mkdtemp(prefix="cognitivelabs-bench-")
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+DATABASE_PATH = os.path.join(WORK_DIR, "bench.db")
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+
+# Read by the app modules at import
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.setdefault("BCRYPT_ROUNDS", "4") # Hashing cost is not what these benchmarks measure
+os.environ.setdefault("ANALYTICS_RECONCILE_INTERVAL", "0")
+
+# The same filter as pytest.ini, and no N+1 warnings from the bulk setup requests
+warnings.filterwarnings("ignore", message="Using `httpx` with `starlette.testclient` is deprecated")
+logging.getLogger("request_metrics").setLevel(logging.ERROR)
+
+
+def run_in_tree(revision: str, script: str, argv: List[str]):
+    """Run script with argv against the backend of a git revision.
+
+    The revision is checked out in a temporary worktree, removed afterwards.
+    The script runs in an empty directory, since trees that predate
+    DATABASE_URL keep their SQLite file in the working directory.
+    """
+    tree = os.path.join(WORK_DIR, "tree")
+    subprocess.run(["git", "-C", TESTS_DIR, "worktree", "add", "--quiet", "--detach", tree, revision], check=True)
+    try:
+        run_dir = tempfile.mkdtemp(dir=WORK_DIR)
+        env = {**os.environ, "BENCH_BACKEND_DIR": os.path.join(tree, "backend")}
+        subprocess.run([sys.executable, os.path.abspath(script), *argv], cwd=run_dir, env=env, check=True)
+    finally:
+        subprocess.run(["git", "-C", TESTS_DIR, "worktree", "remove", "--force", tree], check=True)
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    """Call fn repeat times; return the duration of each call in seconds."""
+    samples = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started_at)
+    return samples
+
+def percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))]
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:.2f} ms"
+
+def us(seconds: float) -> str:
+    return f"{seconds * 1_000_000:.0f} us"
+
+def size(byte_count: int) -> str:
+    for unit, scale in (("MB", 1000 ** 2), ("KB", 1000)):
+        if byte_count >= scale:
+            return f"{byte_count / scale:.1f} {unit}"
+    return f"{byte_count} B"
+
+def mean(samples: List[float]) -> float:
+    return statistics.fmean(samples)
+
+def median(samples: List[float]) -> float:
+    return statistics.median(samples)
+
+def report(label: str, *figures: str):
+    print(f"  {label:<44} " + "  ".join(figures), flush=True)
+
+def heading(title: str):
+    print(f"\n{title}", flush=True)
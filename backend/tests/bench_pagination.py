@@ -0,0 +1,64 @@
+"""OFFSET against keyset pages of the enrollment list, by depth.
+
+Times 100-row pages of --enrollments enrollments in SQLite at the crud level,
+at increasing depths, with skip and with a cursor at the same row.
+Quoted, 300k enrollments: offset 1.2 ms at depth 0, 2.5 ms at 100k and
+5.4 ms at 290k; keyset 0.9 to 1.2 ms at every depth.
+
+Usage: python tests/bench_pagination.py [--enrollments 300000] [--repeat 50]
+"""
+import argparse
+from datetime import datetime
+
+import bench_common
+from bench_common import heading, median, ms, report
+
+from sqlalchemy import insert, select
+
+import crud
+import migrations
+import models
+from database import SessionLocal, engine
+from pagination import encode_cursor
+
+COURSES = 100
+PAGE_SIZE = 100
+INSERT_BATCH_SIZE = 10000
+
+
+def create_enrollments(enrollment_count: int):
+    """enrollment_count enrollments: every user in each of COURSES courses."""
+    user_count = -(-enrollment_count // COURSES)
+    enrolled_at = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": n, "email": f"learner{n}@example.com", "hashed_password": "x"} for n in range(1, user_count + 1)])
+        conn.execute(insert(models.Course), [{"id": n, "title": f"Course {n}"} for n in range(1, COURSES + 1)])
+        rows = [
+            {"user_id": 1 + n // COURSES, "course_id": 1 + n % COURSES, "enrolled_at": enrolled_at}
+            for n in range(enrollment_count)
+        ]
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            conn.execute(insert(models.Enrollment), rows[start:start + INSERT_BATCH_SIZE])
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--enrollments", type=int, default=300_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    create_enrollments(args.enrollments)
+    depths = sorted({0, args.enrollments // 3, args.enrollments - args.enrollments // 30}) # 0, 100k and 290k of 300k
+
+    heading(f"{args.enrollments} enrollments, {PAGE_SIZE}-row pages, median of {args.repeat}")
+    with SessionLocal() as db:
+        ids = db.scalars(select(models.Enrollment.id).order_by(models.Enrollment.id)).all()
+        for depth in depths:
+            cursor = encode_cursor([ids[depth - 1]]) if depth else ""
+            offset = bench_common.timed(lambda: (crud.get_all_enrollments(db, skip=depth, limit=PAGE_SIZE), db.expunge_all()), args.repeat)
+            keyset = bench_common.timed(lambda: (crud.get_all_enrollments_page(db, cursor=cursor, limit=PAGE_SIZE), db.expunge_all()), args.repeat)
+            report(f"depth {depth}", f"offset {ms(median(offset))}", f"keyset {ms(median(keyset))}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,54 @@
+"""GET /users/me/ with and without the principal cache.
+
+Sends --requests sequential requests through TestClient, first with the
+cache disabled (maxsize 0, so every request loads the user by primary key),
+then enabled. Quoted: 285 req/s and 1 auth query per request disabled,
+379 req/s and 0 queries enabled.
+
+Usage: python tests/bench_principal_cache.py [--requests 500]
+"""
+import argparse
+
+import bench_common
+from bench_common import heading, mean, report
+
+from fastapi.testclient import TestClient
+
+import main
+from helpers import ADMIN_CREDENTIALS, login, query_count
+from principal_cache import principal_cache
+
+
+def run(client: TestClient, headers: dict, requests: int):
+    client.get("/users/me/", headers=headers) # Warm the cache, when enabled
+    counts = []
+
+    def request():
+        response = client.get("/users/me/", headers=headers)
+        counts.append(query_count(response))
+
+    samples = bench_common.timed(request, requests)
+    return len(samples) / sum(samples), mean(counts)
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        assert client.post("/seed_data/").status_code == 201
+        headers = login(client, *ADMIN_CREDENTIALS)
+
+        heading(f"GET /users/me/, {args.requests} sequential requests")
+        cache_size = principal_cache.maxsize
+        principal_cache.clear()
+        principal_cache.maxsize = 0
+        rate, queries = run(client, headers, args.requests)
+        report("principal cache disabled", f"{rate:.0f} req/s", f"{queries:.1f} queries/request")
+        principal_cache.maxsize = cache_size
+        rate, queries = run(client, headers, args.requests)
+        report("principal cache enabled", f"{rate:.0f} req/s", f"{queries:.1f} queries/request")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,73 @@
+"""Quiz submission: mean latency and SQL statements per request.
+
+Submits a quiz whose questions cover --skills skills --submissions times
+through TestClient on a SQLite file. It runs first against the tree before
+skill proficiencies were written in one bulk upsert (--before; one upsert and
+commit per skill), then against this tree.
+
+Measured, 200 submissions of a 10-skill quiz: 8.9 ms mean and 31 statements
+per request before, 3.6 ms and 4 statements in this tree. This tree also
+runs knowledge tracing and records the assessment history and analytics
+rollups on the same write, one statement more than the bulk upsert alone.
+
+Usage: python tests/bench_quiz_submission.py [--submissions 200] [--skills 10] [--before REV]
+"""
+import argparse
+import json
+
+import bench_common
+from bench_common import heading, mean, ms, report
+
+from fastapi.testclient import TestClient
+
+import main
+from helpers import ADMIN_CREDENTIALS, login, query_count
+
+BEFORE = "cf38980^" # Writes each skill's score with its own upsert and commit
+
+
+def create_quiz(client: TestClient, headers: dict, skill_count: int):
+    """A quiz lesson with one question per new skill; returns (lesson id, answers)."""
+    skill_ids = []
+    for n in range(skill_count):
+        response = client.post("/admin/skills/", json={"name": f"Benchmark skill {n}"}, headers=headers)
+        assert response.status_code == 201, response.text
+        skill_ids.append(response.json()["id"])
+    questions = [{"id": f"q{n}", "correctAnswer": "a", "skill_ids": [skill_id]} for n, skill_id in enumerate(skill_ids)]
+    lesson = {"title": "Benchmark quiz", "content": json.dumps({"questions": questions}), "content_type": "quiz", "order": 9}
+    response = client.post("/modules/1/lessons/", json=lesson, headers=headers)
+    assert response.status_code == 201, response.text
+    answers = [{"question_id": question["id"], "selected_option_id": "a" if n % 2 else "b"} for n, question in enumerate(questions)]
+    return response.json()["id"], answers
+
+def measure(submissions: int, skill_count: int):
+    with TestClient(main.app) as client:
+        assert client.post("/seed_data/").status_code == 201
+        headers = login(client, *ADMIN_CREDENTIALS)
+        lesson_id, answers = create_quiz(client, headers, skill_count)
+        counts = []
+
+        def submit():
+            response = client.post(f"/lessons/{lesson_id}/submit_quiz", json={"answers": answers}, headers=headers)
+            assert response.status_code == 200, response.text
+            counts.append(query_count(response))
+
+        samples = bench_common.timed(submit, submissions)
+        report(f"{skill_count} skills, {submissions} submissions", f"{ms(mean(samples))} mean", f"{mean(counts):.0f} statements/request")
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--skills", type=int, default=10)
+    parser.add_argument("--before", default=BEFORE, help="git revision to compare with; empty to skip")
+    args = parser.parse_args()
+
+    if args.before:
+        heading(f"POST /lessons/{{id}}/submit_quiz at {args.before}")
+        bench_common.run_in_tree(args.before, __file__, ["--submissions", str(args.submissions), "--skills", str(args.skills), "--before", ""])
+        heading("POST /lessons/{id}/submit_quiz in this tree")
+    measure(args.submissions, args.skills)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,135 @@
+"""Content search: full-text queries against a LIKE scan, and what the index costs.
+
+Measured, SQLite, 1k courses / 10k modules / 100k lessons of 150 words:
+- Query p50: 0.1-0.6 ms for selective terms, 1.5 ms for "python" and 2.6 ms
+  for the prefix "transf"
+- A LIKE scan of the lessons alone takes 90-250 ms for the same queries
+- A term found in every document costs ~115 ms
+- Full rebuild: 9 s. The catalog import goes from 4.2 s to 10.6 s with
+  indexing.
+- Database grows from 164 MB to 384 MB
+
+The corpus is synthetic: words drawn from a Zipf distribution over a fixed
+vocabulary, seeded so every run searches the same text. The unindexed import
+runs into a second database with content_search.index switched off.
+
+Usage: python tests/bench_search.py [--courses 1000] [--repeat 20]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+from unittest import mock
+
+import bench_common
+from bench_common import heading, median, ms, report, size
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.orm import Session
+
+import catalog_transfer
+import content_search
+import database
+import migrations
+import models
+
+MODULES_PER_COURSE = 10
+LESSONS_PER_MODULE = 10
+LESSON_WORDS = 150
+EVERY_DOCUMENT_TERM = "learn" # In every title, description and body
+# Placed at fixed ranks of the Zipf vocabulary, from common to rare
+RANKED_TERMS = {500: "python", 1500: "transformer", 2500: "transfer", 4000: "transformation", 8000: "gradient", 12000: "bayesian", 18000: "kernel"}
+VOCABULARY_SIZE = 20000
+QUERIES = ("kernel", "bayesian", "gradient", "python", "transf", EVERY_DOCUMENT_TERM)
+
+
+def vocabulary():
+    rng = random.Random(0)
+    syllables = ["ka", "lo", "mi", "ne", "su", "ta", "ri", "po", "ve", "da", "zu", "fe", "gi", "ho", "ju", "ba", "co", "ly", "qu", "we"]
+    words, seen = [], set(RANKED_TERMS.values()) | {EVERY_DOCUMENT_TERM}
+    while len(words) < VOCABULARY_SIZE:
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    for rank, term in sorted(RANKED_TERMS.items()):
+        words.insert(rank, term)
+    return words[:VOCABULARY_SIZE]
+
+def corpus(course_count: int) -> bytes:
+    """An NDJSON catalog of course_count courses, with MODULES_PER_COURSE modules of LESSONS_PER_MODULE lessons each."""
+    rng = random.Random(1)
+    words = vocabulary()
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+
+    def phrase(length: int) -> str:
+        return " ".join([EVERY_DOCUMENT_TERM] + rng.choices(words, cum_weights=cum_weights, k=length - 1))
+
+    lines = []
+    module_id = lesson_id = 0
+    for course_id in range(1, course_count + 1):
+        lines.append({"type": "course", "id": course_id, "title": phrase(4), "description": phrase(20)})
+        for module_order in range(MODULES_PER_COURSE):
+            module_id += 1
+            lines.append({"type": "module", "id": module_id, "course_id": course_id, "title": phrase(4), "description": phrase(15), "order": module_order})
+            for lesson_order in range(LESSONS_PER_MODULE):
+                lesson_id += 1
+                lines.append({"type": "lesson", "id": lesson_id, "module_id": module_id, "title": phrase(5), "content": phrase(LESSON_WORDS), "order": lesson_order})
+    return "".join(json.dumps(line) + "\n" for line in lines).encode()
+
+def import_into(database_path: str, content: bytes) -> tuple:
+    """Migrate a new database, import content into it; returns (engine, import seconds, file size)."""
+    engine = database.build_engine(f"sqlite:///{database_path}")
+    migrations.upgrade(engine)
+    with Session(engine) as db:
+        started_at = time.perf_counter()
+        catalog_transfer.import_catalog(db, io.BytesIO(content))
+        seconds = time.perf_counter() - started_at
+    return engine, seconds, file_size(engine, database_path)
+
+def file_size(engine, database_path: str) -> int:
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return os.path.getsize(database_path)
+
+def like_scan(db: Session, term: str):
+    pattern = f"%{term}%"
+    return db.scalars(select(models.Lesson.id).where(or_(models.Lesson.title.like(pattern), models.Lesson.content.like(pattern)))).all()
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--courses", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    content = corpus(args.courses)
+    modules = args.courses * MODULES_PER_COURSE
+    heading(f"{args.courses} courses, {modules} modules, {modules * LESSONS_PER_MODULE} lessons of {LESSON_WORDS} words")
+    with mock.patch.object(content_search, "index", lambda *_args, **_kwargs: None):
+        plain_engine, plain_seconds, plain_size = import_into(os.path.join(bench_common.WORK_DIR, "unindexed.db"), content)
+    plain_engine.dispose()
+    engine, indexed_seconds, indexed_size = import_into(bench_common.DATABASE_PATH, content)
+    report("catalog import", f"unindexed {plain_seconds:.1f} s", f"indexed {indexed_seconds:.1f} s")
+    report("database size", f"unindexed {size(plain_size)}", f"indexed {size(indexed_size)}")
+
+    with Session(engine) as db:
+        started_at = time.perf_counter()
+        content_search.rebuild(db)
+        report("full rebuild", f"{time.perf_counter() - started_at:.1f} s")
+
+        heading(f"Query p50: search over {args.repeat} runs, LIKE scan of the lessons over {max(1, args.repeat // 4)}")
+        for query in QUERIES:
+            search = median(bench_common.timed(lambda: content_search.search(db, query), args.repeat))
+            like = median(bench_common.timed(lambda: like_scan(db, query), max(1, args.repeat // 4)))
+            report(f'"{query}"', f"search {ms(search)}", f"LIKE {ms(like)}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,14 @@
+"""Helpers shared by the tests."""
+from fastapi.testclient import TestClient
+
+ADMIN_CREDENTIALS = ("admin@example.com", "adminpassword") # Created by /seed_data/
+
+
+def query_count(response) -> int:
+    """SQL statements run by the request, from its X-Query-Count header."""
+    return int(response.headers["X-Query-Count"])
+
+def login(client: TestClient, email: str, password: str) -> dict:
+    response = client.post("/token", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
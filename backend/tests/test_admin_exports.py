@@ -0,0 +1,20 @@
+"""Admin CSV and NDJSON exports."""
+import json
+
+import models
+from database import SessionLocal
+
+
+def test_enrollment_export_counts_the_course_lessons_only(client, admin_headers):
+    user_id = client.get("/users/me/", headers=admin_headers).json()["id"]
+    enrollment_id = client.post("/enrollments/", json={"user_id": user_id, "course_id": 1}, headers=admin_headers).json()["id"]
+    assert client.post(f"/enrollments/{enrollment_id}/lessons/1/complete", headers=admin_headers).status_code == 200
+    with SessionLocal() as db:
+        # A completion of a course 2 lesson, stored before such completions were rejected
+        db.add(models.LessonCompletion(enrollment_id=enrollment_id, lesson_id=4))
+        db.commit()
+
+    response = client.get("/admin/enrollments/export", params={"format": "ndjson"}, headers=admin_headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["id"], row["course_title"], row["completed_lessons"]) for row in rows] == [(enrollment_id, "Introduction to AI", 1)]
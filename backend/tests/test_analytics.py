@@ -0,0 +1,90 @@
+"""Course stats rollups: kept in step with enrollments, completions and lesson and module changes."""
+from sqlalchemy import func, select
+
+import analytics
+import models
+from database import SessionLocal
+from helpers import login
+
+INSTRUCTOR_CREDENTIALS = ("instructor@example.com", "securepassword") # Created by /seed_data/
+
+
+def counted_course_stats(db):
+    """(enrollments, completed enrollments, lesson completions) per course, counted from the source rows."""
+    course_lessons = dict(db.execute(
+        select(models.Module.course_id, func.count()).select_from(models.Lesson).join(models.Module).group_by(models.Module.course_id)
+    ).all())
+    completions = dict(db.execute(
+        select(models.Enrollment.id, func.count())
+        .select_from(models.LessonCompletion)
+        .join(models.Enrollment, models.Enrollment.id == models.LessonCompletion.enrollment_id)
+        .join(models.Lesson, models.Lesson.id == models.LessonCompletion.lesson_id)
+        .join(models.Module, (models.Module.id == models.Lesson.module_id) & (models.Module.course_id == models.Enrollment.course_id))
+        .group_by(models.Enrollment.id)
+    ).all())
+    stats = {}
+    for enrollment in db.scalars(select(models.Enrollment)):
+        completed = completions.get(enrollment.id, 0)
+        enrollments, completed_enrollments, lesson_completions = stats.get(enrollment.course_id, (0, 0, 0))
+        stats[enrollment.course_id] = (
+            enrollments + 1,
+            completed_enrollments + (0 < course_lessons.get(enrollment.course_id, 0) == completed),
+            lesson_completions + completed,
+        )
+    return stats
+
+def assert_stats_match_source_rows():
+    with SessionLocal() as db:
+        stats = {
+            row.course_id: (row.enrollment_count, row.completed_enrollment_count, row.lesson_completion_count)
+            for row in db.scalars(select(models.CourseStats)) if row.enrollment_count
+        }
+        assert stats == counted_course_stats(db)
+        assert analytics.reconcile(db) == {"course_stats": 0, "skill_stats": 0, "skill_proficiency_buckets": 0}
+        return stats
+
+def enroll(client, headers, course_id: int) -> int:
+    user_id = client.get("/users/me/", headers=headers).json()["id"]
+    response = client.post("/enrollments/", json={"user_id": user_id, "course_id": course_id}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def set_completed(client, headers, enrollment_id: int, lesson_id: int, completed: bool = True):
+    action = "complete" if completed else "incomplete"
+    assert client.post(f"/enrollments/{enrollment_id}/lessons/{lesson_id}/{action}", headers=headers).status_code == 200
+
+
+def test_course_stats_follow_completions_and_catalog_changes(client, admin_headers):
+    learner_headers = login(client, *INSTRUCTOR_CREDENTIALS)
+    enrollment_id, other_enrollment_id = enroll(client, admin_headers, 1), enroll(client, learner_headers, 1)
+    course_2_enrollment_id = enroll(client, admin_headers, 2)
+    assert assert_stats_match_source_rows() == {1: (2, 0, 0), 2: (1, 0, 0)}
+
+    for lesson_id in (1, 2, 3):
+        set_completed(client, admin_headers, enrollment_id, lesson_id)
+    set_completed(client, learner_headers, other_enrollment_id, 1)
+    set_completed(client, admin_headers, course_2_enrollment_id, 4)
+    assert assert_stats_match_source_rows() == {1: (2, 1, 4), 2: (1, 1, 1)}
+
+    set_completed(client, admin_headers, enrollment_id, 3, completed=False)
+    set_completed(client, admin_headers, enrollment_id, 3, completed=False) # Already incomplete
+    assert assert_stats_match_source_rows() == {1: (2, 0, 3), 2: (1, 1, 1)}
+
+    set_completed(client, admin_headers, enrollment_id, 3)
+    set_completed(client, admin_headers, enrollment_id, 3) # Already complete
+    assert assert_stats_match_source_rows() == {1: (2, 1, 4), 2: (1, 1, 1)}
+
+    # The other enrollment is left with lesson 2 to go, then with nothing
+    assert client.delete("/lessons/1", headers=admin_headers).status_code == 204
+    assert assert_stats_match_source_rows() == {1: (2, 1, 2), 2: (1, 1, 1)}
+    set_completed(client, learner_headers, other_enrollment_id, 3)
+    assert client.delete("/lessons/2", headers=admin_headers).status_code == 204
+    assert assert_stats_match_source_rows() == {1: (2, 2, 2), 2: (1, 1, 1)}
+
+    # A new lesson leaves both enrollments with one to go
+    lesson = {"title": "New", "content": "", "content_type": "text", "order": 5}
+    assert client.post("/modules/2/lessons/", json=lesson, headers=admin_headers).status_code == 201
+    assert assert_stats_match_source_rows() == {1: (2, 0, 2), 2: (1, 1, 1)}
+
+    assert client.delete("/modules/2", headers=admin_headers).status_code == 204 # All of course 1's lessons
+    assert assert_stats_match_source_rows() == {1: (2, 0, 0), 2: (1, 1, 1)}
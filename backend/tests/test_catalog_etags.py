@@ -0,0 +1,36 @@
+"""Catalog ETags: issued per scope, answered with 304 while current, replaced by writes."""
+import pytest
+
+# Each read, a write inside its scope, and a write outside it
+SCOPES = {
+    "catalog": ("/courses/", ("put", "/lessons/4", {"title": "Renamed"}), ("post", "/users/", {"email": "learner@example.com", "password": "password"})),
+    "course": ("/courses/1", ("put", "/lessons/1", {"title": "Renamed"}), ("put", "/courses/2", {"title": "Renamed"})),
+    "course modules": ("/courses/1/modules/", ("put", "/modules/2", {"title": "Renamed"}), ("put", "/modules/3", {"title": "Renamed"})),
+    "module lessons": ("/modules/1/lessons/", ("post", "/modules/1/lessons/", {"title": "New", "content": "", "content_type": "text", "order": 5}), ("put", "/lessons/3", {"title": "Renamed"})),
+    "lesson": ("/lessons/1", ("put", "/lessons/1", {"content": "Edited"}), ("put", "/lessons/2", {"content": "Edited"})),
+}
+
+
+@pytest.mark.parametrize("url, write, unrelated_write", SCOPES.values(), ids=SCOPES.keys())
+def test_etag_is_current_until_a_write_in_its_scope(client, admin_headers, url, write, unrelated_write):
+    first = client.get(url, headers=admin_headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert "Cache-Control" in first.headers
+
+    not_modified = client.get(url, headers={**admin_headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.content == b""
+
+    method, write_url, body = unrelated_write
+    assert client.request(method, write_url, json=body, headers=admin_headers).status_code in (200, 201)
+    assert client.get(url, headers={**admin_headers, "If-None-Match": etag}).status_code == 304
+
+    method, write_url, body = write
+    assert client.request(method, write_url, json=body, headers=admin_headers).status_code in (200, 201)
+    changed = client.get(url, headers={**admin_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json() != first.json()
+    assert client.get(url, headers={**admin_headers, "If-None-Match": changed.headers["ETag"]}).status_code == 304
@@ -0,0 +1,79 @@
+"""Bulk catalog import."""
+import io
+import json
+
+import pytest
+from sqlalchemy import select
+
+import catalog_transfer
+import models
+from database import SessionLocal
+from skill_index import skill_index
+
+
+def ndjson(*records) -> bytes:
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+def import_file(client, headers, content: bytes):
+    return client.post("/admin/catalog/import", files={"file": ("catalog.ndjson", content)}, headers=headers)
+
+COURSE = {"type": "course", "id": 1, "title": "Imported course"}
+MODULE = {"type": "module", "id": 1, "course_id": 1, "title": "Imported module", "order": 1}
+
+
+def test_import(client, admin_headers):
+    response = import_file(client, admin_headers, ndjson(
+        {"type": "skill", "id": 1, "name": "Imported skill"},
+        {**COURSE, "skill_ids": [1]},
+        MODULE,
+        {"type": "lesson", "id": 1, "module_id": 1, "title": "Imported lesson", "content": "Text", "order": "2"},
+    ))
+    assert response.status_code == 200, response.text
+    assert response.json() == {"skill": 1, "course": 1, "module": 1, "lesson": 1}
+
+@pytest.mark.parametrize("record, error", [
+    ({**COURSE, "title": 42}, "line 1: title: Input should be a valid string"),
+    ({**COURSE, "title": ""}, "line 1: missing title"),
+    ({"type": "lesson", "id": 1, "module_id": 1, "title": "Lesson", "content": ["not", "text"]}, "line 1: content: Input should be a valid string"),
+    ({**MODULE, "order": "first"}, "line 1: order: Input should be a valid integer, unable to parse string as an integer"),
+    ({**MODULE, "course_id": [1]}, "line 1: course_id must be an integer"),
+    ({**COURSE, "skill_ids": "1"}, "line 1: skill_ids must be a list of integers"),
+])
+def test_malformed_record_is_a_bad_request(client, admin_headers, record, error):
+    response = import_file(client, admin_headers, ndjson(record))
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Invalid catalog file: {error}"
+
+def test_failed_import_reloads_the_skill_index(client, admin_headers):
+    content = ndjson(
+        {"type": "skill", "id": 1, "name": "Imported skill"},
+        {**COURSE, "skill_ids": [1]},
+        {**MODULE, "course_id": 2}, # Fails in the second batch, after the course was committed
+    )
+    with SessionLocal() as db, pytest.raises(catalog_transfer.CatalogImportError):
+        catalog_transfer.import_catalog(db, io.BytesIO(content), batch_size=1)
+
+    with SessionLocal() as db:
+        skill_id = db.scalar(select(models.Skill.id).where(models.Skill.name == "Imported skill"))
+        course_id = db.scalar(select(models.Course.id).where(models.Course.title == COURSE["title"]))
+        assert not any(skill_index.check_consistency(db).values())
+        assert not skill_index.refresh(db) # Loaded at the current catalog version
+    assert [item[:2] for item in skill_index.recommend({skill_id: 10})] == [("course", course_id)]
+
+def test_batches_of_children_change_their_parents(client, admin_headers):
+    lessons = [{"type": "lesson", "id": lesson_id, "module_id": 1, "title": f"Lesson {lesson_id}", "order": lesson_id} for lesson_id in (1, 2, 3)]
+    with SessionLocal() as db:
+        importer = catalog_transfer.CatalogImporter(db, batch_size=1)
+        importer.add("line 1", COURSE)
+        course_id = importer.id_maps["course"][COURSE["id"]]
+        read_during_import = client.get(f"/courses/{course_id}") # Cached while the import runs
+        for line_number, record in enumerate([MODULE, *lessons], start=2):
+            importer.add(f"line {line_number}", record)
+        importer.finish()
+        module_id = importer.id_maps["module"][MODULE["id"]]
+        assert db.get(models.Course, course_id).lesson_count == 3
+        assert db.get(models.Module, module_id).lesson_count == 3
+
+    response = client.get(f"/courses/{course_id}", headers={"If-None-Match": read_during_import.headers["ETag"]})
+    assert response.status_code == 200
+    assert [lesson["title"] for module in response.json()["modules"] for lesson in module["lessons"]] == ["Lesson 1", "Lesson 2", "Lesson 3"]
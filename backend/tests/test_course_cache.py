@@ -0,0 +1,19 @@
+"""Course JSON cache with a shared backend."""
+import pytest
+
+from course_cache import CourseCache, InMemorySharedBackend, SharedCacheBackend
+
+
+def test_shared_backend_serves_other_workers():
+    shared = InMemorySharedBackend()
+    worker, other_worker = CourseCache(shared=shared), CourseCache(shared=shared)
+    worker.put(1, version=7, body=b'{"id": 1}')
+    assert other_worker.get(1, version=7) == b'{"id": 1}'
+    assert other_worker.get(1, version=8) is None # Stored under an older version
+    worker.invalidate(1)
+    assert CourseCache(shared=shared).get(1, version=7) is None
+    assert other_worker.metrics()["shared_hits"] == 1
+
+def test_shared_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SharedCacheBackend()
@@ -0,0 +1,51 @@
+"""Engine configuration for each supported database."""
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+import database
+import migrations
+
+STATEMENT_TIMEOUT = text("SELECT setting FROM pg_settings WHERE name = 'statement_timeout'") # In milliseconds
+
+
+def test_resolve_database_url():
+    memory_url = database.resolve_database_url("sqlite:///:memory:")
+    assert memory_url.database == "file:cognitivelabs_memory"
+    assert memory_url.query["mode"] == "memory"
+    assert database.resolve_database_url("postgresql://user@db/app").drivername == "postgresql+psycopg2"
+    assert database.resolve_database_url("postgresql+asyncpg://user@db/app").drivername == "postgresql+asyncpg"
+
+def test_session_settings(engines, database_url):
+    sync_engine, async_engine = engines
+    with sync_engine.connect() as conn:
+        if sync_engine.dialect.name == "postgresql":
+            assert conn.execute(STATEMENT_TIMEOUT).scalar() == str(database.DB_STATEMENT_TIMEOUT_MS)
+        else:
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+            journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+            assert journal_mode == ("memory" if database_url == "sqlite:///:memory:" else "wal")
+    if database_url == "sqlite:///:memory:":
+        assert isinstance(sync_engine.pool, StaticPool)
+        assert isinstance(async_engine.pool, StaticPool)
+
+def test_async_engine_sees_sync_writes(engines):
+    sync_engine, async_engine = engines
+    migrations.upgrade(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(text("INSERT INTO skills (name) VALUES ('Written synchronously')"))
+
+    async def read_skill_names_and_timeout():
+        try:
+            async with async_engine.connect() as conn:
+                names = (await conn.execute(text("SELECT name FROM skills"))).scalars().all()
+                timeout = (await conn.execute(STATEMENT_TIMEOUT)).scalar() if async_engine.dialect.name == "postgresql" else None
+        finally:
+            await async_engine.dispose() # Its connections belong to this event loop
+        return names, timeout
+
+    names, timeout = asyncio.run(read_skill_names_and_timeout())
+    assert names == ["Written synchronously"]
+    if async_engine.dialect.name == "postgresql":
+        assert timeout == str(database.DB_STATEMENT_TIMEOUT_MS)
@@ -0,0 +1,52 @@
+"""Serialization cost per enrollment of /users/me/enrollments/."""
+import pytest
+
+import schemas
+from helpers import query_count
+
+
+class CountingValidator:
+    """Wraps a model's validator, counting validation passes."""
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.passes = 0
+
+    def validate_python(self, *args, **kwargs):
+        self.passes += 1
+        return self.validator.validate_python(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.validator, name)
+
+def enroll(client, headers, course_ids):
+    user_id = client.get("/users/me/", headers=headers).json()["id"]
+    for course_id in course_ids:
+        assert client.post("/enrollments/", json={"user_id": user_id, "course_id": course_id}, headers=headers).status_code == 201
+
+
+@pytest.mark.parametrize("params, schema", [({}, schemas.Enrollment), ({"summary": "true"}, schemas.EnrollmentSummary)])
+def test_one_validation_pass_per_enrollment(client, admin_headers, monkeypatch, params, schema):
+    enroll(client, admin_headers, [1, 2, 3])
+    validators = {model: CountingValidator(model.__pydantic_validator__) for model in (schemas.Enrollment, schemas.EnrollmentSummary)}
+    for model, validator in validators.items():
+        monkeypatch.setattr(model, "__pydantic_validator__", validator)
+
+    for request_params in (params, {**params, "cursor": ""}):
+        for validator in validators.values():
+            validator.passes = 0
+        response = client.get("/users/me/enrollments/", params=request_params, headers=admin_headers)
+        assert response.status_code == 200
+        items = response.json()["items"] if "cursor" in request_params else response.json()
+        assert len(items) == 3
+        # A second pass per enrollment (e.g. validating, dumping and re-validating) fails here
+        assert {model: validator.passes for model, validator in validators.items()} == {
+            model: 3 if model is schema else 0 for model in validators
+        }
+
+@pytest.mark.parametrize("params", [{}, {"summary": "true"}])
+def test_statements_do_not_grow_with_enrollments(client, admin_headers, params):
+    enroll(client, admin_headers, [1])
+    one = query_count(client.get("/users/me/enrollments/", params=params, headers=admin_headers))
+    enroll(client, admin_headers, [2, 3])
+    assert query_count(client.get("/users/me/enrollments/", params=params, headers=admin_headers)) == one
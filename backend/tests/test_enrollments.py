@@ -0,0 +1,35 @@
+"""Enrollments: duplicates, sequential or concurrent, and lesson completion checks."""
+import pytest
+
+import analytics
+import crud
+import schemas
+from database import SessionLocal
+
+
+def test_concurrent_duplicate_enroll_is_a_no_op(client, admin_headers):
+    user_id = client.get("/users/me/", headers=admin_headers).json()["id"]
+    enrollment = schemas.EnrollmentCreate(user_id=user_id, course_id=1)
+    with SessionLocal() as db, SessionLocal() as other_db:
+        # Both requests got past their checks; the other one commits first
+        assert crud.create_enrollment(other_db, enrollment) is not None
+        assert crud.create_enrollment(db, enrollment) is None
+        assert analytics.reconcile(db) == {"course_stats": 0, "skill_stats": 0, "skill_proficiency_buckets": 0}
+
+    response = client.post("/enrollments/", json=enrollment.model_dump(), headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "User already enrolled in this course"
+
+@pytest.mark.parametrize("action", ["complete", "incomplete"])
+@pytest.mark.parametrize("lesson_id, status_code, detail", [
+    (999, 404, "Lesson not found"),
+    (4, 400, "Lesson is not part of the enrolled course"), # A lesson of course 2
+])
+def test_lesson_outside_the_course_is_rejected(client, admin_headers, action, lesson_id, status_code, detail):
+    user_id = client.get("/users/me/", headers=admin_headers).json()["id"]
+    enrollment_id = client.post("/enrollments/", json={"user_id": user_id, "course_id": 1}, headers=admin_headers).json()["id"]
+    response = client.post(f"/enrollments/{enrollment_id}/lessons/{lesson_id}/{action}", headers=admin_headers)
+    assert response.status_code == status_code
+    assert response.json()["detail"] == detail
+    progress = client.get("/users/me/progress", headers=admin_headers).json()
+    assert progress[0]["completed_lessons"] == 0
@@ -0,0 +1,40 @@
+"""Knowledge-tracing recompute."""
+import pytest
+from sqlalchemy import select, update
+
+import crud
+import knowledge_tracing
+import migrations
+import models
+from database import SessionLocal
+
+QUIZZES = [(3, 4), (0, 2), (5, 5), (1, 3)] # (correct, attempted) per submission
+
+
+def current_values(db):
+    user_skills = db.execute(select(models.UserSkill.id, models.UserSkill.proficiency_score, models.UserSkill.mastery_probability).order_by(models.UserSkill.id)).all()
+    assessments = db.execute(select(models.SkillAssessment.id, models.SkillAssessment.proficiency_score).order_by(models.SkillAssessment.id)).all()
+    return [tuple(row) for row in user_skills], [tuple(row) for row in assessments]
+
+@pytest.mark.parametrize("batch_size", [1, 5, knowledge_tracing.RECOMPUTE_BATCH_SIZE])
+def test_recompute_restores_the_traced_estimates(engine, batch_size):
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        db.add_all([models.User(email=f"learner{n}@example.com", hashed_password="x") for n in range(3)])
+        db.add_all([models.Skill(name=f"Skill {n}") for n in range(2)])
+        db.commit()
+        user_ids = db.scalars(select(models.User.id)).all()
+        skill_ids = db.scalars(select(models.Skill.id)).all()
+        for offset, user_id in enumerate(user_ids):
+            crud.upsert_user_skill_proficiencies(db, user_id=user_id, proficiency_scores={skill_ids[0]: 50})
+            for quiz in QUIZZES[offset:]:
+                crud.trace_user_skill_proficiencies(db, user_id=user_id, skill_results={skill_id: quiz for skill_id in skill_ids})
+        traced = current_values(db)
+        assert knowledge_tracing.recompute(db, batch_size=batch_size) == {"skill_assessments": 0, "user_skills": 0}
+
+        db.execute(update(models.UserSkill).values(proficiency_score=0, mastery_probability=0.5))
+        db.execute(update(models.SkillAssessment).where(models.SkillAssessment.attempts.is_not(None)).values(proficiency_score=0))
+        db.commit()
+        counts = knowledge_tracing.recompute(db, batch_size=batch_size)
+        assert counts == {"skill_assessments": sum(2 * len(QUIZZES[offset:]) for offset in range(3)), "user_skills": 6}
+        assert current_values(db) == traced
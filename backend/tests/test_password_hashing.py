@@ -0,0 +1,50 @@
+"""The bounded hashing pool and rehashing of outdated hashes on login."""
+from threading import Event
+
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import select, update
+
+import main
+import models
+from database import SessionLocal
+from helpers import ADMIN_CREDENTIALS
+from password_hashing import BCRYPT_ROUNDS, HashingPoolSaturated, PasswordHasher
+
+
+def test_a_full_pool_rejects_new_jobs():
+    hasher = PasswordHasher(workers=1, max_queue=1, executor="thread")
+    release = Event()
+    running = [hasher._submit(lambda: (release.wait(), 0.0)) for _ in range(2)]
+    with pytest.raises(HashingPoolSaturated):
+        hasher.hash("password")
+    release.set()
+    for future in running:
+        future.result()
+    assert hasher.metrics()["rejected"] == 1
+    assert hasher.verify_and_update("password", hasher.hash("password")) == (True, None)
+
+def test_a_saturated_pool_answers_429(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(main, "password_hasher", PasswordHasher(workers=0, max_queue=0, executor="thread"))
+    response = client.post("/token", data={"username": ADMIN_CREDENTIALS[0], "password": ADMIN_CREDENTIALS[1]})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+def stored_hash(email: str) -> str:
+    with SessionLocal() as db:
+        return db.scalar(select(models.User.hashed_password).where(models.User.email == email))
+
+def test_login_rehashes_a_hash_made_with_other_rounds(client, admin_headers):
+    email, password = ADMIN_CREDENTIALS
+    outdated = bcrypt.using(rounds=BCRYPT_ROUNDS + 1).hash(password) # Pinned min and max rounds exclude any other cost
+    with SessionLocal() as db:
+        db.execute(update(models.User).where(models.User.email == email).values(hashed_password=outdated))
+        db.commit()
+
+    assert client.post("/token", data={"username": email, "password": password}).status_code == 200
+    rehashed = stored_hash(email)
+    assert bcrypt.from_string(rehashed).rounds == BCRYPT_ROUNDS
+    assert bcrypt.verify(password, rehashed)
+    # A hash with the configured rounds is kept as it is
+    assert client.post("/token", data={"username": email, "password": password}).status_code == 200
+    assert stored_hash(email) == rehashed
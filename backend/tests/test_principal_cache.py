@@ -0,0 +1,21 @@
+"""Token revocation across workers is bounded by the principal cache TTL."""
+import time
+
+from sqlalchemy import update
+
+import models
+from database import SessionLocal
+from principal_cache import principal_cache
+
+
+def test_revocation_by_another_worker_applies_when_the_entry_expires(client, admin_headers, monkeypatch):
+    assert client.get("/users/me/", headers=admin_headers).status_code == 200
+    # Another worker revokes the token: the database moves, this worker's cache does not
+    with SessionLocal() as db:
+        db.execute(update(models.User).values(token_version=models.User.token_version + 1))
+        db.commit()
+    assert client.get("/users/me/", headers=admin_headers).status_code == 200
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + principal_cache.ttl_seconds + 1)
+    assert client.get("/users/me/", headers=admin_headers).status_code == 401
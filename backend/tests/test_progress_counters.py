@@ -0,0 +1,73 @@
+"""Progress counters: completed lesson counts of enrollments and their modules."""
+from sqlalchemy import func, select
+
+import models
+from database import SessionLocal
+from helpers import login
+
+INSTRUCTOR_CREDENTIALS = ("instructor@example.com", "securepassword") # Created by /seed_data/
+
+
+def in_course_completions(*group_by):
+    """Completions of lessons in the enrollment's own course, counted per group_by columns."""
+    return (
+        select(*group_by, func.count())
+        .select_from(models.LessonCompletion)
+        .join(models.Lesson, models.Lesson.id == models.LessonCompletion.lesson_id)
+        .join(models.Module, models.Module.id == models.Lesson.module_id)
+        .join(models.Enrollment, (models.Enrollment.id == models.LessonCompletion.enrollment_id) & (models.Enrollment.course_id == models.Module.course_id))
+        .group_by(*group_by)
+    )
+
+def assert_counters_match_completions():
+    with SessionLocal() as db:
+        per_enrollment = dict(db.execute(in_course_completions(models.LessonCompletion.enrollment_id)).all())
+        assert {enrollment.id: enrollment.completed_lesson_count for enrollment in db.scalars(select(models.Enrollment))} == {
+            enrollment_id: per_enrollment.get(enrollment_id, 0) for enrollment_id in db.scalars(select(models.Enrollment.id))
+        }
+        per_module = {(enrollment_id, module_id): count for enrollment_id, module_id, count in db.execute(in_course_completions(models.LessonCompletion.enrollment_id, models.Lesson.module_id))}
+        # Rows stay behind at zero once their lessons are uncompleted
+        assert {(row.enrollment_id, row.module_id): row.completed_lesson_count for row in db.scalars(select(models.ModuleProgress)) if row.completed_lesson_count} == per_module
+        for model, parent in ((models.Module, models.Lesson.module_id), (models.Course, models.Module.course_id)):
+            lessons_per_parent = dict(db.execute(select(parent, func.count()).select_from(models.Lesson).join(models.Module).group_by(parent)).all())
+            assert {row.id: row.lesson_count for row in db.scalars(select(model))} == {
+                row_id: lessons_per_parent.get(row_id, 0) for row_id in db.scalars(select(model.id))
+            }
+        return per_enrollment
+
+def enroll(client, headers, course_id: int) -> int:
+    user_id = client.get("/users/me/", headers=headers).json()["id"]
+    response = client.post("/enrollments/", json={"user_id": user_id, "course_id": course_id}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def set_completed(client, headers, enrollment_id: int, lesson_id: int, completed: bool = True):
+    action = "complete" if completed else "incomplete"
+    assert client.post(f"/enrollments/{enrollment_id}/lessons/{lesson_id}/{action}", headers=headers).status_code == 200
+
+
+def test_counters_follow_completions_and_deletions(client, admin_headers):
+    learner_headers = login(client, *INSTRUCTOR_CREDENTIALS)
+    enrollment_id, other_enrollment_id = enroll(client, admin_headers, 1), enroll(client, learner_headers, 1)
+
+    for lesson_id in (1, 2, 3):
+        set_completed(client, admin_headers, enrollment_id, lesson_id)
+    set_completed(client, learner_headers, other_enrollment_id, 1)
+    assert assert_counters_match_completions() == {enrollment_id: 3, other_enrollment_id: 1}
+
+    set_completed(client, admin_headers, enrollment_id, 3, completed=False)
+    set_completed(client, admin_headers, enrollment_id, 3, completed=False) # Already incomplete
+    assert assert_counters_match_completions() == {enrollment_id: 2, other_enrollment_id: 1}
+
+    set_completed(client, admin_headers, enrollment_id, 3)
+    set_completed(client, admin_headers, enrollment_id, 3) # Already complete
+    assert assert_counters_match_completions() == {enrollment_id: 3, other_enrollment_id: 1}
+
+    assert client.delete("/lessons/1", headers=admin_headers).status_code == 204
+    assert assert_counters_match_completions() == {enrollment_id: 2}
+
+    assert client.delete("/modules/2", headers=admin_headers).status_code == 204 # With lesson 3
+    assert assert_counters_match_completions() == {enrollment_id: 1}
+
+    progress = client.get("/users/me/progress", headers=admin_headers).json()
+    assert [(item["completed_lessons"], item["total_lessons"]) for item in progress] == [(1, 1)]
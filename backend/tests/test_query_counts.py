@@ -0,0 +1,95 @@
+"""SQL statement counts of the hot endpoints.
+
+Every course of the seeded catalog has modules, lessons and skills, and the
+counts are asserted exactly: a relationship lazy-loaded per row (an N+1)
+adds statements and fails these tests. test_counts_do_not_grow_with_the_catalog
+checks the same endpoints again after growing the course they read.
+"""
+import crud
+from database import SessionLocal
+from helpers import login, query_count
+from principal_cache import principal_cache
+
+
+def current_user_id(client, headers) -> int:
+    return client.get("/users/me/", headers=headers).json()["id"]
+
+def enroll(client, headers, course_id: int):
+    return client.post("/enrollments/", json={"user_id": current_user_id(client, headers), "course_id": course_id}, headers=headers)
+
+def add_module_with_lessons(client, headers, course_id: int, skill_id: int, lessons: int = 2) -> int:
+    module = client.post(f"/courses/{course_id}/modules/", json={"title": "Extra module", "order": 9}, headers=headers).json()
+    for order in range(lessons):
+        response = client.post(f"/modules/{module['id']}/lessons/", json={"title": f"Extra lesson {order}", "content": "Text", "order": order}, headers=headers)
+        assert response.status_code == 201, response.text
+    assert client.post(f"/admin/modules/{module['id']}/skills/{skill_id}", headers=headers).status_code == 200
+    return module["id"]
+
+
+def test_course_list(client, admin_headers, skills):
+    cold = client.get("/courses/", headers=admin_headers)
+    assert cold.status_code == 200
+    # Catalog versions, the page of courses, then one SELECT per relationship of the tree
+    assert query_count(cold) == 8
+    warm = client.get("/courses/", headers=admin_headers)
+    assert warm.json() == cold.json()
+    # Catalog versions and the page; the trees come from the course cache
+    assert query_count(warm) == 3
+
+def test_current_user(client, admin_headers):
+    principal_cache.clear()
+    miss = client.get("/users/me/", headers=admin_headers)
+    assert miss.status_code == 200
+    assert query_count(miss) == 1
+    hit = client.get("/users/me/", headers=admin_headers)
+    assert query_count(hit) == 0
+
+def test_study_plan(client, admin_headers, skills):
+    with SessionLocal() as db:
+        crud.upsert_user_skill_proficiencies(db, user_id=current_user_id(client, admin_headers), proficiency_scores={skills[0]: 20, skills[1]: 40})
+    first = client.get("/users/me/study-plan", headers=admin_headers)
+    assert first.status_code == 200
+    assert [(item["type"], item["id"]) for item in first.json()["recommendations"]] == [("course", 1), ("module", 2), ("course", 2)]
+    # The version behind the skill index, then the weak skills; their courses and
+    # modules come from the in-memory index, which applied the skills fixture's links
+    assert query_count(first) == 2
+    client.put("/lessons/1", json={"content": "Edited"}, headers=admin_headers)
+    again = client.get("/users/me/study-plan", headers=admin_headers)
+    assert again.json() == first.json()
+    # Lesson edits do not touch the index, so it is not reloaded
+    assert query_count(again) == 2
+
+def test_enroll(client, admin_headers, skills):
+    response = enroll(client, admin_headers, course_id=1)
+    assert response.status_code == 201
+    assert len(response.json()["course"]["modules"]) == 2
+    # Course check, insert and rollup, then the enrollment tree in six
+    assert query_count(response) == 9
+    duplicate = enroll(client, admin_headers, course_id=1)
+    assert duplicate.status_code == 400
+
+def test_complete_lesson(client, admin_headers, skills):
+    enrollment_id = enroll(client, admin_headers, course_id=1).json()["id"]
+    first = client.post(f"/enrollments/{enrollment_id}/lessons/1/complete", headers=admin_headers)
+    assert first.status_code == 200
+    assert first.json()["completed_lessons"] == [1]
+    # Ownership check, completion, progress counters and rollup, then the enrollment tree in six
+    assert query_count(first) == 11
+    again = client.post(f"/enrollments/{enrollment_id}/lessons/1/complete", headers=admin_headers)
+    # Nothing inserted, so no rollup update
+    assert query_count(again) == 10
+
+def test_counts_do_not_grow_with_the_catalog(client, admin_headers, skills):
+    for _ in range(3):
+        add_module_with_lessons(client, admin_headers, course_id=1, skill_id=skills[1])
+    learner = {"email": "learner@example.com", "password": "learnerpassword", "full_name": "Learner"}
+    assert client.post("/users/", json=learner).status_code == 200
+    headers = login(client, learner["email"], learner["password"])
+
+    courses = client.get("/courses/", headers=headers)
+    assert len(courses.json()[0]["modules"]) == 5
+    assert query_count(courses) == 8
+    enrollment = enroll(client, headers, course_id=1)
+    assert query_count(enrollment) == 9
+    completed = client.post(f"/enrollments/{enrollment.json()['id']}/lessons/1/complete", headers=headers)
+    assert query_count(completed) == 11
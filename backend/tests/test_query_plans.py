@@ -0,0 +1,51 @@
+"""The hot crud lookups are served by an index.
+
+Each query is EXPLAINed on the migrated schema and fails on a full table scan
+or a sort the index should have provided. On PostgreSQL sequential and bitmap
+scans are disabled first, so that the empty test tables still show whether
+an index can serve both the filter and the order.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, text
+
+import migrations
+import models
+
+Enrollment, UserSkill, Module, Lesson = models.Enrollment, models.UserSkill, models.Module, models.Lesson
+SINCE = datetime(2000, 1, 1)
+
+HOT_QUERIES = {
+    "get_enrollment_by_user_and_course": select(Enrollment).where(Enrollment.user_id == 1, Enrollment.course_id == 1),
+    "get_enrollments_by_user": select(Enrollment).where(Enrollment.user_id == 1),
+    "get_user_skill": select(UserSkill).where(UserSkill.user_id == 1, UserSkill.skill_id == 1),
+    "get_modules_for_course": select(Module).where(Module.course_id == 1).order_by(Module.order, Module.id),
+    "get_lessons_for_module": select(Lesson).where(Lesson.module_id == 1).order_by(Lesson.order, Lesson.id),
+    "courses_for_skill": select(models.course_skill_association_table).where(models.course_skill_association_table.c.skill_id == 1),
+    "modules_for_skill": select(models.module_skill_association_table).where(models.module_skill_association_table.c.skill_id == 1),
+    "completions_for_lesson": select(models.LessonCompletion).where(models.LessonCompletion.lesson_id == 1),
+    "skill_assessments_since": select(models.SkillAssessment).where(
+        models.SkillAssessment.user_id == 1, models.SkillAssessment.skill_id == 1, models.SkillAssessment.assessed_at >= SINCE
+    ).order_by(models.SkillAssessment.assessed_at.desc()),
+    "course_enrollments_since": select(Enrollment.id).where(Enrollment.course_id == 1, Enrollment.enrolled_at >= SINCE),
+    "lesson_completions_since": select(models.LessonCompletion).where(
+        models.LessonCompletion.lesson_id == 1, models.LessonCompletion.completed_at >= SINCE
+    ),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(engine, name):
+    migrations.upgrade(engine)
+    sql = str(HOT_QUERIES[name].compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SET enable_seqscan = off"))
+            conn.execute(text("SET enable_bitmapscan = off")) # A bitmap scan loses the index order
+            plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+            unindexed = [line for line in plan if "Seq Scan" in line or "Sort" in line]
+        else:
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            unindexed = [line for line in plan if line.startswith("SCAN") or "TEMP B-TREE" in line]
+    assert not unindexed, plan
@@ -0,0 +1,62 @@
+"""Compiled quiz grading and the compiled-quiz cache."""
+import json
+import random
+
+import pytest
+
+import schemas
+from quiz_cache import QuizCache, compile_quiz
+
+
+def baseline_grade(content: str, answers):
+    # The grading loop submit_quiz ran before quizzes were compiled
+    questions = json.loads(content).get("questions", [])
+    question_map = {q.get("id"): q for q in questions}
+    correct_answers_count = 0
+    skill_scores = {}
+    for user_answer in answers:
+        question_details = question_map.get(str(user_answer.question_id))
+        if question_details:
+            is_correct = str(question_details.get("correctAnswer")) == str(user_answer.selected_option_id)
+            if is_correct:
+                correct_answers_count += 1
+            skill_ids = question_details.get("skill_ids", [])
+            if isinstance(skill_ids, list):
+                for skill_id in skill_ids:
+                    if isinstance(skill_id, int):
+                        skill_scores.setdefault(skill_id, []).append(is_correct)
+    return correct_answers_count, {skill_id: (sum(results), len(results)) for skill_id, results in skill_scores.items()}
+
+def random_quiz(rng: random.Random):
+    # Repeated and numeric question ids, malformed skill lists and numeric answers included
+    question_ids = [f"q{n}" for n in range(6)] + [7]
+    questions = []
+    for _ in range(rng.randint(0, 8)):
+        skill_ids = rng.choice([[], [1], [1, 2], [2, 3, 3], [1, "2"], "1", None])
+        question = {"id": rng.choice(question_ids), "correctAnswer": rng.choice(["a", "b", 1])}
+        if skill_ids is not None:
+            question["skill_ids"] = skill_ids
+        questions.append(question)
+    answers = [
+        schemas.UserAnswer(question_id=str(rng.choice(question_ids + ["missing"])), selected_option_id=rng.choice(["a", "b", "1"]))
+        for _ in range(rng.randint(0, 10))
+    ]
+    return json.dumps({"questions": questions}), answers
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_compiled_grading_matches_the_baseline(seed):
+    content, answers = random_quiz(random.Random(seed))
+    assert compile_quiz(content).grade(answers) == baseline_grade(content, answers)
+
+def test_changed_content_replaces_the_cached_quiz():
+    cache = QuizCache()
+    original = json.dumps({"questions": [{"id": "q1", "correctAnswer": "a", "skill_ids": [1]}]})
+    edited = json.dumps({"questions": [{"id": "q1", "correctAnswer": "b", "skill_ids": [1]}]})
+    answers = [schemas.UserAnswer(question_id="q1", selected_option_id="a")]
+
+    compiled = cache.get(1, original)
+    assert cache.get(1, original) is compiled
+    # An edit that bypassed invalidate() still misses on the content hash
+    assert cache.get(1, edited).grade(answers) == (0, {1: (0, 1)})
+    assert cache.get(1, original) is not compiled # Only the latest version was kept
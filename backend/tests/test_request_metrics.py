@@ -0,0 +1,13 @@
+"""Per-route request metrics at /metrics."""
+from helpers import login
+
+
+def test_metrics_are_served_to_admins_only(client, admin_headers):
+    assert client.get("/courses/").status_code == 200
+    assert client.get("/metrics").status_code == 401
+    instructor_headers = login(client, "instructor@example.com", "securepassword")
+    assert client.get("/metrics", headers=instructor_headers).status_code == 403
+
+    response = client.get("/metrics", headers=admin_headers)
+    assert response.status_code == 200
+    assert 'http_requests_total{method="GET",route="/courses/",status="200"} 1' in response.text
@@ -0,0 +1,14 @@
+"""Catalog search endpoint."""
+import pytest
+
+
+def test_search_pages_through_results(client, admin_headers):
+    first = client.get("/search", params={"q": "python", "limit": 1})
+    assert first.status_code == 200
+    assert len(first.json()) == 1
+    second = client.get("/search", params={"q": "python", "skip": 1, "limit": 1})
+    assert len(second.json()) == 1 and second.json() != first.json()
+
+@pytest.mark.parametrize("params", [{"skip": -1}, {"limit": 0}, {"limit": -5}, {"limit": 101}])
+def test_out_of_range_paging_is_rejected(client, params):
+    assert client.get("/search", params={"q": "python", **params}).status_code == 422
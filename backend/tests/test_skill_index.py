@@ -0,0 +1,47 @@
+"""The in-process skill index follows catalog writes made by other workers."""
+from sqlalchemy import insert
+
+import catalog_versions
+import crud
+import models
+from database import SessionLocal
+from skill_index import SkillContentIndex, skill_index
+
+
+def test_refresh_reloads_after_another_workers_write(client, admin_headers, skills):
+    # other_worker stands for the index of a process that did not serve the write
+    other_worker = SkillContentIndex()
+    with SessionLocal() as db:
+        other_worker.load(db)
+    assert [item[:2] for item in other_worker.recommend({skills[1]: 10})] == [("course", 2)]
+
+    assert client.post(f"/admin/modules/1/skills/{skills[1]}", headers=admin_headers).status_code == 200
+    with SessionLocal() as db:
+        assert other_worker.refresh(db)
+        assert not other_worker.refresh(db)
+        assert other_worker.check_consistency(db) == skill_index.check_consistency(db)
+    assert [item[:2] for item in other_worker.recommend({skills[1]: 10})] == [("course", 2), ("module", 1)]
+
+def test_study_plan_sees_another_workers_write(client, admin_headers, skills):
+    user_id = client.get("/users/me/", headers=admin_headers).json()["id"]
+    with SessionLocal() as db:
+        crud.upsert_user_skill_proficiencies(db, user_id=user_id, proficiency_scores={skills[1]: 10})
+    # Another worker adds a link, which this worker's index has not seen
+    with SessionLocal() as db:
+        db.execute(insert(models.module_skill_association_table).values(module_id=1, skill_id=skills[1]))
+        catalog_versions.increment(db, catalog_versions.SKILL_INDEX_SCOPE)
+        db.commit()
+
+    response = client.get("/users/me/study-plan", headers=admin_headers)
+    assert ("module", 1) in [(item["type"], item["id"]) for item in response.json()["recommendations"]]
+
+def test_own_writes_and_lesson_edits_do_not_reload(client, admin_headers, skills):
+    with SessionLocal() as db:
+        assert not skill_index.refresh(db) # The skills fixture's links were applied incrementally
+    lesson = client.put("/lessons/1", json={"content": "Edited"}, headers=admin_headers)
+    assert lesson.status_code == 200
+    assert client.post(f"/admin/modules/1/skills/{skills[1]}", headers=admin_headers).status_code == 200
+    assert client.put("/courses/2", json={"title": "Renamed"}, headers=admin_headers).status_code == 200
+    with SessionLocal() as db:
+        assert not skill_index.refresh(db)
+        assert not any(skill_index.check_consistency(db).values())
@@ -0,0 +1,18 @@
+"""Study plan parameters."""
+import pytest
+
+import crud
+from database import SessionLocal
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": -1}, {"limit": 101}, {"proficiency_threshold": -1}, {"proficiency_threshold": 101}])
+def test_out_of_range_parameters_are_rejected(client, admin_headers, params):
+    assert client.get("/users/me/study-plan", params=params, headers=admin_headers).status_code == 422
+
+def test_limit_caps_the_recommendations(client, admin_headers, skills):
+    user_id = client.get("/users/me/", headers=admin_headers).json()["id"]
+    with SessionLocal() as db:
+        crud.upsert_user_skill_proficiencies(db, user_id=user_id, proficiency_scores={skills[0]: 20, skills[1]: 40})
+    response = client.get("/users/me/study-plan", params={"limit": 1}, headers=admin_headers)
+    assert response.status_code == 200
+    assert [(item["type"], item["id"]) for item in response.json()["recommendations"]] == [("course", 1)]
@@ -0,0 +1,37 @@
+"""Skill estimate writes keep the analytics rollups exact."""
+import analytics
+import crud
+import knowledge_tracing
+from database import SessionLocal
+
+
+def test_concurrent_first_assessments_count_the_user_once(client, admin_headers, skills, monkeypatch):
+    user_id = client.get("/users/me/", headers=admin_headers).json()["id"]
+    skill_id = skills[0]
+    lock_user_skills = crud._lock_user_skills
+    calls = []
+
+    def lock_then_lose_the_race(db, user_id, skill_ids):
+        previous = lock_user_skills(db, user_id, skill_ids)
+        calls.append(dict(previous))
+        if len(calls) == 1:
+            # Another request's first assessment commits after this one found no row
+            with SessionLocal() as other_db:
+                crud.upsert_user_skill_proficiencies(other_db, user_id=user_id, proficiency_scores={skill_id: 40})
+        return previous
+
+    monkeypatch.setattr(crud, "_lock_user_skills", lock_then_lose_the_race)
+    with SessionLocal() as db:
+        masteries = crud.trace_user_skill_proficiencies(db, user_id=user_id, skill_results={skill_id: (3, 4)})
+
+    # calls[1] is the other request's own lock. The losing write found no row,
+    # then locked the one the other request created and traced from it.
+    assert calls[0] == {}
+    assert calls[2] == {skill_id: (40, knowledge_tracing.mastery_from_score(40))}
+    assert masteries == knowledge_tracing.trace(calls[2], {skill_id: (3, 4)})
+    with SessionLocal() as db:
+        [stats] = analytics.get_skill_analytics(db, skill_id=skill_id)
+        assert stats.users == 1
+        assert stats.average_proficiency == knowledge_tracing.proficiency_score(masteries[skill_id])
+        assert sum(bucket.users for bucket in stats.distribution) == 1
+        assert analytics.reconcile(db) == {"course_stats": 0, "skill_stats": 0, "skill_proficiency_buckets": 0}
@@ -50,7 +50,7 @@ const AdminEnrollmentsPage = () => {
     const fetchEnrollments = async () => {
       try {
         const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
-        const response = await fetch(`${backendUrl}/admin/enrollments/?limit=200`, { // Fetch more enrollments
+        const response = await fetch(`${backendUrl}/admin/enrollments/?limit=200&summary=true`, { // Fetch more enrollments
           headers: {
             'Authorization': `Bearer ${token}`,
           },
@@ -6,7 +6,6 @@ import Link from 'next/link';
 interface Lesson {
   id: number;
   title: string;
-  content: string | null;
   content_type: string;
   order: number;
   module_id: number;
@@ -39,7 +38,7 @@ export default function CoursesPage() {
       setError(null);
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
       try {
-        const res = await fetch(`${backendUrl}/courses/`);
+        const res = await fetch(`${backendUrl}/courses/?summary=true`); // The grid does not need lesson bodies
         if (!res.ok) {
           throw new Error(`Failed to fetch courses: ${res.statusText}`);
         }